@@ -0,0 +1,69 @@
+"""Mesure de la recherche par nom de TagDatabase : parcours complet contre index des trigrammes
+
+La base est chargée depuis un moteur en mémoire (MemoryStorage). Les deux
+mesures passent par TagDatabase.search_by_name, donc par la normalisation des
+noms (name_key) : le parcours est celui utilisé tant que l'index n'est pas publié.
+
+Usage : python benchmark.py [nombre_de_noms]   (1 000 000 par défaut)
+"""
+import sys
+import time
+import random
+
+from root import TagDatabase
+from stockage import MemoryStorage
+
+WORDS = ["img", "photo", "Vacances", "paris", "plage", "skeleton", "spectator", "werebear",
+         "dragon", "scan", "facture", "rapport", "vidéo", "concert", "chat", "Été", "CAFÉ"]
+QUERIES = ["skel", "paris 2019", "dragon", "photo_0042", "ch", "ete", "Cafe", "video", "xyz"]
+TYPES = {".jpg": "image", ".png": "image", ".mp4": "video", ".pdf": "document", ".docx": "document"}
+
+
+def generate_objects(count: int, seed: int = 42) -> list:
+    """Objets synthétiques (format de StorageBackend.load) : deux mots, un numéro et une extension"""
+    rng = random.Random(seed)
+    extensions = list(TYPES)
+    objects = []
+    for number in range(count):
+        extension = rng.choice(extensions)
+        name = f"{rng.choice(WORDS)}_{rng.choice(WORDS)}_{rng.randrange(10000):04d}{extension}"
+        objects.append({"id": f"0_{number:016d}", "name": name, "description": "",
+                        "type": TYPES[extension], "location": f"/bench/{number}{extension}"})
+    return objects
+
+
+def timed_search(db: TagDatabase, query: str) -> tuple:
+    start = time.perf_counter()
+    found = db.search_by_name(query)
+    return sorted(obj.id for obj in found), time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    storage = MemoryStorage({"objects": generate_objects(count), "tags": {}, "collections": []})
+
+    start = time.perf_counter()
+    db = TagDatabase("benchmark", storage)
+    print(f"{count} noms, chargement: {time.perf_counter() - start:.2f} s")
+
+    # Parcours : comme pendant la construction de l'index en arrière-plan
+    db.warming_indexes = True
+    scans = {query: timed_search(db, query) for query in QUERIES}
+
+    start = time.perf_counter()
+    db.warm_indexes().join()
+    index = db.name_index
+    print(f"Construction des index des noms: {time.perf_counter() - start:.2f} s, "
+          f"{len(index.postings)} trigrammes, "
+          f"{sum(p.memory_size() for p in index.postings.values()) / 1e6:.1f} Mo de listes")
+
+    print(f"{'requête':<14}{'résultats':>10}{'parcours':>12}{'index':>12}")
+    for query in QUERIES:
+        expected, scan_time = scans[query]
+        found, index_time = timed_search(db, query)
+        assert found == expected, query
+        print(f"{query:<14}{len(found):>10}{scan_time * 1000:>10.1f}ms{index_time * 1000:>10.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""Indexation du contenu des documents locaux (texte brut et formats bureautiques zippés)
+
+Le texte est extrait avec la bibliothèque standard seulement : fichiers texte
+décodés directement, docx/xlsx/pptx/odt/ods/odp lus dans leurs parties XML.
+Les mots extraits alimentent un index inversé SQLite enregistré sur disque,
+indexé par (emplacement, taille, mtime) : un fichier inchangé n'est jamais relu.
+"""
+import os
+import re
+import codecs
+import queue
+import sqlite3
+import threading
+import zipfile
+import xml.etree.ElementTree as ElementTree
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from indexation import TextIndex
+
+CONTENT_FILENAME = "contenu.db"
+CONTENT_WORKERS = min(4, os.cpu_count() or 1)  # Fichiers lus en parallèle
+CONTENT_CHUNK_SIZE = 32  # Fichiers extraits entre deux enregistrements dans l'index
+MAX_TEXT_BYTES = 8 * 1024 * 1024    # Texte lu au plus dans un fichier texte
+MAX_PART_BYTES = 64 * 1024 * 1024   # Taille décompressée maximale des parties XML lues
+
+TEXT_EXTENSIONS = {"txt", "md", "csv", "tsv", "log", "ini", "json", "xml", "html", "htm"}
+
+# Extension -> [(parties XML lues, éléments dont le texte forme un bloc)]
+ZIP_PARTS: Dict[str, List[Tuple["re.Pattern", Tuple[str, ...]]]] = {
+    "docx": [(re.compile(r"word/(document|header\d*|footer\d*|footnotes|endnotes)\.xml$"), ("p",))],
+    "xlsx": [(re.compile(r"xl/sharedStrings\.xml$"), ("si",)),
+             (re.compile(r"xl/worksheets/sheet\d+\.xml$"), ("is",))],  # Textes saisis dans la cellule
+    "pptx": [(re.compile(r"ppt/slides/slide\d+\.xml$"), ("p",))],
+    "odt": [(re.compile(r"content\.xml$"), ("p", "h"))],
+    "ods": [(re.compile(r"content\.xml$"), ("p", "h"))],
+    "odp": [(re.compile(r"content\.xml$"), ("p", "h"))],
+}
+
+CONTENT_EXTENSIONS = TEXT_EXTENSIONS | ZIP_PARTS.keys()
+
+
+def file_extension(location: str) -> str:
+    return os.path.splitext(location)[1].lstrip('.').lower()
+
+
+def extract_text(location: str) -> str:
+    """Texte d'un fichier texte ou bureautique ("" pour un format non pris en charge)"""
+    extension = file_extension(location)
+    if extension in TEXT_EXTENSIONS:
+        with open(location, 'rb') as f:
+            data = f.read(MAX_TEXT_BYTES)
+        try:
+            # Une lecture tronquée peut couper le dernier caractère UTF-8 : il est ignoré
+            return codecs.getincrementaldecoder('utf-8')().decode(data, final=len(data) < MAX_TEXT_BYTES)
+        except UnicodeDecodeError:
+            return data.decode('cp1252', errors='replace')
+    parts = ZIP_PARTS.get(extension)
+    if parts is None:
+        return ""
+
+    blocks = []
+    with zipfile.ZipFile(location) as archive:
+        budget = MAX_PART_BYTES
+        for info in archive.infolist():
+            for pattern, block_tags in parts:
+                if pattern.match(info.filename) and info.file_size <= budget:
+                    budget -= info.file_size
+                    with archive.open(info) as part:
+                        blocks.extend(_xml_blocks(part, block_tags))
+    return "\n".join(blocks)
+
+
+def _xml_blocks(part, block_tags: Tuple[str, ...]) -> Iterable[str]:
+    """Textes des éléments block_tags (paragraphes, cellules), lus au fil du fichier
+
+    Les morceaux d'un paragraphe (w:r/w:t) sont recollés sans espace ; chaque
+    élément est vidé après lecture pour garder une mémoire constante.
+    """
+    for _, element in ElementTree.iterparse(part):
+        if element.tag.rsplit('}', 1)[-1] in block_tags:
+            text = "".join(element.itertext())
+            if text:
+                yield text
+            element.clear()
+
+
+class ContentIndex:
+    """Index inversé du contenu des fichiers, enregistré dans une base SQLite
+
+    Les fichiers sont repérés par (emplacement, taille, mtime_ns) ; chaque mot
+    normalisé (comme TextIndex) est associé aux fichiers qui le contiennent.
+    La connexion est partagée entre threads, protégée par un verrou.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS files (
+            id INTEGER PRIMARY KEY,
+            location TEXT NOT NULL UNIQUE,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS postings (
+            word TEXT NOT NULL,
+            file_id INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (word, file_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_postings_file ON postings(file_id);
+    """
+
+    def __init__(self, data_dir: str, filename: str = CONTENT_FILENAME):
+        os.makedirs(data_dir, exist_ok=True)
+        self.path = os.path.join(data_dir, filename)
+        self.conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self._lock = threading.Lock()
+        self.closed = False  # Une recherche commencée avant close() ne trouve plus rien
+
+    def signatures(self) -> Dict[str, Tuple[int, int]]:
+        """Emplacement -> (taille, mtime_ns) des fichiers indexés"""
+        with self._lock:
+            return {location: (size, mtime_ns) for location, size, mtime_ns in
+                    self.conn.execute("SELECT location, size, mtime_ns FROM files")}
+
+    def store(self, location: str, size: int, mtime_ns: int, text: str) -> None:
+        """Remplace les mots indexés pour le fichier"""
+        counts = Counter(TextIndex.words(text))
+        with self._lock:
+            self.conn.execute("BEGIN")
+            try:
+                row = self.conn.execute("SELECT id FROM files WHERE location = ?", (location,)).fetchone()
+                if row is not None:
+                    file_id = row[0]
+                    self.conn.execute("DELETE FROM postings WHERE file_id = ?", (file_id,))
+                    self.conn.execute("UPDATE files SET size = ?, mtime_ns = ? WHERE id = ?",
+                                      (size, mtime_ns, file_id))
+                else:
+                    file_id = self.conn.execute(
+                        "INSERT INTO files (location, size, mtime_ns) VALUES (?, ?, ?)",
+                        (location, size, mtime_ns)).lastrowid
+                self.conn.executemany("INSERT INTO postings (word, file_id, count) VALUES (?, ?, ?)",
+                                      ((word, file_id, count) for word, count in counts.items()))
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def remove(self, locations: Iterable[str]) -> None:
+        """Oublie les fichiers (supprimés de la base ou déplacés)"""
+        with self._lock:
+            self.conn.execute("BEGIN")
+            try:
+                for location in locations:
+                    row = self.conn.execute("SELECT id FROM files WHERE location = ?", (location,)).fetchone()
+                    if row is not None:
+                        self.conn.execute("DELETE FROM postings WHERE file_id = ?", row)
+                        self.conn.execute("DELETE FROM files WHERE id = ?", row)
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def search(self, words: List[str]) -> List[str]:
+        """Emplacements des fichiers contenant tous les mots (normalisés)"""
+        words = sorted(set(words))
+        if not words:
+            return []
+        matching = " INTERSECT ".join("SELECT file_id FROM postings WHERE word = ?" for _ in words)
+        with self._lock:
+            if self.closed:
+                return []
+            return [location for location, in self.conn.execute(
+                f"SELECT location FROM files WHERE id IN ({matching})", words)]
+
+    def estimate(self, words: List[str]) -> int:
+        """Borne du nombre de résultats de search(words) : le mot le moins fréquent"""
+        words = set(words)
+        if not words:
+            return 0
+        with self._lock:
+            if self.closed:
+                return 0
+            return min(self.conn.execute("SELECT COUNT(*) FROM postings WHERE word = ?", (word,)).fetchone()[0]
+                       for word in words)
+
+    def close(self) -> None:
+        with self._lock:
+            self.closed = True
+            self.conn.close()
+
+
+class ContentIndexer:
+    """Indexe le contenu des fichiers en arrière-plan
+
+    Un thread de coordination reçoit les listes d'emplacements, écarte les
+    fichiers inchangés depuis leur indexation, fait extraire le texte des
+    autres par un pool de threads et enregistre les résultats par paquets de
+    CONTENT_CHUNK_SIZE. on_indexed est appelé (depuis ce thread) après chaque
+    paquet enregistré.
+    """
+
+    def __init__(self, index: ContentIndex, on_indexed: Optional[Callable[[], None]] = None,
+                 workers: int = CONTENT_WORKERS):
+        self.index = index
+        self.on_indexed = on_indexed
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self._queue: "queue.Queue[Optional[Tuple[List[str], bool]]]" = queue.Queue()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="content-indexer", daemon=True)
+        self._thread.start()
+
+    def submit(self, locations: Iterable[str], prune: bool = False) -> None:
+        """Programme l'indexation des fichiers ; avec prune, locations est la liste complète
+        et les fichiers indexés qui n'y figurent plus sont oubliés"""
+        self._queue.put((list(locations), prune))
+
+    def stop(self) -> None:
+        """Arrête l'indexation après les fichiers en cours de lecture"""
+        self._stopped.set()
+        self._queue.put(None)
+        self._thread.join()
+        self.pool.shutdown(wait=True)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            request = self._queue.get()
+            if request is None:
+                break
+            try:
+                self._index(*request)
+            except Exception as e:
+                print(f"Erreur lors de l'indexation du contenu: {e}")
+
+    def _index(self, locations: List[str], prune: bool) -> None:
+        signatures = self.index.signatures()
+        if prune:
+            wanted = set(locations)
+            self.index.remove(location for location in signatures if location not in wanted)
+
+        changed = []
+        for location in locations:
+            try:
+                stat = os.stat(location)
+            except OSError:
+                continue  # Fichier absent ou inaccessible : réessayé au prochain passage
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if signatures.get(location) != signature:
+                changed.append((location, signature))
+
+        for start in range(0, len(changed), CONTENT_CHUNK_SIZE):
+            if self._stopped.is_set():
+                return
+            futures = {self.pool.submit(extract_text, location): (location, signature)
+                       for location, signature in changed[start:start + CONTENT_CHUNK_SIZE]}
+            for future in as_completed(futures):
+                location, (size, mtime_ns) = futures[future]
+                try:
+                    text = future.result()
+                except Exception as e:
+                    # Enregistré vide : un fichier illisible n'est relu que s'il change
+                    print(f"Erreur lors de l'extraction du contenu de {location}: {e}")
+                    text = ""
+                self.index.store(location, size, mtime_ns, text)
+            if self.on_indexed is not None:
+                self.on_indexed()
@@ -0,0 +1,940 @@
+import os
+import re
+import heapq
+import math
+import sys
+import posixpath
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import MutableSet
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# Systèmes de fichiers insensibles à la casse par défaut (Windows, macOS)
+CASE_INSENSITIVE_PATHS = os.name == 'nt' or sys.platform == 'darwin'
+
+EXTERNAL_PREFIXES = ('http://', 'https://', 'www.')
+
+
+def canonical_location(location: str, resolve: bool = False) -> str:
+    """Retourne la forme canonique d'un emplacement, utilisée comme clé d'index
+
+    Les séparateurs sont unifiés en '/', les '.' et '..' résolus et la casse
+    ignorée si le système le demande. Avec resolve, les liens symboliques sont
+    suivis (os.path.realpath). Les URL sont seulement débarrassées des espaces.
+    """
+    location = location.strip()
+    if location.startswith(EXTERNAL_PREFIXES):
+        return location
+    if resolve and location:
+        location = os.path.realpath(location)
+    location = location.replace('\\', '/')
+    if location:
+        location = posixpath.normpath(location)
+    if CASE_INSENSITIVE_PATHS:
+        location = location.casefold()
+    return location
+
+
+# Listes d'appartenance compressées (bitmaps « roaring »)
+#
+# Un entier est découpé en 16 bits de poids fort (clé du conteneur) et 16 bits
+# de poids faible (position dans le conteneur). Un conteneur peu rempli est un
+# array('H') trié (2 octets par élément), un conteneur dense (plus de
+# ARRAY_MAX_SIZE éléments) est un tableau de 65536 bits (8 Ko).
+
+ARRAY_MAX_SIZE = 4096
+CONTAINER_BYTES = 65536 // 8
+
+_FLAGS_TO_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+
+# Positions des bits à 1 pour chaque valeur d'octet
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+if hasattr(int, "bit_count"):
+    def _popcount(bits: int) -> int:
+        return bits.bit_count()
+else:
+    def _popcount(bits: int) -> int:
+        return bin(bits).count("1")
+
+
+class _DenseContainer:
+    """Conteneur dense : 65536 bits modifiables sur place et leur nombre"""
+
+    __slots__ = ("data", "count")
+
+    def __init__(self, data: bytearray, count: int):
+        self.data = data
+        self.count = count
+
+    @classmethod
+    def from_bits(cls, bits: int, count: int) -> "_DenseContainer":
+        return cls(bytearray(bits.to_bytes(CONTAINER_BYTES, 'little')), count)
+
+    @classmethod
+    def from_values(cls, values) -> "_DenseContainer":
+        # Un octet par bit puis conversion en binaire : bien plus rapide qu'un masque par valeur
+        flags = bytearray(65536)
+        for value in values:
+            flags[value] = 1
+        bits = int(flags.translate(_FLAGS_TO_DIGITS)[::-1], 2)
+        return cls.from_bits(bits, len(values))
+
+    def bits(self) -> int:
+        return int.from_bytes(self.data, 'little')
+
+    def values(self) -> List[int]:
+        values = []
+        for index, byte in enumerate(self.data):
+            if byte:
+                base = index << 3
+                values.extend(base + bit for bit in _BYTE_BITS[byte])
+        return values
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, low: int) -> bool:
+        return bool(self.data[low >> 3] >> (low & 7) & 1)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, _DenseContainer) and self.data == other.data
+
+    def add(self, low: int) -> None:
+        mask = 1 << (low & 7)
+        if not self.data[low >> 3] & mask:
+            self.data[low >> 3] |= mask
+            self.count += 1
+
+    def discard(self, low: int) -> None:
+        mask = 1 << (low & 7)
+        if self.data[low >> 3] & mask:
+            self.data[low >> 3] ^= mask
+            self.count -= 1
+
+    def copy(self) -> "_DenseContainer":
+        return _DenseContainer(bytearray(self.data), self.count)
+
+
+def _bits(container) -> int:
+    if isinstance(container, array):
+        return _DenseContainer.from_values(container).bits()
+    return container.bits()
+
+
+def _filter_array(values, dense: _DenseContainer, keep: bool) -> List[int]:
+    """Garde les valeurs présentes (keep) ou absentes du conteneur dense"""
+    data = dense.data
+    return [value for value in values if bool(data[value >> 3] >> (value & 7) & 1) == keep]
+
+
+def _make_container(values=None, bits: Optional[int] = None):
+    """Choisit la représentation la plus compacte (None si vide)"""
+    if bits is not None:
+        count = _popcount(bits)
+        if count == 0:
+            return None
+        dense = _DenseContainer.from_bits(bits, count)
+        return dense if count > ARRAY_MAX_SIZE else array('H', dense.values())
+    if not values:
+        return None
+    if len(values) > ARRAY_MAX_SIZE:
+        return _DenseContainer.from_values(values)
+    return array('H', values)
+
+
+class Bitmap:
+    """Ensemble d'entiers positifs compressé, avec opérations ensemblistes par conteneur"""
+
+    __slots__ = ("_containers",)
+
+    def __init__(self, values: Iterable[int] = ()):
+        self._containers: Dict[int, object] = {}
+        self._fill(sorted(set(values)))
+
+    @classmethod
+    def from_sorted(cls, values: List[int]) -> "Bitmap":
+        """Construit le bitmap d'une liste déjà triée et sans doublons (sans recopie)"""
+        bitmap = cls.__new__(cls)
+        bitmap._containers = {}
+        bitmap._fill(values)
+        return bitmap
+
+    def _fill(self, values: List[int]) -> None:
+        start, count = 0, len(values)
+        while start < count:
+            key = values[start] >> 16
+            end = bisect_left(values, (key + 1) << 16, start)
+            chunk = values[start:end]
+            if key:
+                chunk = list(map((key << 16).__rsub__, chunk))
+            self._containers[key] = _make_container(chunk)
+            start = end
+
+    @classmethod
+    def _from_containers(cls, containers: Dict[int, object]) -> "Bitmap":
+        bitmap = cls.__new__(cls)
+        bitmap._containers = containers
+        return bitmap
+
+    def __len__(self) -> int:
+        return sum(len(container) for container in self._containers.values())
+
+    def __bool__(self) -> bool:
+        return bool(self._containers)
+
+    def __contains__(self, value: int) -> bool:
+        container = self._containers.get(value >> 16)
+        if container is None:
+            return False
+        low = value & 0xFFFF
+        if isinstance(container, array):
+            index = bisect_left(container, low)
+            return index < len(container) and container[index] == low
+        return low in container
+
+    def __iter__(self) -> Iterator[int]:
+        for key in sorted(self._containers):
+            container = self._containers[key]
+            base = key << 16
+            lows = container if isinstance(container, array) else container.values()
+            for low in lows:
+                yield base + low
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Bitmap):
+            return NotImplemented
+        if self._containers.keys() != other._containers.keys():
+            return False
+        for key, a in self._containers.items():
+            b = other._containers[key]
+            if type(a) is not type(b):
+                a = a if isinstance(a, array) else array('H', a.values())
+                b = b if isinstance(b, array) else array('H', b.values())
+            if a != b:
+                return False
+        return True
+
+    def __repr__(self) -> str:
+        return f"Bitmap({len(self)} éléments)"
+
+    def copy(self) -> "Bitmap":
+        return Bitmap._from_containers({key: container[:] if isinstance(container, array) else container.copy()
+                                        for key, container in self._containers.items()})
+
+    def add(self, value: int) -> None:
+        key, low = value >> 16, value & 0xFFFF
+        container = self._containers.get(key)
+        if container is None:
+            self._containers[key] = array('H', (low,))
+        elif isinstance(container, array):
+            index = bisect_left(container, low)
+            if index < len(container) and container[index] == low:
+                return
+            container.insert(index, low)
+            if len(container) > ARRAY_MAX_SIZE:
+                self._containers[key] = _DenseContainer.from_values(container)
+        else:
+            container.add(low)
+
+    def discard(self, value: int) -> None:
+        key, low = value >> 16, value & 0xFFFF
+        container = self._containers.get(key)
+        if container is None:
+            return
+        if isinstance(container, array):
+            index = bisect_left(container, low)
+            if index < len(container) and container[index] == low:
+                del container[index]
+                if not container:
+                    del self._containers[key]
+        else:
+            container.discard(low)
+            if len(container) <= ARRAY_MAX_SIZE // 2:
+                # Hystérésis : éviter d'alterner entre les deux formes autour du seuil
+                self._containers[key] = _make_container(container.values())
+
+    def __and__(self, other: "Bitmap") -> "Bitmap":
+        if len(self._containers) > len(other._containers):
+            self, other = other, self
+        result = {}
+        for key, a in self._containers.items():
+            b = other._containers.get(key)
+            if b is None:
+                continue
+            if isinstance(a, array) and isinstance(b, array):
+                if len(a) > len(b):
+                    a, b = b, a
+                container = _make_container(sorted(set(a).intersection(b)))
+            elif isinstance(a, array):
+                container = _make_container(_filter_array(a, b, True))
+            elif isinstance(b, array):
+                container = _make_container(_filter_array(b, a, True))
+            else:
+                container = _make_container(bits=a.bits() & b.bits())
+            if container is not None:
+                result[key] = container
+        return Bitmap._from_containers(result)
+
+    def __or__(self, other: "Bitmap") -> "Bitmap":
+        result = self.copy()._containers
+        for key, b in other._containers.items():
+            a = result.get(key)
+            if a is None:
+                result[key] = b[:] if isinstance(b, array) else b.copy()
+            elif isinstance(a, array) and isinstance(b, array):
+                result[key] = _make_container(sorted(set(a).union(b)))
+            else:
+                result[key] = _make_container(bits=_bits(a) | _bits(b))
+        return Bitmap._from_containers(result)
+
+    def __sub__(self, other: "Bitmap") -> "Bitmap":
+        result = {}
+        for key, a in self._containers.items():
+            b = other._containers.get(key)
+            if b is None:
+                result[key] = a[:] if isinstance(a, array) else a.copy()
+                continue
+            if isinstance(a, array) and isinstance(b, array):
+                container = _make_container(sorted(set(a).difference(b)))
+            elif isinstance(a, array):
+                container = _make_container(_filter_array(a, b, False))
+            else:
+                bits_a = a.bits()
+                container = _make_container(bits=bits_a ^ (bits_a & _bits(b)))
+            if container is not None:
+                result[key] = container
+        return Bitmap._from_containers(result)
+
+    def memory_size(self) -> int:
+        """Taille approximative des conteneurs en octets"""
+        return sum(container.itemsize * len(container) if isinstance(container, array) else CONTAINER_BYTES
+                   for container in self._containers.values())
+
+
+class IdInterner:
+    """Associe à chaque ID d'objet un entier dense, utilisé dans les bitmaps
+
+    Les numéros ne sont jamais réattribués : un ID supprimé garde le sien,
+    ce qui permet d'annuler un lot sans renuméroter les bitmaps.
+    """
+
+    def __init__(self):
+        self.numbers: Dict[str, int] = {}  # ID -> Numéro
+        self.ids: List[str] = []           # Numéro -> ID
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def intern(self, obj_id: str) -> int:
+        number = self.numbers.get(obj_id)
+        if number is None:
+            number = len(self.ids)
+            self.numbers[obj_id] = number
+            self.ids.append(obj_id)
+        return number
+
+    def intern_many(self, obj_ids: Iterable[str]) -> List[int]:
+        obj_ids = list(obj_ids)
+        numbers = list(map(self.numbers.get, obj_ids))
+        if None in numbers:
+            numbers = [self.intern(obj_id) if number is None else number
+                       for obj_id, number in zip(obj_ids, numbers)]
+        return numbers
+
+    def lookup(self, obj_id: str) -> Optional[int]:
+        return self.numbers.get(obj_id)
+
+    def bitmap(self, obj_ids: Iterable[str]) -> Bitmap:
+        """Bitmap des IDs donnés (les IDs inconnus sont ignorés)"""
+        found = map(self.numbers.get, obj_ids)
+        return Bitmap(number for number in found if number is not None)
+
+    def resolve(self, bitmap: Bitmap) -> Iterator[str]:
+        ids = self.ids
+        return (ids[number] for number in bitmap)
+
+
+class IdSet(MutableSet):
+    """Ensemble d'IDs d'objets stocké sous forme de bitmap
+
+    S'utilise comme un set de chaînes (in, len, itération, add, discard) ;
+    l'attribut bitmap donne accès à la représentation compressée.
+    """
+
+    __slots__ = ("bitmap", "interner")
+
+    def __init__(self, interner: IdInterner, obj_ids: Iterable[str] = ()):
+        self.interner = interner
+        self.bitmap = Bitmap(interner.intern_many(obj_ids))
+
+    def _from_iterable(self, iterable):
+        return set(iterable)
+
+    def __contains__(self, obj_id) -> bool:
+        number = self.interner.lookup(obj_id)
+        return number is not None and number in self.bitmap
+
+    def __iter__(self) -> Iterator[str]:
+        return self.interner.resolve(self.bitmap)
+
+    def __len__(self) -> int:
+        return len(self.bitmap)
+
+    def add(self, obj_id: str) -> None:
+        self.bitmap.add(self.interner.intern(obj_id))
+
+    def discard(self, obj_id: str) -> None:
+        number = self.interner.lookup(obj_id)
+        if number is not None:
+            self.bitmap.discard(number)
+
+    def __repr__(self) -> str:
+        return f"IdSet({len(self)} objets)"
+
+
+class TrigramIndex:
+    """Index des trigrammes (3 caractères consécutifs) de textes en minuscules
+
+    Un texte contenant une sous-chaîne contient forcément tous ses
+    trigrammes : l'intersection de leurs listes donne des candidats, qu'il
+    reste à vérifier. Les sous-chaînes de moins de 3 caractères ne filtrent rien.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Bitmap] = {}  # Trigramme -> Numéros
+
+    @staticmethod
+    def trigrams(text: str) -> Set[str]:
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def build(self, items: Iterable[Tuple[int, str]]) -> None:
+        """Construit l'index d'un coup à partir de (numéro, texte en minuscules)"""
+        lists: Dict[str, List[int]] = defaultdict(list)
+        for number, text in sorted(items):
+            for trigram in {text[i:i + 3] for i in range(len(text) - 2)}:
+                lists[trigram].append(number)
+        # Numéros parcourus dans l'ordre : chaque liste est déjà triée
+        self.postings = {trigram: Bitmap.from_sorted(numbers) for trigram, numbers in lists.items()}
+
+    def add(self, number: int, text: str) -> None:
+        for trigram in self.trigrams(text):
+            postings = self.postings.get(trigram)
+            if postings is None:
+                postings = self.postings[trigram] = Bitmap()
+            postings.add(number)
+
+    def remove(self, number: int, text: str) -> None:
+        for trigram in self.trigrams(text):
+            postings = self.postings.get(trigram)
+            if postings is not None:
+                postings.discard(number)
+                if not postings:
+                    del self.postings[trigram]
+
+    def candidates(self, substring: str) -> Optional[Bitmap]:
+        """Numéros pouvant contenir la sous-chaîne (None : pas de filtrage possible)"""
+        trigrams = self.trigrams(substring)
+        if not trigrams:
+            return None
+        lists = []
+        for trigram in trigrams:
+            postings = self.postings.get(trigram)
+            if postings is None:
+                return Bitmap()
+            lists.append(postings)
+        lists.sort(key=len)
+        result = lists[0]
+        for postings in lists[1:]:
+            result = result & postings
+            if not result:
+                break
+        return result
+
+
+def normalize_text(text: str) -> str:
+    """Clé de comparaison d'un texte : sans accents (NFKD) et sans casse (casefold)
+
+    "Élan" et "elan", "Donjon É" et "donjon e" ont la même clé. Les textes
+    déjà en ASCII minuscules sont renvoyés tels quels, sans copie.
+    """
+    if text.isascii():
+        key = text.lower()
+    else:
+        decomposed = unicodedata.normalize('NFKD', text)
+        key = "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+    return text if key == text else key
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Distance de Levenshtein (insertions, suppressions, substitutions)"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def fuzzy_distance(word: str) -> int:
+    """Nombre de fautes tolérées selon la longueur du mot cherché"""
+    if len(word) <= 2:
+        return 0
+    if len(word) <= 5:
+        return 1
+    return 2
+
+
+class BKTree:
+    """Arbre BK : retrouve les mots à distance d'édition bornée sans tout parcourir
+
+    Chaque mot porte un compteur de références ; un mot retombé à zéro reste
+    dans l'arbre pour l'aiguillage mais n'est plus renvoyé. L'arbre est
+    reconstruit quand les mots morts deviennent majoritaires.
+    """
+
+    def __init__(self, words: Iterable[str] = ()):
+        self.root = None  # [mot, références, {distance: nœud}]
+        self.nodes: Dict[str, list] = {}
+        self.dead = 0
+        for word in words:
+            self.add(word)
+
+    def __len__(self) -> int:
+        return len(self.nodes) - self.dead
+
+    def __iter__(self) -> Iterator[str]:
+        return (word for word, node in self.nodes.items() if node[1])
+
+    def add(self, word: str) -> None:
+        node = self.nodes.get(word)
+        if node is not None:
+            if node[1] == 0:
+                self.dead -= 1
+            node[1] += 1
+            return
+        node = [word, 1, {}]
+        self.nodes[word] = node
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = edit_distance(word, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def remove(self, word: str) -> None:
+        node = self.nodes.get(word)
+        if node is None or node[1] == 0:
+            return
+        node[1] -= 1
+        if node[1] == 0:
+            self.dead += 1
+            if self.dead > len(self.nodes) // 2:
+                self._rebuild()
+
+    def _rebuild(self) -> None:
+        counts = [(node[0], node[1]) for node in self.nodes.values() if node[1]]
+        self.root = None
+        self.nodes = {}
+        self.dead = 0
+        for word, count in counts:
+            self.add(word)
+            self.nodes[word][1] = count
+
+    def search(self, word: str, max_distance: int) -> List[Tuple[str, int]]:
+        """Mots à distance <= max_distance : [(mot, distance)] du plus proche au plus lointain"""
+        results = []
+        pending = [self.root] if self.root is not None else []
+        while pending:
+            node = pending.pop()
+            distance = edit_distance(word, node[0])
+            if distance <= max_distance and node[1]:
+                results.append((node[0], distance))
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    pending.append(child)
+        results.sort(key=lambda item: (item[1], item[0]))
+        return results
+
+
+_WORD_PATTERN = re.compile(r"[^\W_]+")  # Lettres et chiffres (le _ sépare les mots)
+
+
+class WordIndex:
+    """Mots des noms (clés normalisées) -> numéros, avec recherche approchée par arbre BK"""
+
+    def __init__(self):
+        self.postings: Dict[str, Bitmap] = {}
+        self.tree = BKTree()
+
+    @staticmethod
+    def words(text: str) -> Set[str]:
+        return set(_WORD_PATTERN.findall(text))
+
+    def build(self, items: Iterable[Tuple[int, str]]) -> None:
+        lists: Dict[str, List[int]] = defaultdict(list)
+        for number, text in sorted(items):
+            for word in self.words(text):
+                lists[word].append(number)
+        self.postings = {word: Bitmap.from_sorted(numbers) for word, numbers in lists.items()}
+        self.tree = BKTree(self.postings)
+
+    def add(self, number: int, text: str) -> None:
+        for word in self.words(text):
+            postings = self.postings.get(word)
+            if postings is None:
+                postings = self.postings[word] = Bitmap()
+                self.tree.add(word)
+            postings.add(number)
+
+    def remove(self, number: int, text: str) -> None:
+        for word in self.words(text):
+            postings = self.postings.get(word)
+            if postings is not None:
+                postings.discard(number)
+                if not postings:
+                    del self.postings[word]
+                    self.tree.remove(word)
+
+    def fuzzy(self, word: str, max_distance: int) -> Bitmap:
+        """Numéros dont le nom contient un mot proche de word"""
+        result = Bitmap()
+        for match, _ in self.tree.search(word, max_distance):
+            result = result | self.postings[match]
+        return result
+
+
+class TextIndex:
+    """Index plein texte (descriptions) : mots normalisés -> numéros, classement BM25
+
+    Chaque texte est aussi gardé comme la suite de ses mots : les positions
+    d'un mot s'y lisent directement, sans liste de positions par (mot, texte).
+    Une expression n'est vérifiée que sur les textes qui contiennent tous ses
+    mots (intersection des bitmaps, de la plus petite à la plus grande).
+    """
+
+    K1 = 1.2  # Saturation de la fréquence d'un mot
+    B = 0.75  # Normalisation par la longueur du texte
+
+    def __init__(self):
+        self.postings: Dict[str, Bitmap] = {}
+        self.documents: Dict[int, Tuple[str, ...]] = {}  # Numéro -> Mots du texte, dans l'ordre
+        self.total_length = 0
+
+    @staticmethod
+    def words(text: str) -> List[str]:
+        return _WORD_PATTERN.findall(normalize_text(text))
+
+    def build(self, items: Iterable[Tuple[int, str]]) -> None:
+        lists: Dict[str, List[int]] = defaultdict(list)
+        self.documents = {}
+        self.total_length = 0
+        for number, text in sorted(items):
+            words = tuple(map(sys.intern, self.words(text)))
+            if words:
+                self.documents[number] = words
+                self.total_length += len(words)
+                for word in set(words):
+                    lists[word].append(number)
+        self.postings = {word: Bitmap.from_sorted(numbers) for word, numbers in lists.items()}
+
+    def add(self, number: int, text: str) -> None:
+        words = tuple(map(sys.intern, self.words(text)))
+        if not words:
+            return
+        self.documents[number] = words
+        self.total_length += len(words)
+        for word in set(words):
+            postings = self.postings.get(word)
+            if postings is None:
+                postings = self.postings[word] = Bitmap()
+            postings.add(number)
+
+    def remove(self, number: int) -> None:
+        words = self.documents.pop(number, None)
+        if words is None:
+            return
+        self.total_length -= len(words)
+        for word in set(words):
+            postings = self.postings[word]
+            postings.discard(number)
+            if not postings:
+                del self.postings[word]
+
+    def matches(self, text: str) -> Bitmap:
+        """Numéros des textes contenant les mots de text, à la suite et dans l'ordre"""
+        words = tuple(self.words(text))
+        lists = [self.postings.get(word) for word in set(words)]
+        if not words or None in lists:
+            return Bitmap()
+        lists.sort(key=len)
+        result = lists[0]
+        for postings in lists[1:]:
+            result = result & postings
+            if not result:
+                return result
+        if len(words) == 1:
+            return result
+        return Bitmap.from_sorted([number for number in result
+                                   if self._contains_phrase(self.documents[number], words)])
+
+    def estimate(self, text: str) -> int:
+        """Borne du nombre de résultats de matches(text) : la plus courte liste de ses mots"""
+        words = set(self.words(text))
+        if not words:
+            return 0
+        return min(len(self.postings.get(word, ())) for word in words)
+
+    @staticmethod
+    def _contains_phrase(document: Tuple[str, ...], words: Tuple[str, ...]) -> bool:
+        first, length = words[0], len(words)
+        start = 0
+        try:
+            while True:
+                start = document.index(first, start)
+                if document[start:start + length] == words:
+                    return True
+                start += 1
+        except ValueError:
+            return False
+
+    def scorer(self, words: List[str]) -> Callable[[int], float]:
+        """Score BM25 d'un texte (numéro) pour les mots normalisés de la requête
+
+        Les idf et la longueur moyenne sont calculés une seule fois pour tous
+        les résultats à classer.
+        """
+        count = len(self.documents)
+        weights = []
+        for word in set(words):
+            postings = self.postings.get(word)
+            if postings is not None:
+                found = len(postings)
+                weights.append((word, math.log(1 + (count - found + 0.5) / (found + 0.5)) * (self.K1 + 1)))
+        documents = self.documents
+        average = self.total_length / count if count else 1.0
+        k1, b = self.K1, self.B
+
+        def score(number: int) -> float:
+            document = documents.get(number)
+            if document is None or not weights:
+                return 0.0
+            norm = k1 * (1 - b + b * len(document) / average)
+            total = 0.0
+            for word, weight in weights:
+                frequency = document.count(word)
+                if frequency:
+                    total += weight * frequency / (frequency + norm)
+            return total
+
+        return score
+
+
+WILDCARDS = "*?"  # * : plusieurs caractères (ou aucun), ? : un caractère
+
+
+def has_wildcards(text: str) -> bool:
+    return any(char in text for char in WILDCARDS)
+
+
+def wildcard_regex(pattern: str) -> "re.Pattern":
+    """Expression régulière ancrée équivalente au motif (les autres caractères sont littéraux)"""
+    parts = []
+    for char in pattern:
+        if char == "*":
+            parts.append(".*")
+        elif char == "?":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return re.compile("".join(parts) + r"\Z", re.DOTALL)
+
+
+def wildcard_fragments(pattern: str) -> Tuple[str, List[str]]:
+    """(préfixe littéral, fragments littéraux) d'un motif à jokers"""
+    fragments = [fragment for fragment in re.split(r"[*?]+", pattern) if fragment]
+    prefix = re.split(r"[*?]", pattern, 1)[0]
+    return prefix, fragments
+
+
+def prefix_upper(prefix: str) -> str:
+    """Plus petite chaîne supérieure à toutes celles qui commencent par prefix (non vide)"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class SortedKeyIndex:
+    """Clés triées (clé, numéro) : préfixes, égalités et bornes deviennent des intervalles
+
+    Les clés sont des textes (noms, dates ISO) ou des nombres (tailles).
+    """
+
+    def __init__(self):
+        self.entries: List[Tuple[str, int]] = []
+
+    def build(self, items: Iterable[Tuple[int, str]]) -> None:
+        self.entries = sorted((key, number) for number, key in items)
+
+    def add(self, number: int, key: str) -> None:
+        entry = (key, number)
+        position = bisect_left(self.entries, entry)
+        if position == len(self.entries) or self.entries[position] != entry:
+            self.entries.insert(position, entry)
+
+    def remove(self, number: int, key: str) -> None:
+        entry = (key, number)
+        position = bisect_left(self.entries, entry)
+        if position < len(self.entries) and self.entries[position] == entry:
+            del self.entries[position]
+
+    def _range(self, low: Tuple, high: Tuple) -> Iterator[Tuple[str, int]]:
+        start = bisect_left(self.entries, low)
+        end = bisect_left(self.entries, high, start)
+        return iter(self.entries[start:end])
+
+    def between(self, low=None, high=None) -> Iterator[tuple]:
+        """Entrées dont la clé vérifie low <= clé < high (None : pas de borne)"""
+        start = 0 if low is None else bisect_left(self.entries, (low,))
+        end = len(self.entries) if high is None else bisect_left(self.entries, (high,), start)
+        return iter(self.entries[start:end])
+
+    def count_between(self, low=None, high=None) -> int:
+        """Nombre d'entrées de between(low, high), sans les parcourir"""
+        start = 0 if low is None else bisect_left(self.entries, (low,))
+        end = len(self.entries) if high is None else bisect_left(self.entries, (high,), start)
+        return max(end - start, 0)
+
+    def prefix(self, prefix: str) -> Iterator[Tuple[str, int]]:
+        """Entrées dont la clé commence par prefix (par ordre de clé)"""
+        if not prefix:
+            return iter(self.entries)
+        return self.between(prefix, prefix_upper(prefix))
+
+    def equal(self, key: str) -> Iterator[Tuple[str, int]]:
+        return self._range((key,), (key, float("inf")))
+
+
+class CompletionIndex:
+    """Textes proposés à l'auto-complétion, triés par clé normalisée et classés par utilisation
+
+    Un préfixe est un intervalle du tableau trié ; seuls les limit textes les
+    plus utilisés de l'intervalle sont gardés (tas borné). Un même texte peut
+    être ajouté plusieurs fois (deux collections de même nom) : il reste
+    proposé tant qu'il n'a pas été retiré autant de fois.
+    """
+
+    def __init__(self):
+        self.entries: List[Tuple[str, str]] = []  # (clé normalisée, texte) triés
+        self.counts: Dict[str, int] = {}  # Texte -> Nombre d'utilisations
+        self.refs: Dict[str, int] = {}    # Texte -> Nombre d'ajouts
+
+    def add(self, text: str, count: int = 0) -> None:
+        if text in self.refs:
+            self.refs[text] += 1
+            self.counts[text] += count
+            return
+        self.refs[text] = 1
+        self.counts[text] = count
+        entry = (normalize_text(text), text)
+        self.entries.insert(bisect_left(self.entries, entry), entry)
+
+    def remove(self, text: str, count: int = 0) -> None:
+        refs = self.refs.get(text)
+        if refs is None:
+            return
+        if refs > 1:
+            self.refs[text] -= 1
+            self.counts[text] -= count
+            return
+        del self.refs[text]
+        del self.counts[text]
+        entry = (normalize_text(text), text)
+        position = bisect_left(self.entries, entry)
+        if position < len(self.entries) and self.entries[position] == entry:
+            del self.entries[position]
+
+    def use(self, text: str, delta: int = 1) -> None:
+        """Compte delta utilisations de plus pour text (s'il est présent)"""
+        if text in self.counts:
+            self.counts[text] += delta
+
+    def complete(self, prefix: str, limit: int) -> List[str]:
+        """Les limit textes les plus utilisés commençant par prefix (casse et accents ignorés)"""
+        key = normalize_text(prefix)
+        start = bisect_left(self.entries, (key,))
+        end = bisect_left(self.entries, (prefix_upper(key),), start) if key else len(self.entries)
+        counts = self.counts
+        best = heapq.nsmallest(limit + 1, self.entries[start:end], key=lambda entry: (-counts[entry[1]], entry))
+        return [text for _, text in best if text != prefix][:limit]
+
+    def __contains__(self, text: str) -> bool:
+        return text in self.refs
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def path_components(key: str) -> List[str]:
+    """Composants d'une clé d'emplacement canonique (« a/b/c.png » -> [a, b, c.png])"""
+    return key.rstrip("/").split("/")
+
+
+class PathTrie:
+    """Arbre des dossiers : chaque nœud garde les numéros de tous les objets de son sous-arbre
+
+    Un objet est ajouté à chacun des dossiers qui le contiennent : tous les
+    objets sous un dossier se lisent donc directement sur son nœud.
+    """
+
+    def __init__(self):
+        self.root: list = [{}, Bitmap()]  # [{composant: nœud}, numéros]
+
+    def add(self, number: int, folders: List[str]) -> None:
+        node = self.root
+        for component in folders:
+            child = node[0].get(component)
+            if child is None:
+                child = node[0][component] = [{}, Bitmap()]
+            child[1].add(number)
+            node = child
+
+    def remove(self, number: int, folders: List[str]) -> None:
+        path = [self.root]
+        for component in folders:
+            child = path[-1][0].get(component)
+            if child is None:
+                return
+            child[1].discard(number)
+            path.append(child)
+        # Supprimer les dossiers devenus vides
+        for depth in range(len(folders), 0, -1):
+            if path[depth][1]:
+                break
+            del path[depth - 1][0][folders[depth - 1]]
+
+    def lookup(self, folders: List[str]) -> Bitmap:
+        """Numéros des objets sous le dossier (bitmap de l'index : ne pas le modifier)"""
+        node = self.root
+        for component in folders:
+            node = node[0].get(component)
+            if node is None:
+                return Bitmap()
+        return node[1]
+
+    def items(self) -> Iterator[Tuple[Tuple[str, ...], Bitmap]]:
+        """(chemin du dossier, numéros) pour chaque dossier de l'arbre"""
+        pending = [((), self.root)]
+        while pending:
+            path, node = pending.pop()
+            for component, child in node[0].items():
+                pending.append((path + (component,), child))
+                yield path + (component,), child[1]
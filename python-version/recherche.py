@@ -0,0 +1,461 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, FrozenSet, Iterator, List, Optional, Tuple, Union
+
+# Syntaxe de la recherche avancée (voir README) :
+#   terme              nom contenant tous les mots du terme
+#   "terme exact"      nom identique (insensible à la casse)
+#   #tag  @collection  membres d'un tag (dans n'importe quel dossier) / des collections dont le nom correspond
+#   dossier:tag        tag rangé dans un dossier ; dossier:(a , b) pour plusieurs tags du dossier
+#   #dossier:tag       toujours un tag, même si le dossier porte le nom d'un champ (#type:image)
+#   _type              objets d'un type de fichier existant (_image, _video...), sinon un nom
+#   ~terme  #~tag      recherche approchée (fautes de frappe tolérées)
+#   champ:valeur       prédicat enregistré (ext:png, type:image, folder:E:/projet, size:>10MB, added:2025-08)
+#                      champ:(a , b) pour plusieurs valeurs du champ (ext:(png , jpg))
+#   sk*l?ton           nom entier correspondant au motif (* : plusieurs caractères, ? : un seul)
+#   a b, a AND b       les deux (l'espace vaut AND entre termes de natures différentes)
+#   a OR b, a , b      l'un ou l'autre
+#   NOT a, not(a)      exclusion ; a NOT b = a AND NOT b
+#   a XOR b            a OR b, les objets correspondant à a AND b étant classés en premier
+# Priorité : NOT > AND > OR > XOR. Les mots consécutifs d'un nom forment un seul terme.
+
+OPERATORS = ("AND", "OR", "NOT", "XOR")
+TAG_FOLDER_SEPARATOR = "/"  # Tags/dossier/tag.json <-> tag "dossier/tag"
+PLAN_CACHE_SIZE = 512  # Nombre de requêtes analysées gardées en cache
+
+
+class QuerySyntaxError(ValueError):
+    """Requête de recherche mal formée"""
+
+
+@dataclass(frozen=True)
+class Term:
+    kind: str   # "name", "exact", "wildcard", "tag", "collection", "fuzzy", "fuzzy_tag" ou un champ enregistré
+    value: str
+
+
+@dataclass(frozen=True)
+class And:
+    operands: Tuple["Node", ...]
+
+
+@dataclass(frozen=True)
+class Or:
+    operands: Tuple["Node", ...]
+
+
+@dataclass(frozen=True)
+class Xor:
+    """Même résultat que Or ; l'intersection des opérandes est classée en premier"""
+    operands: Tuple["Node", ...]
+
+
+@dataclass(frozen=True)
+class Not:
+    operand: "Node"
+
+
+Node = Union[Term, And, Or, Xor, Not]
+
+# Jetons : not( en fonction, parenthèses, virgule, phrase entre guillemets (fermante facultative) ou mot
+_TOKEN_PATTERN = re.compile(r'\s*(?:((?i:not)(?=\())|(\()|(\))|(,)|"([^"]*)"?|([^\s(),"]+))')
+
+_WORD_DELIMITERS = ' \t\n(),"'
+
+
+def word_span(query: str, position: int) -> Tuple[int, int]:
+    """(début, fin) du mot de la requête sous le curseur placé en position (vide entre deux mots)"""
+    position = min(position, len(query))
+    start = position
+    while start > 0 and query[start - 1] not in _WORD_DELIMITERS:
+        start -= 1
+    end = position
+    while end < len(query) and query[end] not in _WORD_DELIMITERS:
+        end += 1
+    return start, end
+
+
+def tokenize(query: str) -> List[Tuple[str, str]]:
+    """Découpe la requête en une seule passe : [(type, texte)]
+
+    Types : "(", ")", ",", "AND", "OR", "NOT", "XOR", "phrase" et "word".
+    """
+    tokens = []
+    position = 0
+    length = len(query)
+    while position < length:
+        match = _TOKEN_PATTERN.match(query, position)
+        if match is None or match.end() == position:
+            break  # Il ne reste que des espaces
+        position = match.end()
+        function_not, opening, closing, comma, phrase, word = match.groups()
+        if function_not:
+            tokens.append(("NOT", function_not))
+        elif opening:
+            tokens.append(("(", opening))
+        elif closing:
+            tokens.append((")", closing))
+        elif comma:
+            tokens.append((",", comma))
+        elif phrase is not None:
+            tokens.append(("phrase", phrase))
+        elif word in OPERATORS:
+            tokens.append((word, word))
+        else:
+            tokens.append(("word", word))
+    return tokens
+
+
+class _Parser:
+    """Analyse descendante récursive :
+
+    xor_expr := or_expr (XOR or_expr)*
+    or_expr  := and_expr ((OR | ",") and_expr)*
+    and_expr := not_expr ((AND | NOT)? not_expr)*
+    not_expr := NOT not_expr | primary
+    primary  := "(" xor_expr ")" | dossier: "(" xor_expr ")" | champ: "(" xor_expr ")" | terme
+    """
+
+    def __init__(self, tokens: List[Tuple[str, str]], fields: FrozenSet[str] = frozenset(),
+                 types: FrozenSet[str] = frozenset()):
+        self.tokens = tokens
+        self.fields = fields  # Champs « champ:valeur » reconnus (ceux de la base interrogée)
+        self.types = types    # Types de fichier existants (minuscules) : _type n'est un filtre que pour eux
+        self.position = 0
+        self.folder = ""  # Dossier d'un groupe dossier:( ... ) en cours
+        self.field = ""   # Champ d'un groupe champ:( ... ) en cours
+
+    def peek(self, offset: int = 0) -> str:
+        if self.position + offset < len(self.tokens):
+            return self.tokens[self.position + offset][0]
+        return ""
+
+    def advance(self) -> Tuple[str, str]:
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def parse(self) -> "Node":
+        if not self.tokens:
+            raise QuerySyntaxError("Requête vide")
+        node = self.parse_xor()
+        if self.position < len(self.tokens):
+            raise QuerySyntaxError(f"Jeton inattendu: {self.tokens[self.position][1]}")
+        return node
+
+    def parse_xor(self) -> "Node":
+        operands = [self.parse_or()]
+        while self.peek() == "XOR":
+            self.advance()
+            operands.append(self.parse_or())
+        return _flatten(Xor, operands)
+
+    def parse_or(self) -> "Node":
+        operands = [self.parse_and()]
+        while self.peek() in ("OR", ","):
+            self.advance()
+            operands.append(self.parse_and())
+        return _flatten(Or, operands)
+
+    def parse_and(self) -> "Node":
+        operands = [self.parse_not()]
+        while self.peek() in ("AND", "NOT", "(", "phrase", "word"):
+            kind = self.peek()
+            if kind == "AND":
+                self.advance()
+            operand = self.parse_not()  # Sans opérateur : AND implicite
+            operands.append(operand)
+        return _flatten(And, operands)
+
+    def parse_not(self) -> "Node":
+        if self.peek() == "NOT":
+            self.advance()
+            return _negate(self.parse_not())
+        return self.parse_primary()
+
+    def parse_group(self) -> "Node":
+        self.advance()
+        node = self.parse_xor()
+        if self.peek() != ")":
+            raise QuerySyntaxError("Parenthèse fermante manquante")
+        self.advance()
+        return node
+
+    def parse_primary(self) -> "Node":
+        kind = self.peek()
+        if kind == "(":
+            return self.parse_group()
+        if kind == "phrase":
+            text = self.advance()[1]
+            if self.field:
+                return Term(self.field, text)
+            return make_term(text, self.folder, self.fields, self.types) if self.folder else Term("exact", text)
+        if kind == "word":
+            text = self.advance()[1]
+            if text.endswith(":") and len(text) > 1 and self.peek() == "(" and \
+                    text[:-1].lower() in self.fields and not self.folder:
+                # champ:( ... ) : chaque mot du groupe est une valeur du champ (ext:(png , jpg))
+                outer_field = self.field
+                self.field = text[:-1].lower()
+                try:
+                    return self.parse_group()
+                finally:
+                    self.field = outer_field
+            if text.endswith(":") and len(text) > 1 and self.peek() == "(":
+                # dossier:( ... ) : les termes du groupe sont des tags du dossier (#dossier:( ... ) aussi)
+                outer = self.folder
+                self.folder = join_folder(outer, text[:-1].lstrip('#'))
+                try:
+                    return self.parse_group()
+                finally:
+                    self.folder = outer
+            if self.field and not text.startswith(("#", "@", "~")):
+                return Term(self.field, text)
+            if (text in ("#", "@", "~", "#~") or text[:-1].lower() in self.fields) and self.peek() == "phrase":
+                text += self.advance()[1]  # Préfixe ou champ suivi d'une valeur entre guillemets
+            words = [text]
+            if not _has_prefix(text, self.fields, self.types):
+                # Les mots consécutifs sans préfixe forment un seul terme
+                while self.peek() == "word" and not _has_prefix(self.tokens[self.position][1], self.fields, self.types):
+                    words.append(self.advance()[1])
+            return make_term(" ".join(words), self.folder, self.fields, self.types)
+        if not kind:
+            raise QuerySyntaxError("Fin de requête inattendue")
+        raise QuerySyntaxError(f"Jeton inattendu: {self.tokens[self.position][1]}")
+
+
+def _has_prefix(text: str, fields: FrozenSet[str], types: FrozenSet[str]) -> bool:
+    """Vrai si le mot forme un terme à lui seul (préfixe, jokers ou dossier)"""
+    return (text[:1] in ("#", "@", "~") or _split_type(text, types) is not None or "*" in text or "?" in text or text.endswith(":")
+            or _split_field(text, fields) is not None or _split_folder(text) is not None)
+
+
+def _negate(node: "Node") -> "Node":
+    """NOT node, en simplifiant la double négation"""
+    return node.operand if isinstance(node, Not) else Not(node)
+
+
+def _flatten(node_type, operands: List["Node"]) -> "Node":
+    """Construit un nœud n-aire en absorbant les nœuds enfants de même type"""
+    if len(operands) == 1:
+        return operands[0]
+    flat = []
+    for operand in operands:
+        if isinstance(operand, node_type):
+            flat.extend(operand.operands)
+        else:
+            flat.append(operand)
+    return node_type(tuple(flat))
+
+
+def normalize_tag(text: str) -> str:
+    """Nom de tag tel qu'enregistré : sans #, espaces remplacés par _ (les « : » sont gardés)"""
+    return text.lstrip('#').strip().replace(' ', '_')
+
+
+def join_folder(folder: str, name: str) -> str:
+    return f"{folder}{TAG_FOLDER_SEPARATOR}{name}" if folder else name
+
+
+def tag_leaf(tag: str) -> str:
+    """Nom du tag sans son dossier"""
+    return tag.rsplit(TAG_FOLDER_SEPARATOR, 1)[-1]
+
+
+def _split_folder(text: str):
+    """(dossier, tag) pour « dossier:tag », None sinon (les URL comme http://... n'en sont pas)"""
+    folder, separator, tag = text.partition(":")
+    if separator and folder and tag and not tag.startswith("/") and folder[:1] not in ("#", "@", "~", "_"):
+        return folder, tag
+    return None
+
+
+def _tag_path(text: str) -> str:
+    """Tag écrit dans une requête : « dossier:tag » devient « dossier/tag »
+
+    Un tag enregistré avec ses « : » (« ville:paris ») reste trouvé :
+    TagDatabase.matching_tags accepte les deux écritures.
+    """
+    folder_tag = _split_folder(text)
+    return join_folder(*folder_tag) if folder_tag is not None else text
+
+
+def _split_type(text: str, types: FrozenSet[str]) -> Optional[str]:
+    """Type désigné par « _type » s'il fait partie de types (« _brouillon » reste un nom sinon)"""
+    if text.startswith('_') and text[1:].strip().lower() in types:
+        return text[1:].strip()
+    return None
+
+
+def _split_field(text: str, fields: FrozenSet[str]) -> Optional[Tuple[str, str]]:
+    """(champ, valeur) pour « champ:valeur » si le champ fait partie de fields"""
+    field, separator, value = text.partition(":")
+    if separator and value and field.lower() in fields:
+        return field.lower(), value
+    return None
+
+
+def make_term(text: str, folder: str = "", fields: FrozenSet[str] = frozenset(),
+              types: FrozenSet[str] = frozenset()) -> Term:
+    """Crée le terme correspondant au préfixe éventuel (#, @, _, ~, #~, dossier:) ou aux jokers (* ou ?)
+
+    Dans un groupe dossier:( ... ), un terme sans préfixe est un tag du dossier.
+    Un champ enregistré l'emporte sur un dossier de même nom, sauf avec « # ».
+    """
+    if text.startswith('#~'):
+        return Term("fuzzy_tag", normalize_tag(_tag_path(text[2:].strip())))
+    if text.startswith('~'):
+        return Term("fuzzy", text[1:].strip())
+    if text.startswith('#'):
+        return Term("tag", normalize_tag(join_folder(folder, _tag_path(text[1:].strip()))))
+    if text.startswith('@'):
+        return Term("collection", text[1:].strip())
+    if folder:
+        return Term("tag", normalize_tag(join_folder(folder, text)))
+    file_type = _split_type(text, types)
+    if file_type is not None:
+        return Term("type", file_type)
+    field_value = _split_field(text, fields)
+    if field_value is not None:
+        return Term(*field_value)
+    if _split_folder(text) is not None:
+        return Term("tag", normalize_tag(_tag_path(text)))
+    if "*" in text or "?" in text:
+        return Term("wildcard", text)
+    return Term("name", text)
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def parse_query(query: str, fields: FrozenSet[str] = frozenset(),
+                types: FrozenSet[str] = frozenset()) -> "Node":
+    """Analyse une requête en arbre syntaxique (résultat mis en cache par requête, champs et types)
+
+    fields liste les champs « champ:valeur » reconnus : chaque base passe les
+    siens (TagDatabase.fields), « champ:valeur » étant sinon un tag de dossier.
+    types liste les types de fichier existants : « _type » n'est un filtre que
+    pour eux, sinon c'est un nom.
+
+    >>> parse_query("ext:(png , jpg)", frozenset({"ext"}))
+    Or(operands=(Term(kind='ext', value='png'), Term(kind='ext', value='jpg')))
+    >>> parse_query("ext:(png , jpg)")
+    Or(operands=(Term(kind='tag', value='ext/png'), Term(kind='tag', value='ext/jpg')))
+    >>> parse_query('folder:("E:/a b" , E:/c) #x', frozenset({"folder"}))
+    And(operands=(Or(operands=(Term(kind='folder', value='E:/a b'), Term(kind='folder', value='E:/c'))), Term(kind='tag', value='x')))
+    >>> parse_query("#type:image , #type:(a , b)", frozenset({"type"}))
+    Or(operands=(Term(kind='tag', value='type/image'), Term(kind='tag', value='type/a'), Term(kind='tag', value='type/b')))
+    >>> parse_query("_image _draft plan", types=frozenset({"image"}))
+    And(operands=(Term(kind='type', value='image'), Term(kind='name', value='_draft plan')))
+    """
+    return _Parser(tokenize(query), fields, types).parse()
+
+
+# Valeurs des prédicats
+
+_COMPARISON_PATTERN = re.compile(r"^(<=|>=|<|>|=)?(.*)$", re.DOTALL)
+_SIZE_PATTERN = re.compile(r"^\s*(\d+(?:[.,]\d+)?)\s*([a-z]*)\s*$")
+_DATE_PATTERN = re.compile(r"^\d{4}(?:-\d{2}(?:-\d{2})?)?$")
+SIZE_UNITS = {"": 1, "b": 1, "o": 1,
+              "k": 1024, "kb": 1024, "ko": 1024,
+              "m": 1024 ** 2, "mb": 1024 ** 2, "mo": 1024 ** 2,
+              "g": 1024 ** 3, "gb": 1024 ** 3, "go": 1024 ** 3,
+              "t": 1024 ** 4, "tb": 1024 ** 4, "to": 1024 ** 4}
+
+
+def split_comparison(text: str) -> Tuple[str, str, str]:
+    """(opérateur, valeur, valeur de fin) : « >10MB », « <=2025 » ou l'intervalle « a..b »"""
+    if ".." in text:
+        low, _, high = text.partition("..")
+        return "..", low.strip(), high.strip()
+    operator, value = _COMPARISON_PATTERN.match(text.strip()).groups()
+    return operator or "=", value.strip(), ""
+
+
+def parse_size(text: str) -> int:
+    """Taille en octets : « 10MB », « 1,5 Go », « 500k » (unités binaires)"""
+    match = _SIZE_PATTERN.match(text.lower())
+    if match is None or match.group(2) not in SIZE_UNITS:
+        raise QuerySyntaxError(f"Taille invalide: {text}")
+    return int(float(match.group(1).replace(",", ".")) * SIZE_UNITS[match.group(2)])
+
+
+def parse_date(text: str) -> str:
+    """Date ISO partielle (AAAA, AAAA-MM ou AAAA-MM-JJ), utilisée comme préfixe"""
+    date = text.strip().replace("/", "-")
+    if not _DATE_PATTERN.match(date):
+        raise QuerySyntaxError(f"Date invalide: {text}")
+    return date
+
+
+# Optimisation des requêtes
+
+SCAN_KINDS = ("name", "exact", "wildcard")  # Termes évalués en parcourant les noms des objets
+
+
+def is_scan(node: "Node") -> bool:
+    """Vrai si l'évaluation du nœud demande de parcourir les objets"""
+    if isinstance(node, Term):
+        return node.kind in SCAN_KINDS
+    if isinstance(node, Not):
+        return is_scan(node.operand)
+    return any(is_scan(operand) for operand in node.operands)
+
+
+def estimate(node: "Node", cardinality: Callable[[Term], int], total: int) -> int:
+    """Estime le nombre d'objets correspondant au nœud
+
+    cardinality donne la taille exacte des listes d'un terme indexé (tag,
+    collection) ; un terme à parcourir est supposé pouvoir tout renvoyer.
+    """
+    if isinstance(node, Term):
+        return total if node.kind in SCAN_KINDS else cardinality(node)
+    if isinstance(node, Not):
+        return max(total - estimate(node.operand, cardinality, total), 0)
+    estimates = [estimate(operand, cardinality, total) for operand in node.operands]
+    if isinstance(node, And):
+        return min(estimates)
+    return min(sum(estimates), total)
+
+
+def optimize(node: "Node", cardinality: Callable[[Term], int], total: int) -> "Node":
+    """Réordonne les opérandes des AND pour évaluer le moins de choses possible
+
+    Ordre : listes indexées les plus petites d'abord, puis les négations
+    (simples différences), puis les termes à parcourir, qui ne seront testés
+    que sur les candidats restants.
+    """
+    if isinstance(node, Term):
+        return node
+    if isinstance(node, Not):
+        return Not(optimize(node.operand, cardinality, total))
+    operands = tuple(optimize(operand, cardinality, total) for operand in node.operands)
+    if not isinstance(node, And):
+        return type(node)(operands)
+
+    def order(operand: "Node") -> Tuple[int, int]:
+        scan = is_scan(operand)
+        negated = isinstance(operand, Not)
+        group = 2 * scan + negated
+        return group, estimate(operand, cardinality, total)
+
+    return And(tuple(sorted(operands, key=order)))
+
+
+def iter_terms(node: "Node") -> Iterator[Term]:
+    """Parcourt les termes de la requête (de gauche à droite)"""
+    if isinstance(node, Term):
+        yield node
+    elif isinstance(node, Not):
+        yield from iter_terms(node.operand)
+    else:
+        for operand in node.operands:
+            yield from iter_terms(operand)
+
+
+def positive_terms(node: "Node") -> Iterator[Term]:
+    """Termes que les résultats doivent vérifier (ceux sous une négation sont ignorés)"""
+    if isinstance(node, Term):
+        yield node
+    elif not isinstance(node, Not):
+        for operand in node.operands:
+            yield from positive_terms(operand)
@@ -1,21 +1,38 @@
 import sys
 import json
 import uuid
-import re
+import time
 import datetime
-from collections import deque, defaultdict  # Ajouter defaultdict
-from typing import List, Dict, Set, Optional, Union
+import heapq
+import itertools
+import functools
+import threading
+import queue
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, deque, defaultdict  # Ajouter defaultdict
+from typing import Callable, FrozenSet, Iterator, List, Dict, NamedTuple, Set, Optional, Tuple
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QLineEdit, QPushButton, QListWidget, QListWidgetItem, QLabel, 
                              QTextEdit, QComboBox, QFileDialog, QMessageBox, QSplitter,
                              QTreeWidget, QTreeWidgetItem, QTabWidget, QGroupBox, QDialog,
                              QMenu, QAction, QCompleter, QInputDialog, QProgressDialog,
                              QCheckBox, QRadioButton)
-from PyQt5.QtCore import Qt, QUrl, QSettings, QStringListModel
+from PyQt5.QtCore import Qt, QUrl, QSettings, QStringListModel, QTimer
 from PyQt5.QtGui import QIcon, QFont, QDesktopServices, QPixmap, QPalette, QColor
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), 'Function'))
 from tirage import DuplicateFinder, get_partial_hash, get_full_hash
+from indexation import (Bitmap, BKTree, CompletionIndex, IdInterner, IdSet, PathTrie, SortedKeyIndex, TextIndex, TrigramIndex,
+                        WordIndex,
+                        canonical_location, fuzzy_distance, has_wildcards, normalize_text, path_components,
+                        prefix_upper, wildcard_fragments, wildcard_regex)
+from recherche import (OPERATORS, TAG_FOLDER_SEPARATOR, Node, Term, And, Or, Xor, Not, is_scan, iter_terms, normalize_tag,
+                       optimize, parse_date, parse_query, parse_size, positive_terms,
+                       split_comparison, tag_leaf, word_span)
+from contenu import CONTENT_EXTENSIONS, ContentIndex, ContentIndexer
+from stockage import (StorageBackend, ProgressCallback, PendingWrites, open_storage,
+                      convert_storage, BACKENDS)
 
 class Config:
     """Classe de configuration pour gérer les préférences"""
@@ -51,11 +68,35 @@ class Config:
         """Définit l'état du mode sombre"""
         self.settings.setValue("dark_mode", enabled)
     
+    def get_live_search(self):
+        """Retourne l'état de la recherche pendant la frappe"""
+        return self.settings.value("live_search", True, type=bool)
+    
+    def set_live_search(self, enabled):
+        """Définit l'état de la recherche pendant la frappe"""
+        self.settings.setValue("live_search", enabled)
+    
+    def get_content_indexing(self):
+        """Retourne l'état de l'indexation du contenu des documents"""
+        return self.settings.value("content_indexing", False, type=bool)
+    
+    def set_content_indexing(self, enabled):
+        """Définit l'état de l'indexation du contenu des documents"""
+        self.settings.setValue("content_indexing", enabled)
+    
     def get_history_file(self):
         """Retourne le chemin du fichier d'historique"""
         data_dir = self.get_data_dir()
         return os.path.join(data_dir, "search_history.json")
 
+    def get_storage_backend(self):
+        """Retourne le moteur de stockage configuré ("json" ou "sqlite")"""
+        return self.settings.value("storage_backend", "json", type=str)
+    
+    def set_storage_backend(self, backend):
+        """Définit le moteur de stockage"""
+        self.settings.setValue("storage_backend", backend)
+
 class Collection:
     """Représente une collection d'objets"""
     def __init__(self, name: str, description: str = ""):
@@ -77,6 +118,16 @@ class Collection:
             "updated_at": self.updated_at
         }
     
+    def metadata(self):
+        """Retourne les informations de la collection sans la liste des objets"""
+        return {
+            "name": self.name,
+            "description": self.description,
+            "id": self.id,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
+        }
+    
     def add_object(self, obj_id: str):
         """Ajoute un objet à la collection"""
         self.object_ids.add(obj_id)
@@ -426,21 +477,22 @@ class DuplicatesDialog(QDialog):
         deleted_count = 0
         error_count = 0
         
-        for file_path in files_to_delete:
-            try:
-                # Supprimer le fichier
-                os.remove(file_path)
-                
-                # Trouver et supprimer l'objet correspondant dans la base
-                obj = self.db.get_object_by_location(file_path)
-                if obj:
-                    self.db.delete_object(obj.id)
-                
-                deleted_count += 1
-                
-            except Exception as e:
-                error_count += 1
-                print(f"Erreur lors de la suppression de {file_path}: {e}")
+        with self.db.batch():
+            for file_path in files_to_delete:
+                try:
+                    # Supprimer le fichier
+                    os.remove(file_path)
+                    
+                    # Trouver et supprimer l'objet correspondant dans la base
+                    obj = self.db.get_object_by_location(file_path)
+                    if obj:
+                        self.db.delete_object(obj.id)
+                    
+                    deleted_count += 1
+                    
+                except Exception as e:
+                    error_count += 1
+                    print(f"Erreur lors de la suppression de {file_path}: {e}")
         
         # Afficher le résultat
         if error_count == 0:
@@ -460,12 +512,33 @@ class DuplicatesDialog(QDialog):
         self.start_scan()
 
 class FileObject:
-    def __init__(self, name: str, description: str, file_type: str, location: str):
+    # Pas de __dict__ par instance : la bibliothèque peut compter des millions d'objets
+    __slots__ = ("_name", "name_key", "description", "file_type", "location", "id", "size", "added_at")
+    
+    def __init__(self, name: str, description: str, file_type: str, location: str,
+                 obj_id: Optional[str] = None, size: Optional[int] = None, added_at: str = ""):
         self.name = name
-        self.description = description
-        self.file_type = file_type
+        self.description = description or ""
+        self.file_type = sys.intern(file_type)  # Quelques types partagés par tous les objets
         self.location = location
-        self.id = self.generate_id(file_type)
+        self.id = obj_id if obj_id is not None else self.generate_id(file_type)
+        self.size = size            # Taille en octets (None si inconnue ou externe)
+        self.added_at = added_at    # Date d'ajout ISO ("" si inconnue)
+    
+    @property
+    def name(self) -> str:
+        return self._name
+    
+    @name.setter
+    def name(self, name: str) -> None:
+        self._name = name
+        self.name_key = normalize_text(name)  # Nom sans accents ni casse, utilisé par la recherche
+    
+    @classmethod
+    def from_dict(cls, data: dict) -> "FileObject":
+        """Recrée un objet à partir de to_dict() en conservant son ID"""
+        return cls(data["name"], data["description"], data["type"], data["location"], data["id"],
+                   data.get("size"), data.get("added_at") or "")
     
     def generate_id(self, file_type: str) -> str:
         """Génère un ID unique avec préfixe selon le type et suffixe aléatoire"""
@@ -490,9 +563,20 @@ class FileObject:
             "description": self.description,
             "type": self.file_type,
             "id": self.id,
-            "location": self.location
+            "location": self.location,
+            "size": self.size,
+            "added_at": self.added_at
         }
     
+    @property
+    def extension(self) -> str:
+        """Extension en minuscules sans le point (de l'emplacement, sinon du nom)"""
+        for text in (self.name,) if self.is_external() else (self.location, self.name):
+            extension = os.path.splitext(text)[1]
+            if extension:
+                return sys.intern(extension[1:].lower())
+        return ""
+    
     def is_external(self):
         """Détermine si l'emplacement est externe (URL web)"""
         return self.location.startswith(('http://', 'https://', 'www.'))
@@ -521,78 +605,215 @@ class FileObject:
             print(f"Erreur lors de l'ouverture: {e}")
             return False
 
+RESULT_CACHE_SIZE = 128  # Nombre de résultats de recherche gardés en mémoire
+RESULTS_PAGE_SIZE = 200  # Nombre de résultats classés renvoyés par page
+SNAPSHOT_ATTEMPTS = 3    # Évaluations sans verrou tentées par search_snapshot() avant d'évaluer sous le verrou
+SEARCH_FRAME_SECONDS = 0.015  # Temps passé à afficher des résultats avant de rendre la main à l'interface
+COMPLETION_LIMIT = 12  # Suggestions affichées par l'auto-complétion
+LIVE_SEARCH_DELAY_MS = 250  # Pause de frappe avant de lancer la recherche
+LIVE_SEARCH_POLL_MS = 30    # Intervalle de vérification du résultat de la recherche en arrière-plan
+
+class SearchPage(NamedTuple):
+    """Page de résultats classés : cursor permet de demander la suivante (None s'il n'y en a plus)"""
+    results: List["FileObject"]
+    cursor: Optional[tuple]
+    total: int
+
+class SearchSnapshot(NamedTuple):
+    """Résultats d'une recherche figés sous le verrou : clés de classement et objets des résultats"""
+    keys: List[tuple]                  # rank_key de chaque résultat
+    objects: Dict[int, "FileObject"]   # Numéro -> Objet, pour les seuls résultats
+    recent: Optional[List["FileObject"]] = None  # Requête vide : objets par date d'ajout décroissante
+
+def recent_order(dates: List[Tuple[str, int]], numbers: List[int]) -> Iterator[int]:
+    """numbers dans l'ordre de rank_key pour la requête vide : date d'ajout décroissante,
+    puis numéro croissant ; les objets sans date (absents de dates) viennent en dernier"""
+    for _, group in itertools.groupby(reversed(dates), key=lambda entry: entry[0]):
+        for _, number in reversed(list(group)):
+            yield number
+    if len(dates) < len(numbers):
+        dated = {number for _, number in dates}
+        yield from (number for number in numbers if number not in dated)
+
+def file_size(location: str) -> Optional[int]:
+    """Taille d'un fichier local en octets (None pour une URL ou un fichier introuvable)"""
+    if location.startswith(('http://', 'https://', 'www.')):
+        return None
+    try:
+        return os.path.getsize(location)
+    except OSError:
+        return None
+
+def synchronized(method):
+    """Exécute une modification en mémoire de TagDatabase sous son verrou
+    
+    Une recherche lancée dans un autre thread ne prend le verrou que pour
+    enregistrer un index construit à la demande : l'interface n'attend jamais
+    la fin d'une recherche.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+class Predicate:
+    """Prédicat « champ:valeur » de la recherche avancée
+    
+    postings renvoie le bitmap des objets correspondant à la valeur (sans le
+    modifier ensuite) ; generations liste les clés de TagDatabase._generations
+    dont dépend le résultat, pour le cache des recherches. estimate, facultatif,
+    donne sans calculer ce bitmap une borne de sa taille, utilisée pour ordonner
+    les AND (à défaut, postings est évalué une fois de plus).
+    """
+    __slots__ = ("postings", "generations", "estimate")
+    
+    def __init__(self, postings: Callable[[str], Bitmap], generations: Tuple[str, ...] = (),
+                 estimate: Optional[Callable[[str], int]] = None):
+        self.postings = postings
+        self.generations = generations
+        self.estimate = estimate
+
 class TagDatabase:
-    def __init__(self, data_dir: str):
+    def __init__(self, data_dir: str, storage: Optional[StorageBackend] = None,
+                 progress: ProgressCallback = None, resolve_locations: bool = False):
         self.data_dir = data_dir
         self.objects_dir = os.path.join(data_dir, "Objects")
         self.tags_dir = os.path.join(data_dir, "Tags")
         self.collections_dir = os.path.join(data_dir, "Collections")  # Nouveau dossier pour les collections
         self.objects: Dict[str, FileObject] = {}  # ID -> FileObject
-        self.tags: Dict[str, Set[str]] = {}       # Tag -> Set d'IDs
-        self.tag_files: Dict[str, str] = {}       # Tag -> Chemin du fichier
+        self.tags: Dict[str, IdSet] = {}          # Tag -> Set d'IDs (bitmap compressé)
+        self.object_tags: Dict[str, Set[str]] = {}  # ID -> Set de tags (index inverse de self.tags)
+        self.object_collections: Dict[str, Set[str]] = {}  # ID -> Set d'IDs de collections
+        self.collection_names: Dict[str, List[str]] = {}  # Nom en minuscules -> IDs de collections (le premier fait foi)
+        self.collection_numbers = IdInterner()  # ID de collection <-> Numéro dans collection_name_index
+        self.collection_name_index = TrigramIndex()  # Trigrammes des noms de collections (minuscules)
+        self.locations: Dict[str, str] = {}  # Emplacement canonique -> ID
+        self.interner = IdInterner()  # ID <-> Numéro utilisé dans les bitmaps
+        self.all_objects = Bitmap()   # Numéros de tous les objets présents
+        self.type_postings: Dict[str, Bitmap] = {}  # Type de fichier (minuscules) -> Numéros
+        self.extension_postings: Dict[str, Bitmap] = {}  # Extension (minuscules, sans point) -> Numéros
+        self.folder_index: Optional[PathTrie] = None     # Dossiers des emplacements, construit à la première recherche
+        self.size_index: Optional[SortedKeyIndex] = None  # (taille, numéro) triés
+        self.date_index: Optional[SortedKeyIndex] = None  # (date d'ajout ISO, numéro) triés
+        self.description_index: Optional[TextIndex] = None  # Mots des descriptions, construit à la première recherche desc:
+        self.content_index: Optional[ContentIndex] = None  # Contenu des documents (facultatif, voir attach_content_index)
+        self.name_index: Optional[TrigramIndex] = None  # Trigrammes des noms, construit en arrière-plan (warm_indexes)
+        self.warming_indexes = False  # Construction en cours : la recherche par nom parcourt les objets
+        self.name_words: Optional[WordIndex] = None     # Mots des noms pour la recherche approchée (~terme)
+        self.sorted_names: Optional[SortedKeyIndex] = None  # Noms triés pour les préfixes et les noms exacts
+        self.tag_tree: Optional[BKTree] = None          # Tags normalisés pour la recherche approchée (#~tag)
+        self._tag_keys: Dict[str, Set[str]] = {}        # Tag normalisé -> Tags
+        self.tag_leaves: Dict[str, Set[str]] = {}       # Nom sans dossier -> Tags (« paris » -> « ville/paris »...)
+        # Auto-complétion : #tags, @collections, opérateurs et champs (classés par nombre d'objets)
+        self.completions = CompletionIndex()
+        for operator in OPERATORS:
+            self.completions.add(operator)
+        self.query_completions = CompletionIndex()  # Recherches passées (classées par nombre d'exécutions)
+        
+        # Cache des résultats de recherche, invalidé par numéros de génération
+        self._lock = threading.RLock()  # Modifications en mémoire (voir synchronized)
+        self.generation = 0  # Dernière génération attribuée : change à chaque modification en mémoire
+        self._generation_counter = itertools.count(1)
+        self._tag_generations: Dict[str, int] = {}         # Tag -> Génération de ses membres
+        self._collection_generations: Dict[str, int] = {}  # ID -> Génération de son nom et de ses membres
+        self._generations = {"objects": 0, "names": 0, "tags": 0, "types": 0,
+                            "locations": 0, "sizes": 0, "descriptions": 0}  # Ensembles globaux
+        self._result_cache: "OrderedDict[Node, Tuple[tuple, Bitmap]]" = OrderedDict()
+        self.result_cache_size = RESULT_CACHE_SIZE
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._location_duplicates: Dict[str, Set[str]] = {}  # Emplacement canonique -> autres IDs (données existantes)
+        self.resolve_locations = resolve_locations  # Suivre les liens symboliques dans les clés d'emplacement
         self.collections: Dict[str, Collection] = {}  # ID -> Collection
-        
-        # Créer les répertoires de données s'ils n'existent pas
-        os.makedirs(self.objects_dir, exist_ok=True)
-        os.makedirs(self.tags_dir, exist_ok=True)
-        os.makedirs(self.collections_dir, exist_ok=True)  # Créer le dossier collections
-        self.load_data()
+        self.load_timings: Dict[str, float] = {}  # Phase -> Durée du dernier chargement (s)
+        
+        # Prédicats « champ:valeur » de la recherche avancée
+        self.predicates: Dict[str, Predicate] = {}
+        self.fields: FrozenSet[str] = frozenset()  # Noms des prédicats, reconnus par l'analyseur de requêtes
+        self.register_predicate("type", self._type_postings, ("types",))
+        self.register_predicate("ext", self._extension_postings, ("names", "locations"))
+        self.register_predicate("folder", self._folder_postings, ("locations",))
+        self.register_predicate("size", self._size_postings, ("sizes",), self._size_estimate)
+        self.register_predicate("added", self._date_postings, estimate=self._date_estimate)
+        self.register_predicate("date", self._date_postings, estimate=self._date_estimate)
+        self.register_predicate("desc", self._description_postings, ("descriptions",), self._description_estimate)
+        
+        self._pending: Optional[PendingWrites] = None  # Écritures différées pendant batch()
+        self._undo_log: Optional[list] = None  # Actions inverses pour annuler un batch()
+        
+        # Moteur de stockage (dossiers JSON ou fichier SQLite unique)
+        self.storage = storage if storage is not None else open_storage(data_dir)
+        self.load_data(progress)
     
-    def load_data(self):
-        """Charge les données depuis les fichiers JSON"""
+    @property
+    def tag_files(self) -> Dict[str, str]:
+        """Tag -> Chemin du fichier (uniquement pour le stockage JSON)"""
+        return getattr(self.storage, "tag_files", {})
+    
+    def load_data(self, progress: ProgressCallback = None):
+        """Charge les données depuis le moteur de stockage"""
+        start = time.perf_counter()
+        data = self.storage.load(progress)
+        self.load_timings = dict(self.storage.load_timings)
+        
+        build_start = time.perf_counter()
+        
         # Charger les objets
-        if os.path.exists(self.objects_dir):
-            for filename in os.listdir(self.objects_dir):
-                if filename.endswith(".json"):
-                    try:
-                        with open(os.path.join(self.objects_dir, filename), 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            obj = FileObject(
-                                data["name"], 
-                                data["description"], 
-                                data["type"], 
-                                data["location"]
-                            )
-                            obj.id = data["id"]
-                            self.objects[obj.id] = obj
-                    except Exception as e:
-                        print(f"Erreur lors du chargement de {filename}: {e}")
+        for obj_data in data["objects"]:
+            try:
+                self._insert_object(FileObject.from_dict(obj_data))
+            except Exception as e:
+                print(f"Erreur lors du chargement de l'objet {obj_data.get('id')}: {e}")
         
         # Charger les tags
-        if os.path.exists(self.tags_dir):
-            for filename in os.listdir(self.tags_dir):
-                if filename.endswith(".json"):
-                    try:
-                        tag_name = filename[:-5]  # Enlever ".json"
-                        with open(os.path.join(self.tags_dir, filename), 'r', encoding='utf-8') as f:
-                            obj_ids = json.load(f)
-                            self.tags[tag_name] = set(obj_ids)
-                            self.tag_files[tag_name] = os.path.join(self.tags_dir, filename)
-                    except Exception as e:
-                        print(f"Erreur lors du chargement du tag {filename}: {e}")
+        for tag_name, obj_ids in data["tags"].items():
+            self.tags[tag_name] = IdSet(self.interner, obj_ids)
+            self._index_tag_name(tag_name)
+            for obj_id in obj_ids:
+                self.object_tags.setdefault(obj_id, set()).add(tag_name)
         
         # Charger les collections
-        if os.path.exists(self.collections_dir):
-            for filename in os.listdir(self.collections_dir):
-                if filename.endswith(".json"):
-                    try:
-                        with open(os.path.join(self.collections_dir, filename), 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            collection = Collection(data["name"], data["description"])
-                            collection.id = data["id"]
-                            collection.object_ids = set(data["object_ids"])
-                            collection.created_at = data["created_at"]
-                            collection.updated_at = data["updated_at"]
-                            self.collections[collection.id] = collection
-                    except Exception as e:
-                        print(f"Erreur lors du chargement de la collection {filename}: {e}")
+        for collection_data in data["collections"]:
+            try:
+                collection = Collection(collection_data["name"], collection_data["description"])
+                collection.id = collection_data["id"]
+                collection.object_ids = IdSet(self.interner, collection_data["object_ids"])
+                collection.created_at = collection_data["created_at"]
+                collection.updated_at = collection_data["updated_at"]
+                self._insert_collection(collection)
+            except Exception as e:
+                print(f"Erreur lors du chargement de la collection {collection_data.get('id')}: {e}")
+        
+        self.load_timings["build"] = time.perf_counter() - build_start
+        self.load_timings["total"] = time.perf_counter() - start
+    
+    def export_data(self) -> dict:
+        """Retourne l'état en mémoire au format de StorageBackend.load()"""
+        return {
+            "objects": [obj.to_dict() for obj in self.objects.values()],
+            "tags": self.tags,
+            "collections": [collection.to_dict() for collection in self.collections.values()]
+        }
+    
+    def close(self) -> None:
+        """Ferme proprement le moteur de stockage en écrivant l'instantané de démarrage"""
+        data = self.export_data()
+        self.storage.compact(data)
+        self.storage.write_snapshot(data)
+        self.storage.close()
     
     def add_object(self, obj: FileObject) -> Optional[str]:
         """Ajoute un objet à la base de données si l'emplacement n'existe pas déjà"""
         if self.location_exists(obj.location):
             return None  # Retourne None si doublon
         
-        self.objects[obj.id] = obj
+        if not obj.added_at:
+            obj.added_at = datetime.datetime.now().isoformat(timespec="seconds")
+        if obj.size is None:
+            obj.size = file_size(obj.location)
+        self._insert_object(obj)
+        self._record_undo(lambda: self._remove_object(obj.id))
         self.save_object(obj)
         return obj.id
     
@@ -601,19 +822,22 @@ class TagDatabase:
         if obj_id not in self.objects:
             return False
 
+        obj = self.objects[obj_id]
+
         # Vérifier si le nouvel emplacement existe déjà pour un autre objet
-        if location != self.objects[obj_id].location:  # Seulement si l'emplacement change
-            if self.location_exists(location):
+        if location != obj.location:  # Seulement si l'emplacement change
+            existing = self.get_object_by_location(location)
+            if existing is not None and existing is not obj:
                 return False
 
         # Mettre à jour les propriétés de l'objet
-        self.objects[obj_id].name = name
-        self.objects[obj_id].description = description
-        self.objects[obj_id].file_type = file_type
-        self.objects[obj_id].location = location
+        previous = (obj.name, obj.description, obj.file_type, obj.location, obj.size)
+        size = obj.size if location == obj.location else file_size(location)
+        self._set_object_fields(obj, name, description, file_type, location, size)
+        self._record_undo(lambda: self._set_object_fields(obj, *previous))
 
         # Sauvegarder les modifications
-        self.save_object(self.objects[obj_id])
+        self.save_object(obj)
         return True
     
     def delete_object(self, obj_id: str) -> bool:
@@ -621,67 +845,79 @@ class TagDatabase:
         if obj_id not in self.objects:
             return False
         
-        # Retirer l'objet de tous les tags
-        for tag in self.get_object_tags(obj_id):
-            self.remove_tag(obj_id, tag)
-        
-        # Retirer l'objet de toutes les collections
-        for collection in self.collections.values():
-            if collection.contains_object(obj_id):
-                collection.remove_object(obj_id)
-                self.save_collection(collection)
-        
-        # Supprimer le fichier de l'objet
-        obj_file = os.path.join(self.objects_dir, f"{obj_id}.json")
-        if os.path.exists(obj_file):
-            try:
-                os.remove(obj_file)
-            except Exception as e:
-                print(f"Erreur lors de la suppression du fichier {obj_file}: {e}")
-        
-        # Retirer l'objet de la mémoire
-        del self.objects[obj_id]
+        with self.batch():
+            # Retirer l'objet de tous les tags
+            for tag in self.get_object_tags(obj_id):
+                self.remove_tag(obj_id, tag)
+            
+            # Retirer l'objet de toutes les collections
+            for collection_id in list(self.object_collections.get(obj_id, ())):
+                self.remove_object_from_collection(obj_id, collection_id)
+            
+            # Retirer l'objet de la mémoire et du stockage
+            obj = self._remove_object(obj_id)
+            self._record_undo(lambda: self._insert_object(obj))
+            self._write_object_deleted(obj_id)
         return True
     
     def save_object(self, obj: FileObject) -> None:
-        """Sauvegarde un objet dans un fichier JSON"""
-        obj_path = os.path.join(self.objects_dir, f"{obj.id}.json")
-        with open(obj_path, 'w', encoding='utf-8') as f:
-            json.dump(obj.to_dict(), f, ensure_ascii=False, indent=4)
+        """Sauvegarde un objet dans le stockage"""
+        if self._pending is not None:
+            self._pending.object_saved(obj.id)
+        else:
+            self.storage.save_object(obj.to_dict())
     
     def add_tag(self, obj_id: str, tag: str) -> None:
         """Ajoute un tag à un objet"""
         # Nettoyer le tag (enlever le # s'il est présent)
-        clean_tag = tag.lstrip('#').strip().replace(' ', '_')
+        clean_tag = normalize_tag(tag)
         
         if not clean_tag:
             return
         
-        # Créer le fichier de tag s'il n'existe pas
+        # Créer le tag s'il n'existe pas
         if clean_tag not in self.tags:
-            self.tags[clean_tag] = set()
-            tag_file_path = os.path.join(self.tags_dir, f"{clean_tag}.json")
-            self.tag_files[clean_tag] = tag_file_path
+            self._create_tag(clean_tag)
+            self._record_undo(lambda: self._drop_tag(clean_tag))
+            if self._pending is not None:
+                self._pending.tag_changes(clean_tag).full = True
         
         # Ajouter l'ID à l'ensemble des IDs pour ce tag
-        self.tags[clean_tag].add(obj_id)
+        if obj_id in self.tags[clean_tag]:
+            return
+        self._tag_insert(clean_tag, obj_id)
+        self._record_undo(lambda: self._tag_discard(clean_tag, obj_id))
         
         # Sauvegarder le tag
-        self.save_tag(clean_tag)
+        self._write_tag(clean_tag, added=obj_id)
     
     def remove_tag(self, obj_id: str, tag: str) -> None:
         """Retire un tag d'un objet"""
-        clean_tag = tag.lstrip('#')
+        clean_tag = normalize_tag(tag)
         if clean_tag in self.tags and obj_id in self.tags[clean_tag]:
-            self.tags[clean_tag].remove(obj_id)
-            self.save_tag(clean_tag)
+            self._tag_discard(clean_tag, obj_id)
+            self._record_undo(lambda: self._tag_insert(clean_tag, obj_id))
+            self._write_tag(clean_tag, removed=obj_id)
     
     def save_tag(self, tag: str) -> None:
-        """Sauvegarde un tag dans un fichier JSON"""
+        """Sauvegarde un tag dans le stockage"""
         if tag in self.tags:
-            tag_file_path = self.tag_files[tag]
-            with open(tag_file_path, 'w', encoding='utf-8') as f:
-                json.dump(list(self.tags[tag]), f, ensure_ascii=False, indent=4)
+            if self._pending is not None:
+                self._pending.tag_changes(tag).full = True
+            else:
+                self.storage.save_tag(tag, self.tags[tag])
+    
+    def delete_tag(self, tag: str) -> bool:
+        """Supprime un tag de tous les objets ainsi que son fichier"""
+        clean_tag = normalize_tag(tag)
+        if clean_tag not in self.tags:
+            return False
+        
+        with self.batch():
+            obj_ids = self._drop_tag(clean_tag)
+            self._record_undo(lambda: self._restore_tag(clean_tag, obj_ids))
+            self._pending.tag_deleted(clean_tag)
+        return True
     
     # Méthodes pour les collections
     def create_collection(self, name: str, description: str = "") -> Optional[Collection]:
@@ -690,12 +926,12 @@ class TagDatabase:
             return None
         
         # Vérifier si une collection avec le même nom existe déjà
-        for collection in self.collections.values():
-            if collection.name.lower() == name.lower():
-                return None
+        if self.get_collection_by_name(name) is not None:
+            return None
         
         collection = Collection(name, description)
-        self.collections[collection.id] = collection
+        self._insert_collection(collection)
+        self._record_undo(lambda: self._remove_collection(collection.id))
         self.save_collection(collection)
         return collection
     
@@ -704,23 +940,42 @@ class TagDatabase:
         if collection_id not in self.collections:
             return False
         
-        # Supprimer le fichier de la collection
-        collection_file = os.path.join(self.collections_dir, f"{collection_id}.json")
-        if os.path.exists(collection_file):
-            try:
-                os.remove(collection_file)
-            except Exception as e:
-                print(f"Erreur lors de la suppression du fichier {collection_file}: {e}")
+        # Retirer la collection de la mémoire et du stockage
+        collection = self._remove_collection(collection_id)
+        self._record_undo(lambda: self._insert_collection(collection))
+        if self._pending is not None:
+            self._pending.collection_deleted(collection_id)
+        else:
+            self.storage.delete_collection(collection_id)
+        return True
+    
+    def rename_collection(self, collection_id: str, name: str, description: str) -> bool:
+        """Modifie le nom et la description d'une collection (le nom doit rester unique)"""
+        collection = self.collections.get(collection_id)
+        if collection is None or not name.strip():
+            return False
+        
+        existing = self.get_collection_by_name(name)
+        if existing is not None and existing is not collection:
+            return False
         
-        # Retirer la collection de la mémoire
-        del self.collections[collection_id]
+        previous = (collection.name, collection.description, collection.updated_at)
+        self._set_collection_fields(collection, name, description, datetime.datetime.now().isoformat())
+        self._record_undo(lambda: self._set_collection_fields(collection, *previous))
+        self.save_collection(collection)
         return True
     
+    def get_collection_by_name(self, name: str) -> Optional[Collection]:
+        """Retourne la collection portant ce nom (insensible à la casse)"""
+        collection_ids = self.collection_names.get(name.lower())
+        return self.collections[collection_ids[0]] if collection_ids else None
+    
     def save_collection(self, collection: Collection) -> None:
-        """Sauvegarde une collection dans un fichier JSON"""
-        collection_path = os.path.join(self.collections_dir, f"{collection.id}.json")
-        with open(collection_path, 'w', encoding='utf-8') as f:
-            json.dump(collection.to_dict(), f, ensure_ascii=False, indent=4)
+        """Sauvegarde une collection dans le stockage"""
+        if self._pending is not None:
+            self._pending.collection_changes(collection.id).full = True
+        else:
+            self.storage.save_collection(collection.to_dict())
     
     def add_object_to_collection(self, obj_id: str, collection_id: str) -> bool:
         """Ajoute un objet à une collection"""
@@ -728,8 +983,12 @@ class TagDatabase:
             return False
         
         collection = self.collections[collection_id]
-        collection.add_object(obj_id)
-        self.save_collection(collection)
+        if collection.contains_object(obj_id):
+            return True
+        updated_at = collection.updated_at
+        self._collection_insert(collection, obj_id)
+        self._record_undo(lambda: self._collection_discard(collection, obj_id, updated_at))
+        self._write_collection(collection, added=obj_id)
         return True
     
     def remove_object_from_collection(self, obj_id: str, collection_id: str) -> bool:
@@ -738,192 +997,1303 @@ class TagDatabase:
             return False
         
         collection = self.collections[collection_id]
-        collection.remove_object(obj_id)
-        self.save_collection(collection)
+        if collection.contains_object(obj_id):
+            updated_at = collection.updated_at
+            self._collection_discard(collection, obj_id)
+            self._record_undo(lambda: self._collection_insert(collection, obj_id, updated_at))
+            self._write_collection(collection, removed=obj_id)
         return True
     
+    # Lots d'écritures
+    @contextmanager
+    def batch(self):
+        """Regroupe les écritures jusqu'à la fin du bloc `with db.batch():`
+
+        Les sauvegardes d'objets, de tags et de collections sont différées et
+        dédupliquées puis écrites en une seule transaction à la sortie du bloc.
+        En cas d'exception, dans le bloc ou pendant l'écriture, les
+        modifications en mémoire sont annulées et le stockage abandonne la
+        transaction (fichiers temporaires supprimés, journal non écrit ; un
+        fichier de base déjà remplacé est relu tel quel au prochain chargement).
+        Les blocs imbriqués rejoignent le bloc extérieur.
+        """
+        if self._pending is not None:
+            yield self
+            return
+        
+        self._pending = PendingWrites()
+        self._undo_log = []
+        try:
+            yield self
+            pending, self._pending = self._pending, None
+            self._flush_pending(pending)
+        except BaseException:
+            self._pending = None
+            self._rollback()
+            raise
+        finally:
+            self._pending = None
+            self._undo_log = None
+    
+    def _record_undo(self, action) -> None:
+        """Mémorise l'action inverse d'une modification faite pendant un lot"""
+        if self._undo_log is not None:
+            self._undo_log.append(action)
+    
+    def _rollback(self) -> None:
+        """Annule en mémoire les modifications du lot en cours"""
+        undo_log, self._undo_log = self._undo_log, None
+        for action in reversed(undo_log or []):
+            try:
+                action()
+            except Exception as e:
+                print(f"Erreur lors de l'annulation d'une modification: {e}")
+    
+    def _flush_pending(self, pending: PendingWrites) -> None:
+        """Écrit en une transaction les modifications accumulées pendant un lot"""
+        with self.storage.transaction():
+            for obj_id in pending.deleted_objects:
+                self.storage.delete_object(obj_id)
+            for obj_id in pending.objects:
+                if obj_id in self.objects:
+                    self.storage.save_object(self.objects[obj_id].to_dict())
+            
+            for tag in pending.deleted_tags:
+                self.storage.delete_tag(tag)
+            for tag, changes in pending.tags.items():
+                if tag not in self.tags:
+                    continue
+                if changes.full:
+                    self.storage.save_tag(tag, self.tags[tag])
+                elif changes.added or changes.removed:
+                    self.storage.tag_members_changed(tag, self.tags[tag], changes.added, changes.removed)
+            
+            for collection_id in pending.deleted_collections:
+                self.storage.delete_collection(collection_id)
+            for collection_id, changes in pending.collections.items():
+                collection = self.collections.get(collection_id)
+                if collection is None:
+                    continue
+                if changes.full:
+                    self.storage.save_collection(collection.to_dict())
+                elif changes.added or changes.removed:
+                    self.storage.collection_members_changed(
+                        collection.metadata(), collection.object_ids, changes.added, changes.removed)
+    
+    def _write_object_deleted(self, obj_id: str) -> None:
+        if self._pending is not None:
+            self._pending.object_deleted(obj_id)
+        else:
+            self.storage.delete_object(obj_id)
+    
+    def _write_tag(self, tag: str, added: Optional[str] = None, removed: Optional[str] = None) -> None:
+        """Enregistre (ou diffère) la modification d'appartenance d'un objet à un tag"""
+        if self._pending is not None:
+            changes = self._pending.tag_changes(tag)
+            if added is not None:
+                changes.add(added)
+            if removed is not None:
+                changes.remove(removed)
+        else:
+            self.storage.tag_members_changed(
+                tag, self.tags[tag],
+                added=(added,) if added is not None else (),
+                removed=(removed,) if removed is not None else ()
+            )
+    
+    def _write_collection(self, collection: Collection, added: Optional[str] = None,
+                          removed: Optional[str] = None) -> None:
+        """Enregistre (ou diffère) la modification d'appartenance d'un objet à une collection"""
+        if self._pending is not None:
+            changes = self._pending.collection_changes(collection.id)
+            if added is not None:
+                changes.add(added)
+            if removed is not None:
+                changes.remove(removed)
+        else:
+            self.storage.collection_members_changed(
+                collection.metadata(), collection.object_ids,
+                added=(added,) if added is not None else (),
+                removed=(removed,) if removed is not None else ()
+            )
+    
+    # Modifications en mémoire (sans écriture, utilisées aussi pour annuler un lot)
+    @synchronized
+    def _insert_object(self, obj: FileObject) -> None:
+        self.objects[obj.id] = obj
+        self._bump(self._generations, "objects")
+        self._index_location(obj)
+        number = self.interner.intern(obj.id)
+        self.all_objects.add(number)
+        self._add_posting(self.type_postings, obj.file_type.lower(), number)
+        self._index_fields(obj, number)
+        if self.name_index is not None:
+            self.name_index.add(number, obj.name_key)
+        if self.name_words is not None:
+            self.name_words.add(number, obj.name_key)
+        if self.sorted_names is not None:
+            self.sorted_names.add(number, obj.name_key)
+        if self.description_index is not None:
+            self.description_index.add(number, obj.description)
+    
+    @synchronized
+    def _remove_object(self, obj_id: str) -> FileObject:
+        obj = self.objects.pop(obj_id)
+        self._bump(self._generations, "objects")
+        self._unindex_location(obj)
+        number = self.interner.lookup(obj_id)
+        self.all_objects.discard(number)
+        self._discard_posting(self.type_postings, obj.file_type.lower(), number)
+        self._unindex_fields(obj, number)
+        if self.name_index is not None:
+            self.name_index.remove(number, obj.name_key)
+        if self.name_words is not None:
+            self.name_words.remove(number, obj.name_key)
+        if self.sorted_names is not None:
+            self.sorted_names.remove(number, obj.name_key)
+        if self.description_index is not None:
+            self.description_index.remove(number)
+        return obj
+    
+    @synchronized
+    def _set_object_fields(self, obj: FileObject, name: str, description: str,
+                           file_type: str, location: str, size: Optional[int]) -> None:
+        fields_changed = name != obj.name or location != obj.location or size != obj.size
+        if fields_changed:
+            self._unindex_fields(obj, self.interner.lookup(obj.id))
+        if name != obj.name:
+            self._bump(self._generations, "names")
+            number = self.interner.lookup(obj.id)
+            for index in (self.name_index, self.name_words, self.sorted_names):
+                if index is not None:
+                    index.remove(number, obj.name_key)
+                    index.add(number, normalize_text(name))
+        obj.name = name
+        if (description or "") != obj.description:
+            self._bump(self._generations, "descriptions")
+            if self.description_index is not None:
+                number = self.interner.lookup(obj.id)
+                self.description_index.remove(number)
+                self.description_index.add(number, description or "")
+        obj.description = description or ""
+        if file_type.lower() != obj.file_type.lower():
+            self._bump(self._generations, "types")
+            number = self.interner.lookup(obj.id)
+            self._discard_posting(self.type_postings, obj.file_type.lower(), number)
+            self._add_posting(self.type_postings, file_type.lower(), number)
+        obj.file_type = sys.intern(file_type)
+        if location != obj.location:
+            self._bump(self._generations, "locations")
+            self._unindex_location(obj)
+            obj.location = location
+            self._index_location(obj)
+        if size != obj.size:
+            self._bump(self._generations, "sizes")
+            obj.size = size
+        if fields_changed:
+            self._index_fields(obj, self.interner.lookup(obj.id))
+    
+    @staticmethod
+    def _add_posting(postings: Dict[str, Bitmap], key: str, number: int) -> None:
+        bitmap = postings.get(key)
+        if bitmap is None:
+            bitmap = postings[key] = Bitmap()
+        bitmap.add(number)
+    
+    @staticmethod
+    def _discard_posting(postings: Dict[str, Bitmap], key: str, number: int) -> None:
+        bitmap = postings.get(key)
+        if bitmap is not None:
+            bitmap.discard(number)
+            if not bitmap:
+                del postings[key]
+    
+    def _index_fields(self, obj: FileObject, number: int) -> None:
+        """Indexe l'extension, le dossier, la taille et la date d'un objet"""
+        self._add_posting(self.extension_postings, obj.extension, number)
+        if self.folder_index is not None and not obj.is_external():
+            self.folder_index.add(number, self._object_folders(obj))
+        if self.size_index is not None and obj.size is not None:
+            self.size_index.add(number, obj.size)
+        if self.date_index is not None and obj.added_at:
+            self.date_index.add(number, obj.added_at)
+    
+    def _unindex_fields(self, obj: FileObject, number: int) -> None:
+        self._discard_posting(self.extension_postings, obj.extension, number)
+        if self.folder_index is not None and not obj.is_external():
+            self.folder_index.remove(number, self._object_folders(obj))
+        if self.size_index is not None and obj.size is not None:
+            self.size_index.remove(number, obj.size)
+        if self.date_index is not None and obj.added_at:
+            self.date_index.remove(number, obj.added_at)
+    
+    def _object_folders(self, obj: FileObject) -> List[str]:
+        """Dossiers contenant l'objet, de la racine à son dossier"""
+        return path_components(self.location_key(obj.location))[:-1]
+    
+    def location_key(self, location: str) -> str:
+        """Clé de l'index des emplacements pour un chemin ou une URL"""
+        return canonical_location(location, self.resolve_locations)
+    
+    def _index_location(self, obj: FileObject) -> None:
+        key = self.location_key(obj.location)
+        if self.locations.setdefault(key, obj.id) != obj.id:
+            # Doublon déjà présent dans les données : gardé à part pour rester cohérent
+            self._location_duplicates.setdefault(key, set()).add(obj.id)
+    
+    def _unindex_location(self, obj: FileObject) -> None:
+        key = self.location_key(obj.location)
+        duplicates = self._location_duplicates.get(key)
+        if self.locations.get(key) == obj.id:
+            if duplicates:
+                self.locations[key] = duplicates.pop()
+            else:
+                del self.locations[key]
+        elif duplicates is not None:
+            duplicates.discard(obj.id)
+        if duplicates is not None and not duplicates:
+            del self._location_duplicates[key]
+    
+    @synchronized
+    def _create_tag(self, tag: str) -> None:
+        self.tags[tag] = IdSet(self.interner)
+        self._bump(self._tag_generations, tag)
+        self._index_tag_name(tag)
+    
+    @synchronized
+    def _drop_tag(self, tag: str) -> IdSet:
+        """Retire un tag de la mémoire et retourne ses membres"""
+        obj_ids = self.tags.pop(tag)
+        self._bump(self._tag_generations, tag)
+        self._unindex_tag_name(tag)
+        for obj_id in obj_ids:
+            self._unindex_object_tag(obj_id, tag)
+        return obj_ids
+    
+    @synchronized
+    def _restore_tag(self, tag: str, obj_ids: IdSet) -> None:
+        self.tags[tag] = obj_ids
+        self._bump(self._tag_generations, tag)
+        self._index_tag_name(tag)
+        for obj_id in obj_ids:
+            self.object_tags.setdefault(obj_id, set()).add(tag)
+    
+    def _index_tag_name(self, tag: str) -> None:
+        self._bump(self._generations, "tags")
+        self.tag_leaves.setdefault(tag_leaf(tag), set()).add(tag)
+        self.completions.add(f"#{tag}", len(self.tags[tag]))
+        if self.tag_tree is not None:
+            key = normalize_text(tag)
+            self._tag_keys.setdefault(key, set()).add(tag)
+            self.tag_tree.add(key)
+    
+    def _unindex_tag_name(self, tag: str) -> None:
+        self._bump(self._generations, "tags")
+        leaf = tag_leaf(tag)
+        self.tag_leaves[leaf].discard(tag)
+        if not self.tag_leaves[leaf]:
+            del self.tag_leaves[leaf]
+        self.completions.remove(f"#{tag}")
+        if self.tag_tree is not None:
+            key = normalize_text(tag)
+            self._tag_keys[key].discard(tag)
+            if not self._tag_keys[key]:
+                del self._tag_keys[key]
+            self.tag_tree.remove(key)
+    
+    @synchronized
+    def _tag_insert(self, tag: str, obj_id: str) -> None:
+        if obj_id not in self.tags[tag]:
+            self.completions.use(f"#{tag}")
+        self.tags[tag].add(obj_id)
+        self._bump(self._tag_generations, tag)
+        self.object_tags.setdefault(obj_id, set()).add(tag)
+    
+    @synchronized
+    def _tag_discard(self, tag: str, obj_id: str) -> None:
+        if obj_id in self.tags[tag]:
+            self.completions.use(f"#{tag}", -1)
+        self.tags[tag].discard(obj_id)
+        self._bump(self._tag_generations, tag)
+        self._unindex_object_tag(obj_id, tag)
+    
+    def _unindex_object_tag(self, obj_id: str, tag: str) -> None:
+        object_tags = self.object_tags.get(obj_id)
+        if object_tags is not None:
+            object_tags.discard(tag)
+            if not object_tags:
+                del self.object_tags[obj_id]
+    
+    @synchronized
+    def _insert_collection(self, collection: Collection) -> None:
+        if not isinstance(collection.object_ids, IdSet):
+            collection.object_ids = IdSet(self.interner, collection.object_ids)
+        self.collections[collection.id] = collection
+        self._index_collection_name(collection)
+        self.completions.add(f"@{collection.name}", len(collection.object_ids))
+        for obj_id in collection.object_ids:
+            self.object_collections.setdefault(obj_id, set()).add(collection.id)
+    
+    @synchronized
+    def _remove_collection(self, collection_id: str) -> Collection:
+        collection = self.collections.pop(collection_id)
+        self._unindex_collection_name(collection)
+        self.completions.remove(f"@{collection.name}", len(collection.object_ids))
+        for obj_id in collection.object_ids:
+            self._unindex_object_collection(obj_id, collection_id)
+        return collection
+    
+    @synchronized
+    def _set_collection_fields(self, collection: Collection, name: str, description: str,
+                               updated_at: str) -> None:
+        self._unindex_collection_name(collection)
+        self.completions.remove(f"@{collection.name}", len(collection.object_ids))
+        collection.name = name
+        collection.description = description
+        collection.updated_at = updated_at
+        self._index_collection_name(collection)
+        self.completions.add(f"@{name}", len(collection.object_ids))
+    
+    def _index_collection_name(self, collection: Collection) -> None:
+        self._bump(self._collection_generations, collection.id)
+        key = collection.name.lower()
+        # Les anciennes données peuvent contenir deux collections de même nom
+        self.collection_names.setdefault(key, []).append(collection.id)
+        self.collection_name_index.add(self.collection_numbers.intern(collection.id), key)
+    
+    def _unindex_collection_name(self, collection: Collection) -> None:
+        self._bump(self._collection_generations, collection.id)
+        key = collection.name.lower()
+        collection_ids = self.collection_names.get(key)
+        if collection_ids is not None and collection.id in collection_ids:
+            collection_ids.remove(collection.id)
+            if not collection_ids:
+                del self.collection_names[key]
+        self.collection_name_index.remove(self.collection_numbers.intern(collection.id), key)
+    
+    @synchronized
+    def _collection_insert(self, collection: Collection, obj_id: str,
+                           updated_at: Optional[str] = None) -> None:
+        if obj_id not in collection.object_ids:
+            self.completions.use(f"@{collection.name}")
+        collection.add_object(obj_id)
+        self._bump(self._collection_generations, collection.id)
+        self.object_collections.setdefault(obj_id, set()).add(collection.id)
+        if updated_at is not None:
+            collection.updated_at = updated_at
+    
+    @synchronized
+    def _collection_discard(self, collection: Collection, obj_id: str,
+                            updated_at: Optional[str] = None) -> None:
+        if obj_id in collection.object_ids:
+            self.completions.use(f"@{collection.name}", -1)
+        collection.remove_object(obj_id)
+        self._bump(self._collection_generations, collection.id)
+        self._unindex_object_collection(obj_id, collection.id)
+        if updated_at is not None:
+            collection.updated_at = updated_at
+    
+    def _unindex_object_collection(self, obj_id: str, collection_id: str) -> None:
+        object_collections = self.object_collections.get(obj_id)
+        if object_collections is not None:
+            object_collections.discard(collection_id)
+            if not object_collections:
+                del self.object_collections[obj_id]
+    
     def get_collections_for_object(self, obj_id: str) -> List[Collection]:
         """Retourne toutes les collections contenant un objet"""
-        return [collection for collection in self.collections.values() 
-                if collection.contains_object(obj_id)]
+        return [self.collections[collection_id]
+                for collection_id in self.object_collections.get(obj_id, ())]
+    
+    def matching_collections(self, collection_name: str) -> List[str]:
+        """IDs des collections dont le nom contient collection_name (insensible à la casse)"""
+        key = collection_name.lower()
+        candidates = self.collection_name_index.candidates(key)
+        if candidates is None:
+            # Moins de 3 caractères : parcourir les noms distincts de l'index
+            return [collection_id for name, collection_ids in self.collection_names.items() if key in name
+                    for collection_id in collection_ids]
+        return [collection_id for collection_id in self.collection_numbers.resolve(candidates)
+                if key in self.collections[collection_id].name.lower()]
     
     def search_by_collection(self, collection_name: str) -> List[FileObject]:
         """Recherche des objets par nom de collection"""
         results = []
-        for collection in self.collections.values():
-            if collection_name.lower() in collection.name.lower():
-                for obj_id in collection.object_ids:
-                    if obj_id in self.objects:
-                        results.append(self.objects[obj_id])
+        for collection_id in self.matching_collections(collection_name):
+            for obj_id in self.collections[collection_id].object_ids:
+                if obj_id in self.objects:
+                    results.append(self.objects[obj_id])
         return results
     
     def search_by_name(self, name: str) -> List[FileObject]:
         """Recherche des objets par nom (recherche partielle insensible à la casse)"""
         results = []
-        search_terms = name.lower().split()
+        search_terms = normalize_text(name).split()
         
-        for obj in self.objects.values():
-            obj_name_lower = obj.name.lower()
-            # Vérifie si tous les termes de recherche sont présents dans le nom
-            if all(term in obj_name_lower for term in search_terms):
+        for obj in self._name_candidates(search_terms):
+            # Vérifie si tous les termes de recherche sont présents dans le nom (sans accents ni casse)
+            if all(term in obj.name_key for term in search_terms):
                 results.append(obj)
         
         return results
     
-    def search_by_tag(self, tag: str) -> List[FileObject]:
-        """Recherche des objets por tag"""
-        clean_tag = tag.lstrip('#').strip().replace(' ', '_')
-        if clean_tag not in self.tags:
-            return []
+    def _name_candidates(self, search_terms: List[str], candidates: Optional[Bitmap] = None):
+        """Objets pouvant contenir tous les termes d'après l'index des trigrammes (à vérifier)"""
+        name_index = self.name_index
+        if name_index is None and not self.warming_indexes:
+            name_index = self._lazy_index("name_index", lambda: self._build_name_index(TrigramIndex()))
+        
+        if name_index is not None:
+            for term in search_terms:
+                term_candidates = name_index.candidates(term)
+                if term_candidates is not None:
+                    candidates = term_candidates if candidates is None else candidates & term_candidates
+        
+        if candidates is None:
+            # Aucun terme assez long pour filtrer : parcourir tous les objets
+            return self.objects.values()
+        return (self.objects[obj_id] for obj_id in self.interner.resolve(candidates)
+                if obj_id in self.objects)
+    
+    def record_search(self, query: str) -> None:
+        """Compte une exécution de query pour l'auto-complétion"""
+        query = query.strip()
+        if query:
+            self.query_completions.add(query, 1)
+    
+    def complete(self, query: str, position: int, limit: int = COMPLETION_LIMIT) -> List[Tuple[str, int, int]]:
+        """Suggestions pour le curseur placé en position : [(texte, début, fin)] de la partie à remplacer
         
-        results = []
-        for obj_id in self.tags[clean_tag]:
-            if obj_id in self.objects:
-                results.append(self.objects[obj_id])
-        return results
+        Le mot sous le curseur est complété par les tags, collections,
+        opérateurs et champs ; le début de la requête par les recherches passées.
+        """
+        start, end = word_span(query, position)
+        word = query[start:position]
+        suggestions = [(text, start, end) for text in self.completions.complete(word, limit)] if word else []
+        typed = query[:position].lstrip()
+        if typed and len(suggestions) < limit:
+            known = {text for text, _, _ in suggestions}
+            for text in self.query_completions.complete(typed, limit):
+                if text != query.strip() and text not in known:
+                    suggestions.append((text, 0, len(query)))
+        return suggestions[:limit]
+    
+    def search_by_tag(self, tag: str) -> List[FileObject]:
+        """Recherche des objets por tag (un tag sans dossier est cherché dans tous les dossiers)"""
+        postings = self.term_postings(Term("tag", normalize_tag(tag)))
+        return [self.objects[obj_id] for obj_id in self.interner.resolve(postings) if obj_id in self.objects]
     
     def get_object_tags(self, obj_id: str) -> List[str]:
-        """Retourne tous les tags associés à un objet"""
-        tags = []
+        """Retourne tous les tags associés à un objet (triés par nom)"""
+        return sorted(self.object_tags.get(obj_id, ()))
+    
+    def check_consistency(self) -> List[str]:
+        """Vérifie les index en mémoire par rapport aux données et retourne les incohérences trouvées"""
+        errors = []
+        
+        # Reconstruire l'index objet -> tags à partir de self.tags
+        expected: Dict[str, Set[str]] = {}
+        for tag, obj_ids in self.tags.items():
+            for obj_id in obj_ids:
+                expected.setdefault(obj_id, set()).add(tag)
+        
+        for obj_id in expected.keys() | self.object_tags.keys():
+            indexed = self.object_tags.get(obj_id, set())
+            actual = expected.get(obj_id, set())
+            if indexed != actual:
+                errors.append(f"Index des tags incohérent pour l'objet {obj_id}: "
+                              f"{sorted(indexed)} au lieu de {sorted(actual)}")
+        
+        expected_leaves: Dict[str, Set[str]] = {}
+        for tag in self.tags:
+            expected_leaves.setdefault(tag_leaf(tag), set()).add(tag)
+        if expected_leaves != self.tag_leaves:
+            errors.append("Index des tags par dossier incohérent")
+        
+        expected_completions = CompletionIndex()
+        for operator in OPERATORS:
+            expected_completions.add(operator)
+        for name in self.predicates:
+            expected_completions.add(f"{name}:")
         for tag, obj_ids in self.tags.items():
-            if obj_id in obj_ids:
-                tags.append(tag)
-        return tags
+            expected_completions.add(f"#{tag}", len(obj_ids))
+        for collection in self.collections.values():
+            expected_completions.add(f"@{collection.name}", len(collection.object_ids))
+        if expected_completions.entries != self.completions.entries or \
+                expected_completions.counts != self.completions.counts:
+            errors.append("Index d'auto-complétion incohérent")
+        
+        # Vérifier l'index des emplacements
+        indexed_ids: Dict[str, str] = {}
+        for key, obj_id in self.locations.items():
+            indexed_ids[obj_id] = key
+        for key, obj_ids in self._location_duplicates.items():
+            for obj_id in obj_ids:
+                indexed_ids[obj_id] = key
+            errors.append(f"Emplacement présent plusieurs fois ({key}): {sorted(obj_ids | {self.locations.get(key)})}")
+        for obj_id, obj in self.objects.items():
+            if indexed_ids.get(obj_id) != self.location_key(obj.location):
+                errors.append(f"Index des emplacements incohérent pour l'objet {obj_id}")
+        if len(indexed_ids) != len(self.objects):
+            errors.append("L'index des emplacements contient des objets supprimés")
+        
+        # Vérifier les index des collections
+        expected = {}
+        for collection in self.collections.values():
+            for obj_id in collection.object_ids:
+                expected.setdefault(obj_id, set()).add(collection.id)
+            if (collection.id not in self.collection_names.get(collection.name.lower(), ())
+                    or collection.id not in self.matching_collections(collection.name)):
+                errors.append(f"Collection absente de l'index des noms: {collection.name}")
+        if expected != self.object_collections:
+            errors.append("Index objet -> collections incohérent")
+        for name, collection_ids in self.collection_names.items():
+            for collection_id in collection_ids:
+                collection = self.collections.get(collection_id)
+                if collection is None or collection.name.lower() != name:
+                    errors.append(f"Index des noms de collections incohérent pour '{name}'")
+        
+        # Vérifier les bitmaps des objets et des types
+        if self.all_objects != self.interner.bitmap(self.objects):
+            errors.append("Bitmap des objets incohérent")
+        expected_types: Dict[str, Set[str]] = {}
+        for obj_id, obj in self.objects.items():
+            expected_types.setdefault(obj.file_type.lower(), set()).add(obj_id)
+        if expected_types.keys() != self.type_postings.keys() or any(
+                self.type_postings[file_type] != self.interner.bitmap(obj_ids)
+                for file_type, obj_ids in expected_types.items()):
+            errors.append("Index des types incohérent")
+        expected_extensions: Dict[str, Set[str]] = {}
+        for obj_id, obj in self.objects.items():
+            expected_extensions.setdefault(obj.extension, set()).add(obj_id)
+        if expected_extensions.keys() != self.extension_postings.keys() or any(
+                self.extension_postings[extension] != self.interner.bitmap(obj_ids)
+                for extension, obj_ids in expected_extensions.items()):
+            errors.append("Index des extensions incohérent")
+        
+        # Vérifier les index des dossiers, tailles et dates (s'ils ont été construits)
+        if self.folder_index is not None:
+            expected_folders: Dict[Tuple[str, ...], Set[str]] = {}
+            for obj_id, obj in self.objects.items():
+                if not obj.is_external():
+                    folders = self._object_folders(obj)
+                    for depth in range(1, len(folders) + 1):
+                        expected_folders.setdefault(tuple(folders[:depth]), set()).add(obj_id)
+            folders = dict(self.folder_index.items())
+            if folders.keys() != expected_folders.keys() or any(
+                    folders[path] != self.interner.bitmap(obj_ids) for path, obj_ids in expected_folders.items()):
+                errors.append("Index des dossiers incohérent")
+        for index, field in ((self.size_index, "size"), (self.date_index, "added_at")):
+            if index is not None:
+                expected_entries = SortedKeyIndex()
+                expected_entries.build((self.interner.lookup(obj_id), getattr(obj, field))
+                                       for obj_id, obj in self.objects.items()
+                                       if getattr(obj, field) not in (None, ""))
+                if expected_entries.entries != index.entries:
+                    errors.append(f"Index du champ {field} incohérent")
+        if self.description_index is not None:
+            expected_text = self._build_description_index()
+            if expected_text.documents != self.description_index.documents or \
+                    expected_text.postings != self.description_index.postings or \
+                    expected_text.total_length != self.description_index.total_length:
+                errors.append("Index des descriptions incohérent")
+        
+        # Vérifier l'index des trigrammes des noms (s'il a été construit)
+        if self.name_index is not None:
+            expected_index = TrigramIndex()
+            expected_index.build((self.interner.lookup(obj_id), obj.name_key)
+                                 for obj_id, obj in self.objects.items())
+            if expected_index.postings != self.name_index.postings:
+                errors.append("Index des trigrammes des noms incohérent")
+        if self.name_words is not None:
+            expected_words = WordIndex()
+            expected_words.build((self.interner.lookup(obj_id), obj.name_key)
+                                 for obj_id, obj in self.objects.items())
+            if expected_words.postings != self.name_words.postings or \
+                    set(expected_words.postings) != set(self.name_words.tree):
+                errors.append("Index des mots des noms incohérent")
+        if self.sorted_names is not None:
+            expected_names = SortedKeyIndex()
+            expected_names.build((self.interner.lookup(obj_id), obj.name_key)
+                                 for obj_id, obj in self.objects.items())
+            if expected_names.entries != self.sorted_names.entries:
+                errors.append("Index des noms triés incohérent")
+        if self.tag_tree is not None:
+            expected_keys: Dict[str, Set[str]] = {}
+            for tag in self.tags:
+                expected_keys.setdefault(normalize_text(tag), set()).add(tag)
+            if expected_keys != self._tag_keys or len(self.tag_tree) != len(expected_keys):
+                errors.append("Index approché des tags incohérent")
+        return errors
     
     def advanced_search(self, query: str) -> List[FileObject]:
-        """Recherche avancée avec syntaxe booléenne complète"""
-        if not query.strip():
-            return list(self.objects.values())
+        """Recherche avancée avec syntaxe booléenne complète (tous les résultats, classés)"""
+        postings, parsed_query = self._search_postings(query)
+        rank = self.rank_key(parsed_query)
+        ids = self.interner.ids
+        return [self.objects[ids[number]] for number in sorted(postings, key=rank, reverse=True)]
+    
+    def ranked_search(self, query: str, limit: int = RESULTS_PAGE_SIZE,
+                      cursor: Optional[tuple] = None) -> SearchPage:
+        """Page des limit meilleurs résultats, après cursor (renvoyé par la page précédente)
+        
+        Seuls limit résultats sont gardés (tas borné) : une requête à 50 000
+        résultats ne construit pas 50 000 objets. Le curseur est la clé de
+        classement du dernier résultat, unique grâce au numéro de l'objet :
+        les pages suivantes restent cohérentes même si la base change entre-temps.
+        """
+        postings, parsed_query = self._search_postings(query)
+        rank = self.rank_key(parsed_query)
+        keys = map(rank, postings)
+        if cursor is not None:
+            keys = (key for key in keys if key < cursor)
+        page = heapq.nlargest(limit, keys)
+        ids = self.interner.ids
+        results = [self.objects[ids[-key[-1]]] for key in page]
+        next_cursor = page[-1] if len(page) == limit else None
+        return SearchPage(results, next_cursor, len(postings))
+    
+    def iter_search(self, query: str, batch_size: int = RESULTS_PAGE_SIZE) -> Iterator[List[FileObject]]:
+        """Résultats classés par lots, produits au fur et à mesure
+        
+        Les lots viennent d'une vue figée (search_snapshot) : la base peut
+        changer pendant le parcours sans mélanger deux états. Le premier lot
+        est choisi par un tas borné sur les clés ; les autres sont ensuite
+        triés. Pour la requête vide, l'ordre est celui de l'index des dates
+        d'ajout : rien n'est classé.
+        """
+        keys, objects, recent = self.search_snapshot(query)
+        
+        if recent is not None:
+            for start in range(0, len(recent), batch_size):
+                yield recent[start:start + batch_size]
+            return
+        
+        def resolve(page: List[tuple]) -> List[FileObject]:
+            return [objects[-key[-1]] for key in page]
+        
+        first_page = heapq.nlargest(batch_size, keys)
+        if first_page:
+            yield resolve(first_page)
+        if len(keys) <= batch_size:
+            return
+        
+        last = first_page[-1]  # Les clés sont uniques : les suivantes lui sont inférieures
+        rest = sorted((key for key in keys if key < last), reverse=True)
+        for start in range(0, len(rest), batch_size):
+            yield resolve(rest[start:start + batch_size])
+    
+    def search_snapshot(self, query: str) -> SearchSnapshot:
+        """Vue figée des résultats de query, utilisable hors du thread de l'interface
+        
+        La requête est évaluée sans verrou, puis ses résultats sont classés
+        sous le verrou si rien de ce dont elle dépend (_query_stamp) n'a
+        changé entre-temps : l'indexation du contenu ne relance pas une
+        recherche par nom. Sinon l'évaluation est recommencée, la dernière
+        fois sous le verrou. Une RuntimeError (ensemble modifié pendant son
+        parcours) n'est reprise que si une écriture a eu lieu entre-temps.
+        """
+        parsed_query = self._parse_search(query)
+        if parsed_query is None:
+            self._lazy_index("date_index", lambda: self._build_field_index("added_at"))
+        for _ in range(SNAPSHOT_ATTEMPTS - 1):
+            with self._lock:
+                stamp = self._search_stamp(parsed_query)
+                generation = self.generation
+            try:
+                postings, evaluated = self._evaluate_search(query, parsed_query)
+            except RuntimeError:
+                if self.generation == generation:
+                    raise  # Aucune écriture concurrente : vraie erreur
+                continue
+            with self._lock:
+                if self._search_stamp(parsed_query) == stamp:
+                    return self._freeze_search(postings, evaluated)
+        with self._lock:
+            return self._freeze_search(*self._evaluate_search(query, parsed_query))
+    
+    def stream_search(self, query: str, results: "queue.Queue", cancelled: Callable[[], bool],
+                      batch_size: int = RESULTS_PAGE_SIZE) -> None:
+        """Place dans results les lots de query dès qu'ils sont prêts (depuis un thread de recherche)
         
+        None marque la fin des lots ; une erreur est placée dans la file à la
+        place des lots restants. cancelled est consulté entre deux lots.
+        """
         try:
-            # Parser la requête booléenne
-            parsed_query = self.parse_boolean_query(query)
-            
-            # Évaluer la requête
-            result_ids = self.evaluate_boolean_expression(parsed_query)
-            
-            # Convertir les IDs en objets
-            results = []
-            for obj_id in result_ids:
-                if obj_id in self.objects:
-                    results.append(self.objects[obj_id])
-            
-            return results
-            
+            for batch in self.iter_search(query, batch_size):
+                if cancelled():
+                    return
+                results.put(batch)
+        except Exception as e:
+            results.put(e)
+            return
+        results.put(None)
+    
+    def _freeze_search(self, postings: Bitmap, parsed_query: Optional[Node]) -> SearchSnapshot:
+        """Classe les résultats et garde leurs objets (à appeler sous le verrou)
+        
+        Les clés sont calculées sous le verrou : les bitmaps des tags, l'index
+        des descriptions et les noms lus par rank_key sont ceux de l'état
+        évalué. Seuls les résultats sont parcourus, pas toute la base.
+        """
+        objects, ids = self.objects, self.interner.ids
+        if parsed_query is None and self.date_index is not None:
+            return SearchSnapshot([], {}, [objects[ids[number]]
+                                           for number in recent_order(self.date_index.entries, postings)])
+        rank = self.rank_key(parsed_query)
+        return SearchSnapshot([rank(number) for number in postings],
+                              {number: objects[ids[number]] for number in postings})
+    
+    def _search_stamp(self, parsed_query: Optional[Node]) -> tuple:
+        if parsed_query is None:
+            return (self._generations["objects"],)
+        return self._query_stamp(parsed_query)
+    
+    def _parse_search(self, query: str) -> Optional[Node]:
+        """Requête analysée (None : tous les objets) ; une requête invalide est cherchée dans les noms"""
+        query = query.strip()
+        if not query:
+            return None
+        try:
+            return self.parse_boolean_query(query)
+        except Exception as e:
+            print(f"Erreur dans la recherche avancée: {e}")
+            return Term("name", query)
+    
+    def _search_postings(self, query: str) -> Tuple[Bitmap, Optional[Node]]:
+        """(bitmap des résultats, requête analysée)"""
+        return self._evaluate_search(query, self._parse_search(query))
+    
+    def _evaluate_search(self, query: str, parsed_query: Optional[Node]) -> Tuple[Bitmap, Optional[Node]]:
+        """(bitmap des résultats, requête évaluée) ; une requête impossible à évaluer est cherchée dans les noms"""
+        if parsed_query is None:
+            return self.all_objects, None
+        try:
+            return self.query_postings(parsed_query), parsed_query
+        except RuntimeError:
+            raise  # Écriture concurrente (voir search_snapshot) : la requête n'est pas en cause
         except Exception as e:
             print(f"Erreur dans la recherche avancée: {e}")
             # Fallback vers la recherche simple
-            return self.search_by_name(query)
+            parsed_query = Term("name", query.strip())
+            return self.query_postings(parsed_query), parsed_query
+    
+    def rank_key(self, expression: Optional[Node]) -> Callable[[int], tuple]:
+        """Clé de classement d'un résultat (numéro d'objet), la plus grande étant la meilleure
+        
+        Dans l'ordre : pour un XOR, correspondance à tous les opérandes ; nom
+        identique > commençant par le terme > le contenant ; nombre de tags de
+        la requête portés par l'objet ; score BM25 de la description pour les
+        termes desc: ; proximité des mots du terme dans le nom ; date d'ajout
+        la plus récente. Le numéro (négatif) départage les égalités.
+        """
+        terms = list(positive_terms(expression)) if expression is not None else []
+        name_texts = [normalize_text(term.value) for term in terms if term.kind in ("name", "exact")]
+        tag_postings = [self.term_postings(term) for term in terms if term.kind in ("tag", "fuzzy_tag")]
+        first = self.query_postings(And(expression.operands)) if isinstance(expression, Xor) else None
+        description_words = [word for term in terms if term.kind == "desc" for word in TextIndex.words(term.value)]
+        relevance = self._description_index().scorer(description_words) if description_words else None
+        objects, ids = self.objects, self.interner.ids
+        
+        def key(number: int) -> tuple:
+            obj = objects[ids[number]]
+            name_key = obj.name_key
+            match = proximity = 0
+            for text in name_texts:
+                if name_key == text:
+                    match = 3
+                elif name_key.startswith(text):
+                    match = max(match, 2)
+                elif text in name_key:
+                    match = max(match, 1)
+                words = text.split()
+                if len(words) > 1:
+                    # Écart entre les mots du terme dans le nom (0 s'ils se suivent)
+                    starts = [name_key.find(word) for word in words]
+                    if min(starts) >= 0:
+                        end = max(start + len(word) for start, word in zip(starts, words))
+                        proximity -= end - min(starts) - len(text)
+            tags = sum(number in postings for postings in tag_postings)
+            return (first is not None and number in first, match, tags,
+                    relevance(number) if relevance is not None else 0.0, proximity, obj.added_at, -number)
+        
+        return key
     
     def location_exists(self, location: str) -> bool:
         """Vérifie si un emplacement existe déjà dans la base de données"""
-        for obj in self.objects.values():
-            if obj.location == location:
-                return True
-        return False
+        return self.location_key(location) in self.locations
 
     def get_object_by_location(self, location: str) -> Optional[FileObject]:
         """Retourne l'objet correspondant à un emplacement"""
-        for obj in self.objects.values():
-            if obj.location == location:
-                return obj
-        return None
+        obj_id = self.locations.get(self.location_key(location))
+        return self.objects.get(obj_id) if obj_id is not None else None
     
-    def parse_boolean_query(self, query: str) -> Union[str, dict]:
+    def parse_boolean_query(self, query: str) -> Node:
         """
-        Parse une requête booléenne en arbre syntaxique
-        Format: {"operator": "AND/OR/NOT", "operands": [operand1, operand2, ...]}
+        Parse une requête booléenne en arbre syntaxique (Term, And, Or, Not)
+        Les requêtes déjà analysées sont reprises du cache de recherche.parse_query
+        (propre aux champs et aux types de fichier de cette base).
         """
-        query = query.strip()
-        
-        # Gérer les parenthèses
-        if query.startswith('(') and query.endswith(')'):
-            return self.parse_boolean_query(query[1:-1])
-        
-        # Chercher les opérateurs en respectant la priorité (NOT > AND > OR)
-        # D'abord chercher les opérateurs avec espaces
-        for operator in [' OR ', ' AND ', ' NOT ']:
-            if operator in query:
-                parts = query.split(operator, 1)
-                if len(parts) == 2:
-                    left, right = parts
-                    return {
-                        "operator": operator.strip(),
-                        "operands": [
-                            self.parse_boolean_query(left),
-                            self.parse_boolean_query(right)
-                        ]
-                    }
-        
-        # Ensuite chercher les opérateurs sans espaces (pour la compatibilité)
-        for operator in ['OR', 'AND', 'NOT']:
-            if f" {operator} " in query:  # Éviter les matches dans les mots
-                continue
-            if operator in query:
-                # Vérifier que c'est bien un opérateur et pas une partie d'un mot
-                pattern = r'(?<!\w)' + re.escape(operator) + r'(?!\w)'
-                if re.search(pattern, query):
-                    parts = re.split(pattern, query, 1)
-                    if len(parts) == 2:
-                        left, right = parts
-                        return {
-                            "operator": operator,
-                            "operands": [
-                                self.parse_boolean_query(left),
-                                self.parse_boolean_query(right)
-                            ]
-                        }
-        
-        # Si pas d'opérateur, c'est un terme simple
-        return query.strip()
-    
-    def evaluate_boolean_expression(self, expression: Union[str, dict]) -> Set[str]:
+        with self._lock:
+            types = frozenset(self.type_postings)
+        return parse_query(query.strip(), self.fields, types)
+    
+    def evaluate_boolean_expression(self, expression: Node) -> Set[str]:
         """Évalue une expression booléenne et retourne les IDs d'objets correspondants"""
-        if isinstance(expression, str):
-            # Terme simple - recherche par nom ou tag
-            return self.evaluate_simple_term(expression)
-        
-        operator = expression["operator"]
-        operands = expression["operands"]
-        
-        if operator == "NOT":
-            if len(operands) != 2:  # NOT a deux opérandes mais le second est ignoré
-                # Pour gérer "NOT terme" et "terme NOT autre"
-                if len(operands) == 1:
-                    # Cas: NOT terme
-                    result = self.evaluate_boolean_expression(operands[0])
-                    return self.get_all_object_ids() - result
+        return set(self.interner.resolve(self.query_postings(expression)))
+    
+    def query_postings(self, expression: Node) -> Bitmap:
+        """Résultat final d'une requête, repris du cache tant que rien de ce qu'elle lit n'a changé"""
+        stamp = self._query_stamp(expression)
+        with self._lock:
+            cached = self._result_cache.get(expression)
+            if cached is not None and cached[0] == stamp:
+                self._cache_hits += 1
+                self._result_cache.move_to_end(expression)
+                return cached[1]
+            self._cache_misses += 1
+        
+        plan = self.optimize_query(expression)
+        postings = self.resolve_postings(*self.evaluate_postings(plan))
+        with self._lock:
+            # Calculé avec les générations d'avant l'évaluation : jamais resservi si la base a changé
+            self._result_cache[expression] = (stamp, postings)
+            self._result_cache.move_to_end(expression)
+            while len(self._result_cache) > self.result_cache_size:
+                self._result_cache.popitem(last=False)
+        return postings
+    
+    def _query_stamp(self, expression: Node) -> tuple:
+        """Générations de tout ce dont dépend le résultat de la requête"""
+        stamp = [self._generations["objects"]]
+        for term in iter_terms(expression):
+            if term.kind == "tag":
+                # Un tag sans dossier correspond aussi aux tags de même nom rangés dans des dossiers
+                stamp.append(self._generations["tags"])
+                stamp.extend(self._tag_generations.get(tag, 0) for tag in self.matching_tags(term.value))
+            elif term.kind in self.predicates:
+                stamp.extend(self._generations[key] for key in self.predicates[term.kind].generations)
+            elif term.kind == "fuzzy_tag":
+                # Les tags proches dépendent de l'ensemble des tags
+                stamp.append(self._generations["tags"])
+                stamp.extend(self._tag_generations.get(tag, 0) for tag in self.fuzzy_tags(term.value))
+            elif term.kind == "collection":
+                # Collections correspondantes et leurs générations : une collection créée,
+                # renommée ou supprimée change la liste, un changement de membres la génération
+                stamp.append(tuple((collection_id, self._collection_generations[collection_id])
+                                   for collection_id in self.matching_collections(term.value)))
+            else:
+                stamp.append(self._generations["names"])
+        return tuple(stamp)
+    
+    def _bump(self, generations: Dict[str, int], key: str) -> None:
+        self.generation = generations[key] = next(self._generation_counter)
+    
+    def cache_stats(self) -> Dict[str, int]:
+        """Statistiques du cache des résultats de recherche"""
+        return {
+            "hits": self._cache_hits,
+            "misses": self._cache_misses,
+            "size": len(self._result_cache),
+            "max_size": self.result_cache_size
+        }
+    
+    def clear_result_cache(self) -> None:
+        self._result_cache.clear()
+    
+    def optimize_query(self, expression: Node) -> Node:
+        """Réordonne la requête selon la taille des listes de tags et de collections"""
+        return optimize(expression, self.term_cardinality, len(self.objects))
+    
+    def term_cardinality(self, term: Term) -> int:
+        """Nombre d'objets d'un terme indexé (tag ou collection)"""
+        if term.kind == "tag":
+            return sum(len(self.tags[tag]) for tag in self.matching_tags(term.value))
+        predicate = self.predicates.get(term.kind)
+        if predicate is not None:
+            if predicate.estimate is not None:
+                return predicate.estimate(term.value)
+            return len(predicate.postings(term.value))
+        if term.kind == "fuzzy_tag":
+            return sum(len(self.tags[tag]) for tag in self.fuzzy_tags(term.value))
+        if term.kind == "collection":
+            return sum(len(self.collections[collection_id].object_ids)
+                       for collection_id in self.matching_collections(term.value))
+        return len(self.objects)
+    
+    def evaluate_postings(self, expression: Node, candidates: Optional[Bitmap] = None) -> Tuple[Bitmap, bool]:
+        """Évalue une expression booléenne sur les bitmaps
+        
+        Retourne (bitmap, negated) : si negated est vrai, le résultat est le
+        complément du bitmap. NOT n'a ainsi jamais à construire l'ensemble de
+        tous les objets ; resolve_postings() le fait une seule fois à la fin.
+        
+        Si candidates est donné, le résultat n'a besoin d'être exact que pour
+        ces objets : les termes à parcourir ne testent que les candidats.
+        """
+        if isinstance(expression, Term):
+            return self.term_postings(expression, candidates), False
+        
+        if isinstance(expression, Not):
+            bitmap, negated = self.evaluate_postings(expression.operand, candidates)
+            return bitmap, not negated
+        
+        if isinstance(expression, And):
+            # Intersection dans l'ordre choisi par optimize_query()
+            result = None
+            for operand in expression.operands:
+                if result is not None:
+                    bitmap, negated = result
+                    if not negated and not bitmap:
+                        break  # Intersection vide : inutile d'évaluer la suite
+                    if is_scan(operand):
+                        # Ne parcourir que les objets qui restent candidats
+                        candidates = self.resolve_postings(bitmap, negated)
+                if result is None:
+                    result = self.evaluate_postings(operand, candidates)
                 else:
-                    raise ValueError("NOT doit avoir un ou deux opérandes")
-            
-            # Cas: terme1 NOT terme2
-            result1 = self.evaluate_boolean_expression(operands[0])
-            result2 = self.evaluate_boolean_expression(operands[1])
-            return result1 - result2
-        
-        elif operator == "AND":
-            if len(operands) < 2:
-                raise ValueError("AND doit avoir au moins deux opérandes")
-            
-            results = []
-            for operand in operands:
-                results.append(self.evaluate_boolean_expression(operand))
-            
-            # Intersection de tous les résultats
-            return set.intersection(*results)
+                    result = self._and_postings(result, self.evaluate_postings(operand, candidates))
+            return result
         
-        elif operator == "OR":
-            if len(operands) < 2:
-                raise ValueError("OR doit avoir au moins deux opérandes")
-            
-            results = set()
-            for operand in operands:
-                results.update(self.evaluate_boolean_expression(operand))
-            
-            return results
+        if isinstance(expression, (Or, Xor)):
+            # XOR a le même résultat que OR : seul son classement diffère (advanced_search)
+            result = self.evaluate_postings(expression.operands[0], candidates)
+            for operand in expression.operands[1:]:
+                result = self._or_postings(result, self.evaluate_postings(operand, candidates))
+            return result
         
-        else:
-            raise ValueError(f"Opérateur inconnu: {operator}")
+        raise ValueError(f"Expression inconnue: {expression!r}")
+    
+    @staticmethod
+    def _and_postings(left: Tuple[Bitmap, bool], right: Tuple[Bitmap, bool]) -> Tuple[Bitmap, bool]:
+        (a, not_a), (b, not_b) = left, right
+        if not_a and not_b:
+            return a | b, True       # NOT a AND NOT b = NOT (a OR b)
+        if not_a:
+            return b - a, False
+        if not_b:
+            return a - b, False
+        return a & b, False
+    
+    @staticmethod
+    def _or_postings(left: Tuple[Bitmap, bool], right: Tuple[Bitmap, bool]) -> Tuple[Bitmap, bool]:
+        (a, not_a), (b, not_b) = left, right
+        if not_a and not_b:
+            return a & b, True       # NOT a OR NOT b = NOT (a AND b)
+        if not_a:
+            return a - b, True       # NOT a OR b = NOT (a AND NOT b)
+        if not_b:
+            return b - a, True
+        return a | b, False
+    
+    def resolve_postings(self, bitmap: Bitmap, negated: bool = False) -> Bitmap:
+        """Bitmap final limité aux objets présents (complément si negated)"""
+        if negated:
+            return self.all_objects - bitmap
+        return bitmap & self.all_objects
+    
+    def term_postings(self, term: Term, candidates: Optional[Bitmap] = None) -> Bitmap:
+        """Bitmap des objets correspondant à un terme simple"""
+        # Tag : liste d'appartenance directement (union si le tag existe dans plusieurs dossiers)
+        if term.kind == "tag":
+            tags = self.matching_tags(term.value)
+            if len(tags) == 1:
+                return self.tags[tags[0]].bitmap
+            result = Bitmap()
+            for tag in tags:
+                result = result | self.tags[tag].bitmap
+            return result
+        
+        # Prédicat « champ:valeur » (type, extension, dossier, taille, date...) : index du champ
+        predicate = self.predicates.get(term.kind)
+        if predicate is not None:
+            return predicate.postings(term.value)
+        
+        # Collection : union des collections dont le nom correspond
+        if term.kind == "collection":
+            result = Bitmap()
+            for collection_id in self.matching_collections(term.value):
+                result = result | self.collections[collection_id].object_ids.bitmap
+            return result
+        
+        # Recherche approchée : tags proches, ou objets dont le nom contient un mot proche de chaque terme
+        if term.kind == "fuzzy_tag":
+            result = Bitmap()
+            for tag in self.fuzzy_tags(term.value):
+                result = result | self.tags[tag].bitmap
+            return result
+        if term.kind == "fuzzy":
+            return self.fuzzy_name_postings(term.value)
+        
+        # Terme entre guillemets (recherche exacte) : intervalle des noms triés
+        if term.kind == "exact":
+            result = Bitmap.from_sorted(sorted(number for _, number in
+                                               self._sorted_names().equal(normalize_text(term.value))))
+            return result & candidates if candidates is not None else result
+        
+        # Motif à jokers
+        if term.kind == "wildcard":
+            return self.wildcard_postings(term.value, candidates)
+        
+        # Nom : candidats de l'index, limités aux candidats de la requête s'il y en a
+        search_terms = normalize_text(term.value).split()
+        objects = self._name_candidates(search_terms, candidates)
+        return self.interner.bitmap(obj.id for obj in objects
+                                    if all(search_term in obj.name_key for search_term in search_terms))
+    
+    def matching_tags(self, tag: str) -> List[str]:
+        """Tags désignés par tag : « dossier/tag » exactement, ou « tag » dans n'importe quel dossier
+        
+        « dossier/tag » désigne aussi un tag enregistré sous le nom
+        « dossier:tag » : c'est ainsi qu'une requête écrit les deux.
+        """
+        if TAG_FOLDER_SEPARATOR in tag:
+            typed = tag.replace(TAG_FOLDER_SEPARATOR, ":")
+            return [name for name in (tag, typed) if name in self.tags]
+        return sorted(self.tag_leaves.get(tag, ()))
+    
+    def fuzzy_tags(self, tag: str) -> List[str]:
+        """Tags proches de tag (fautes de frappe, casse et accents tolérés), du plus proche au plus lointain"""
+        tag_tree, tag_keys = self.tag_tree, self._tag_keys
+        if tag_tree is None:
+            generation = self.generation
+            tag_keys = {}
+            for name in list(self.tags):
+                tag_keys.setdefault(normalize_text(name), set()).add(name)
+            tag_tree = BKTree()
+            for key, names in tag_keys.items():
+                for _ in names:
+                    tag_tree.add(key)
+            with self._lock:
+                if self.generation == generation:
+                    self.tag_tree, self._tag_keys = tag_tree, tag_keys
+        
+        key = normalize_text(tag.lstrip('#').strip().replace(' ', '_'))
+        return [name for match, _ in tag_tree.search(key, fuzzy_distance(key))
+                for name in sorted(tag_keys[match])]
+    
+    def fuzzy_name_postings(self, text: str) -> Bitmap:
+        """Bitmap des objets dont le nom contient, pour chaque mot de text, un mot proche"""
+        name_words = self._lazy_index("name_words", lambda: self._build_name_index(WordIndex()))
+        
+        result = None
+        for word in WordIndex.words(normalize_text(text)):
+            postings = name_words.fuzzy(word, fuzzy_distance(word))
+            result = postings if result is None else result & postings
+            if not result:
+                break
+        return result if result is not None else Bitmap()
+    
+    def _sorted_names(self) -> SortedKeyIndex:
+        return self._lazy_index("sorted_names", lambda: self._build_name_index(SortedKeyIndex()))
+    
+    def _build_name_index(self, index):
+        index.build((self.interner.lookup(obj_id), obj.name_key) for obj_id, obj in list(self.objects.items()))
+        return index
+    
+    def warm_indexes(self) -> threading.Thread:
+        """Construit les index des noms dans un thread après le chargement
+        
+        Tant que l'index des trigrammes n'est pas publié, la recherche par nom
+        parcourt les objets au lieu de le construire dans le thread appelant.
+        """
+        self.warming_indexes = True
+        thread = threading.Thread(target=self._warm_indexes, name="index-warmup", daemon=True)
+        thread.start()
+        return thread
+    
+    def _warm_indexes(self) -> None:
+        try:
+            self._lazy_index("name_index", lambda: self._build_name_index(TrigramIndex()))
+            self._sorted_names()
+            self._lazy_index("date_index", lambda: self._build_field_index("added_at"))  # Ordre de la requête vide
+        except Exception as e:
+            print(f"Erreur lors de la construction des index: {e}")
+        finally:
+            self.warming_indexes = False
+    
+    def _lazy_index(self, attribute: str, build: Callable[[], object]):
+        """Index construit à la première utilisation
+        
+        La construction se fait sans verrou (éventuellement dans un thread de
+        recherche) ; l'index n'est gardé que si la base n'a pas changé entre-temps,
+        sinon il sert seulement à la recherche en cours et sera reconstruit.
+        """
+        index = getattr(self, attribute)
+        if index is None:
+            generation = self.generation
+            index = build()
+            with self._lock:
+                if self.generation == generation:
+                    setattr(self, attribute, index)
+        return index
+    
+    def wildcard_postings(self, pattern: str, candidates: Optional[Bitmap] = None) -> Bitmap:
+        """Bitmap des objets dont le nom entier correspond au motif (* et ?)
+        
+        Préfixe littéral : intervalle des noms triés (sans vérification pour
+        « préfixe* »). Sinon, fragments littéraux : candidats des trigrammes.
+        Le parcours de tous les noms n'a lieu que si aucun fragment ne filtre.
+        """
+        pattern = normalize_text(pattern)
+        prefix, fragments = wildcard_fragments(pattern)
+        regex = wildcard_regex(pattern)
+        
+        if prefix:
+            entries = self._sorted_names().prefix(prefix)
+            if pattern == prefix + "*":
+                numbers = [number for _, number in entries]
+            else:
+                numbers = [number for key, number in entries if regex.match(key)]
+            result = Bitmap.from_sorted(sorted(numbers))
+            return result & candidates if candidates is not None else result
+        
+        objects = self._name_candidates(fragments, candidates)
+        return self.interner.bitmap(obj.id for obj in objects if regex.match(obj.name_key))
+    
+    def search_by_type(self, file_type: str) -> List[FileObject]:
+        """Recherche des objets par type de fichier (insensible à la casse)"""
+        return [self.objects[obj_id] for obj_id in self.interner.resolve(self._type_postings(file_type))]
+    
+    # Prédicats « champ:valeur »
+    def register_predicate(self, name: str, postings: Callable[[str], Bitmap],
+                           generations: Tuple[str, ...] = (),
+                           estimate: Optional[Callable[[str], int]] = None) -> None:
+        """Ajoute un champ à la recherche avancée (« name:valeur »)
+        
+        postings(valeur) renvoie le bitmap des objets correspondants ;
+        generations liste les clés de _generations qui invalident ses résultats
+        en cache (l'ajout et la suppression d'objets sont toujours pris en compte).
+        estimate(valeur) borne à moindre coût le nombre d'objets, pour les
+        prédicats dont postings est coûteux.
+        """
+        for key in generations:
+            self._generations.setdefault(key, 0)
+        self.predicates[name.lower()] = Predicate(postings, tuple(generations), estimate)
+        self.fields = self.fields | {name.lower()}
+        self.completions.add(f"{name.lower()}:")
+    
+    def _type_postings(self, value: str) -> Bitmap:
+        return self.type_postings.get(value.lower(), Bitmap())
+    
+    def _extension_postings(self, value: str) -> Bitmap:
+        return self.extension_postings.get(value.lstrip('.').lower(), Bitmap())
+    
+    def _folder_postings(self, value: str) -> Bitmap:
+        """Objets situés sous le dossier (à n'importe quelle profondeur)"""
+        folder_index = self._lazy_index("folder_index", self._build_folder_index)
+        return folder_index.lookup(path_components(self.location_key(value)))
+    
+    def _build_folder_index(self) -> PathTrie:
+        index = PathTrie()
+        for obj_id, obj in list(self.objects.items()):
+            if not obj.is_external():
+                index.add(self.interner.lookup(obj_id), self._object_folders(obj))
+        return index
+    
+    def _build_field_index(self, field: str) -> SortedKeyIndex:
+        """(valeur du champ, numéro) triés, pour les objets dont le champ est connu"""
+        index = SortedKeyIndex()
+        index.build((self.interner.lookup(obj_id), getattr(obj, field))
+                    for obj_id, obj in list(self.objects.items()) if getattr(obj, field) not in (None, ""))
+        return index
+    
+    def _size_postings(self, value: str) -> Bitmap:
+        """Tailles comparées (size:>10MB, size:<=500k, size:1MB..2MB ; size:10MB pour une égalité)"""
+        size_index = self._lazy_index("size_index", lambda: self._build_field_index("size"))
+        return self._range_postings(size_index, *self._size_bounds(value))
+    
+    def _size_estimate(self, value: str) -> int:
+        size_index = self._lazy_index("size_index", lambda: self._build_field_index("size"))
+        return size_index.count_between(*self._size_bounds(value))
+    
+    @staticmethod
+    def _size_bounds(value: str) -> tuple:
+        """Bornes (basse incluse, haute exclue, None : pas de borne) d'une valeur de size:"""
+        operator, low, high = split_comparison(value)
+        size = parse_size(low)
+        bounds = {
+            "=": (size, size + 1), ">": (size + 1, None), ">=": (size, None),
+            "<": (None, size), "<=": (None, size + 1),
+            "..": (size, parse_size(high) + 1) if operator == ".." else None
+        }[operator]
+        return bounds
+    
+    def _date_postings(self, value: str) -> Bitmap:
+        """Dates d'ajout par période (added:2025-08, added:>=2025-01-15, added:2024..2025-06)"""
+        date_index = self._lazy_index("date_index", lambda: self._build_field_index("added_at"))
+        return self._range_postings(date_index, *self._date_bounds(value))
+    
+    def _date_estimate(self, value: str) -> int:
+        date_index = self._lazy_index("date_index", lambda: self._build_field_index("added_at"))
+        return date_index.count_between(*self._date_bounds(value))
+    
+    @staticmethod
+    def _date_bounds(value: str) -> tuple:
+        """Bornes d'une valeur de added: (une période couvre toutes les dates qui commencent par elle)"""
+        operator, low, high = split_comparison(value)
+        date = parse_date(low)
+        # Une période couvre toutes les dates qui commencent par elle : [date, prefix_upper(date))
+        bounds = {
+            "=": (date, prefix_upper(date)), ">": (prefix_upper(date), None), ">=": (date, None),
+            "<": (None, date), "<=": (None, prefix_upper(date)),
+            "..": (date, prefix_upper(parse_date(high))) if operator == ".." else None
+        }[operator]
+        return bounds
+    
+    def _description_index(self) -> TextIndex:
+        return self._lazy_index("description_index", self._build_description_index)
+    
+    def _build_description_index(self) -> TextIndex:
+        index = TextIndex()
+        index.build((self.interner.lookup(obj_id), obj.description)
+                    for obj_id, obj in list(self.objects.items()) if obj.description)
+        return index
+    
+    def _description_postings(self, value: str) -> Bitmap:
+        """Objets dont la description contient les mots (desc:dragon, desc:"dragon rouge" à la suite)"""
+        return self._description_index().matches(value)
+    
+    def _description_estimate(self, value: str) -> int:
+        return self._description_index().estimate(value)
+    
+    def attach_content_index(self, index: Optional[ContentIndex]) -> None:
+        """Active la recherche dans le contenu des documents (content:mot), ou la désactive avec None"""
+        with self._lock:
+            self.content_index = index
+            if "content" not in self.predicates:
+                self.register_predicate("content", self._content_postings, ("contents",), self._content_estimate)
+            self.content_changed()
+    
+    def content_changed(self) -> None:
+        """L'index du contenu a changé : les résultats content: en cache sont périmés (appelable de tout thread)"""
+        with self._lock:
+            # Pas de self.generation : seules les requêtes content: (par leur tampon) en dépendent
+            self._generations["contents"] = next(self._generation_counter)
+    
+    def content_locations(self) -> List[str]:
+        """Emplacements des fichiers locaux dont le contenu peut être indexé"""
+        return [obj.location for obj in list(self.objects.values())
+                if not obj.is_external() and obj.extension in CONTENT_EXTENSIONS]
+    
+    def _content_postings(self, value: str) -> Bitmap:
+        """Objets dont le fichier contient tous les mots (content:facture, content:"bon de commande")"""
+        index = self.content_index  # Lu une seule fois : peut être détaché pendant la recherche
+        if index is None:
+            return Bitmap()
+        obj_ids = (self.locations.get(self.location_key(location))
+                   for location in index.search(TextIndex.words(value)))
+        return self.interner.bitmap(obj_id for obj_id in obj_ids if obj_id is not None)
+    
+    def _content_estimate(self, value: str) -> int:
+        index = self.content_index
+        if index is None:
+            return 0
+        return index.estimate(TextIndex.words(value))
+    
+    @staticmethod
+    def _range_postings(index: SortedKeyIndex, low, high) -> Bitmap:
+        return Bitmap(number for _, number in index.between(low, high))
     
     def evaluate_simple_term(self, term: str) -> Set[str]:
         """Évalue un terme simple (nom ou tag)"""
@@ -946,21 +2316,18 @@ class TagDatabase:
             objects = self.search_by_collection(collection_name)
             return {obj.id for obj in objects}
         
-        # Recherche par nom (avec wildcards)
+        # Recherche par nom avec wildcards
+        elif has_wildcards(term):
+            return self.search_by_name_with_wildcards(term)
+        
+        # Recherche par nom
         else:
             objects = self.search_by_name(term)
             return {obj.id for obj in objects}
     
     def search_exact_name(self, name: str) -> Set[str]:
-        """Recherche exacte par nom (insensible à la casse)"""
-        results = set()
-        name_lower = name.lower()
-        
-        for obj_id, obj in self.objects.items():
-            if obj.name.lower() == name_lower:
-                results.add(obj_id)
-        
-        return results
+        """Recherche exacte par nom (insensible à la casse et aux accents)"""
+        return {self.interner.ids[number] for _, number in self._sorted_names().equal(normalize_text(name))}
     
     def get_all_object_ids(self) -> Set[str]:
         """Retourne tous les IDs d'objets"""
@@ -970,26 +2337,7 @@ class TagDatabase:
         """
         Recherche par nom avec wildcards (* pour plusieurs caractères, ? pour un caractère)
         """
-        results = set()
-        pattern_lower = pattern.lower()
-        
-        # Convertir le pattern en regex
-        regex_pattern = pattern_lower.replace('*', '.*').replace('?', '.')
-        regex_pattern = f"^{regex_pattern}$"
-        
-        try:
-            import re
-            regex = re.compile(regex_pattern)
-            
-            for obj_id, obj in self.objects.items():
-                if regex.match(obj.name.lower()):
-                    results.add(obj_id)
-                    
-        except re.error:
-            # Fallback vers la recherche simple si le pattern est invalide
-            return self.evaluate_simple_term(pattern)
-        
-        return results
+        return set(self.interner.resolve(self.wildcard_postings(pattern)))
 
 class CollectionDialog(QDialog):
     """Boîte de dialogue pour créer ou modifier une collection"""
@@ -1152,19 +2500,14 @@ class CollectionsDialog(QDialog):
             return
         
         dialog = CollectionDialog(self, collection)
-        if dialog.exec() == QDialog.Acepted:
+        if dialog.exec() == QDialog.Accepted:
             data = dialog.get_data()
             if data["name"]:
-                # Vérifier si le nouveau nom n'est pas déjà utilisé par une autre collection
-                for col in self.db.collections.values():
-                    if col.id != collection_id and col.name.lower() == data["name"].lower():
-                        QMessageBox.warning(self, "Erreur", "Une collection avec ce nom existe déjà.")
-                        return
+                # Le nouveau nom ne doit pas être déjà utilisé par une autre collection
+                if not self.db.rename_collection(collection_id, data["name"], data["description"]):
+                    QMessageBox.warning(self, "Erreur", "Une collection avec ce nom existe déjà.")
+                    return
                 
-                collection.name = data["name"]
-                collection.description = data["description"]
-                collection.updated_at = datetime.datetime.now().isoformat()
-                self.db.save_collection(collection)
                 self.load_collections()
                 QMessageBox.information(self, "Succès", "Collection modifiée avec succès.")
     
@@ -1359,6 +2702,24 @@ class MainWindow(QMainWindow):
         self.db = None
         self.search_history = SearchHistory()
         self.current_search_results = []
+        self.search_query = ""   # Requête dont les résultats sont affichés
+        self.search_stream: Optional[Iterator[List[FileObject]]] = None  # Lots de résultats restant à afficher
+        self.search_timer = QTimer(self)  # Affiche les lots suivants entre deux événements
+        self.search_timer.setInterval(0)
+        self.search_timer.timeout.connect(self.consume_search_stream)
+        # Recherche pendant la frappe : un seul thread, seule la dernière requête est affichée
+        self.live_search_executor = ThreadPoolExecutor(max_workers=1)
+        self.live_search_serial = 0  # Incrémenté à chaque frappe : annule les recherches en cours
+        self.live_search_query = ""
+        self.live_search_results: Optional[queue.Queue] = None  # Lots produits par stream_search
+        self.live_search_delay = QTimer(self)
+        self.live_search_delay.setSingleShot(True)
+        self.live_search_delay.setInterval(LIVE_SEARCH_DELAY_MS)
+        self.live_search_delay.timeout.connect(self.submit_live_search)
+        self.live_search_poll = QTimer(self)
+        self.live_search_poll.setInterval(LIVE_SEARCH_POLL_MS)
+        self.live_search_poll.timeout.connect(self.poll_live_search)
+        self.content_indexer: Optional[ContentIndexer] = None  # Indexation du contenu en arrière-plan
         self.init_ui()
         self.load_database()
         self.apply_theme()
@@ -1387,6 +2748,7 @@ class MainWindow(QMainWindow):
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("Rechercher par nom, tag (#tag), collection (@collection)...")
         self.search_input.returnPressed.connect(self.perform_search)
+        self.search_input.textChanged.connect(self.on_search_text_changed)
         search_bar_layout.addWidget(self.search_input)
         
         self.search_button = QPushButton("Rechercher")
@@ -1571,6 +2933,12 @@ class MainWindow(QMainWindow):
         collections_action.triggered.connect(self.manage_collections)
         data_menu.addAction(collections_action)
         
+        content_indexing_action = QAction("Indexer le contenu des documents", self)
+        content_indexing_action.setCheckable(True)
+        content_indexing_action.setChecked(self.config.get_content_indexing())
+        content_indexing_action.triggered.connect(self.toggle_content_indexing)
+        data_menu.addAction(content_indexing_action)
+        
         # Menu Affichage
         view_menu = menu_bar.addMenu("Affichage")
         
@@ -1580,6 +2948,12 @@ class MainWindow(QMainWindow):
         dark_mode_action.triggered.connect(self.toggle_dark_mode)
         view_menu.addAction(dark_mode_action)
         
+        live_search_action = QAction("Recherche instantanée", self)
+        live_search_action.setCheckable(True)
+        live_search_action.setChecked(self.config.get_live_search())
+        live_search_action.triggered.connect(self.toggle_live_search)
+        view_menu.addAction(live_search_action)
+        
         # Menu Aide
         help_menu = menu_bar.addMenu("Aide")
         
@@ -1612,38 +2986,65 @@ class MainWindow(QMainWindow):
         """Configure l'auto-complétion pour la recherche"""
         # Create a QStringListModel for the completer
         self.completion_model = QStringListModel()
+        self.completion_spans: Dict[str, Tuple[int, int]] = {}  # Suggestion -> Partie de la requête remplacée
         
+        # Le completer n'est pas attaché au champ : il complète le mot sous le curseur, pas toute la ligne
         self.completer = QCompleter()
         self.completer.setModel(self.completion_model)  # Set the model
         self.completer.setCaseSensitivity(Qt.CaseInsensitive)
         self.completer.setCompletionMode(QCompleter.PopupCompletion)
-        self.search_input.setCompleter(self.completer)
+        self.completer.setWidget(self.search_input)
+        self.completer.activated[str].connect(self.insert_completion)
         
-        # Mettre à jour les suggestions quand le texte change
-        self.search_input.textChanged.connect(self.update_completion)
+        # Mettre à jour les suggestions quand l'utilisateur tape
+        self.search_input.textEdited.connect(self.on_search_text_edited)
     
     def update_completion(self, text):
         """Met à jour les suggestions d'auto-complétion"""
         if not self.db:
             return
         
-        suggestions = []
-        
-        # Ajouter les tags
-        suggestions.extend([f"#{tag}" for tag in self.db.tags.keys()])
-        
-        # Ajouter les collections
-        suggestions.extend([f"@{collection.name}" for collection in self.db.collections.values()])
-        
-        # Ajouter les opérateurs booléens
-        suggestions.extend([" AND ", " OR ", " NOT "])
+        suggestions = self.db.complete(text, self.search_input.cursorPosition())
+        self.completion_spans = {}
+        for suggestion, start, end in suggestions:
+            self.completion_spans.setdefault(suggestion, (start, end))
         
-        # Filtrer les suggestions selon le texte actuel
-        current_text = text.lower()
-        filtered_suggestions = [s for s in suggestions if current_text in s.lower()]
-        
-        # Mettre à jour le completer
-        self.completer.model().setStringList(filtered_suggestions)
+        # Mettre à jour le modèle sur place : seules les lignes changées sont réécrites
+        rows = list(self.completion_spans)
+        model = self.completion_model
+        current = model.stringList()
+        if rows == current:
+            return
+        for row in range(min(len(rows), len(current))):
+            if rows[row] != current[row]:
+                model.setData(model.index(row), rows[row])
+        if len(rows) > len(current):
+            model.insertRows(len(current), len(rows) - len(current))
+            for row in range(len(current), len(rows)):
+                model.setData(model.index(row), rows[row])
+        elif len(rows) < len(current):
+            model.removeRows(len(rows), len(current) - len(rows))
+    
+    def on_search_text_edited(self, text: str):
+        """Propose les suggestions du mot en cours de frappe"""
+        self.update_completion(text)
+        if self.completion_spans:
+            self.completer.setCompletionPrefix("")  # Déjà filtrées par la base
+            self.completer.complete()
+        else:
+            self.completer.popup().hide()
+    
+    def insert_completion(self, text: str):
+        """Remplace le mot sous le curseur (ou la requête entière) par la suggestion choisie"""
+        span = self.completion_spans.get(text)
+        if span is None:
+            return
+        start, end = span
+        query = self.search_input.text()
+        if not text.endswith(":") and end == len(query):
+            text += " "  # Prêt pour le mot suivant ; pas après « champ: »
+        self.search_input.setText(query[:start] + text + query[end:])
+        self.search_input.setCursorPosition(start + len(text))
     
     def setup_context_menus(self):
         """Configure les menus contextuels"""
@@ -1759,17 +3160,57 @@ class MainWindow(QMainWindow):
     def load_database(self):
         """Charge la base de données"""
         try:
+            self.stop_content_indexing()
+            if self.db:
+                self.db.close()
             data_dir = self.config.get_data_dir()
-            self.db = TagDatabase(data_dir)
-            self.statusBar().showMessage(f"Base de données chargée: {len(self.db.objects)} objets, {len(self.db.tags)} tags, {len(self.db.collections)} collections")
+            storage = open_storage(data_dir, self.config.get_storage_backend())
+            
+            progress = QProgressDialog("Chargement de la base de données...", None, 0, 100, self)
+            progress.setWindowModality(Qt.WindowModal)
+            progress.setMinimumDuration(500)  # N'apparaît que si le chargement est long
+            phase_labels = {
+                "objects": "Chargement des objets...",
+                "tags": "Chargement des tags...",
+                "collections": "Chargement des collections..."
+            }
+            
+            def report(phase, done, total):
+                progress.setLabelText(f"{phase_labels.get(phase, phase)} ({done}/{total})")
+                progress.setValue(int(done * 100 / total) if total else 100)
+                QApplication.processEvents()
+            
+            try:
+                self.db = TagDatabase(data_dir, storage, report)
+            finally:
+                progress.setValue(100)
+            
+            self.db.warm_indexes()
+            
+            timings = ", ".join(f"{phase} {duration:.2f}s" for phase, duration in self.db.load_timings.items())
+            self.statusBar().showMessage(f"Base de données chargée: {len(self.db.objects)} objets, {len(self.db.tags)} tags, {len(self.db.collections)} collections ({timings})")
             
             # Charger l'historique des recherches
             history_file = self.config.get_history_file()
             self.search_history.load_from_file(history_file)
+            for _, query in self.search_history.history:
+                self.db.record_search(query)
+            
+            if self.config.get_content_indexing():
+                self.start_content_indexing()
             
         except Exception as e:
             QMessageBox.critical(self, "Erreur", f"Erreur lors du chargement de la base de données: {e}")
     
+    def closeEvent(self, event):
+        """Ferme proprement la base de données à la fermeture de la fenêtre"""
+        self.cancel_live_search()
+        self.live_search_executor.shutdown(wait=True)
+        self.stop_content_indexing()
+        if self.db:
+            self.db.close()
+        super().closeEvent(event)
+    
     def apply_theme(self):
         """Applique le thème sombre ou clair"""
         if self.config.get_dark_mode():
@@ -2098,8 +3539,52 @@ QScrollBar::handle:vertical:hover {
         self.config.set_dark_mode(not current)
         self.apply_theme()
     
+    def toggle_content_indexing(self, enabled: bool):
+        """Active ou désactive l'indexation du contenu des documents"""
+        self.config.set_content_indexing(enabled)
+        if enabled:
+            self.start_content_indexing()
+        else:
+            self.stop_content_indexing()
+    
+    def start_content_indexing(self):
+        """Ouvre l'index du contenu et lance l'indexation des documents de la base"""
+        if self.db is None or self.content_indexer is not None:
+            return
+        try:
+            index = ContentIndex(self.config.get_data_dir())
+        except Exception as e:
+            print(f"Erreur lors de l'ouverture de l'index du contenu: {e}")
+            return
+        self.db.attach_content_index(index)
+        self.content_indexer = ContentIndexer(index, self.db.content_changed)
+        self.content_indexer.submit(self.db.content_locations(), prune=True)
+    
+    def stop_content_indexing(self):
+        """Arrête l'indexation du contenu et ferme son index"""
+        if self.content_indexer is None:
+            return
+        # Détacher d'abord le prédicat content: : une recherche en cours n'interroge plus l'index fermé
+        if self.db is not None:
+            self.db.attach_content_index(None)
+        self.content_indexer.stop()
+        self.content_indexer.index.close()
+        self.content_indexer = None
+    
+    def index_contents(self):
+        """Indexe les documents ajoutés ou modifiés (les fichiers inchangés sont ignorés)"""
+        if self.content_indexer is not None:
+            self.content_indexer.submit(self.db.content_locations())
+    
+    def toggle_live_search(self, enabled: bool):
+        """Active ou désactive la recherche pendant la frappe"""
+        self.config.set_live_search(enabled)
+        if not enabled:
+            self.cancel_live_search()
+    
     def perform_search(self):
         """Effectue une recherche"""
+        self.cancel_live_search()
         query = self.search_input.text().strip()
         if not query:
             self.clear_search()
@@ -2107,39 +3592,142 @@ QScrollBar::handle:vertical:hover {
         
         # Ajouter à l'historique
         self.search_history.add_search(query)
+        self.db.record_search(query)
         
         # Sauvegarder l'historique
         history_file = self.config.get_history_file()
         self.search_history.save_to_file(history_file)
         
-        # Effectuer la recherche
-        results = self.db.advanced_search(query)
-        self.current_search_results = results
+        # Effectuer la recherche dans le thread de recherche : les résultats s'affichent par lots
+        self.submit_live_search(query)
         
-        # Afficher les résultats
+        # Effacer les détails
+        self.clear_object_details()
+    
+    def start_search_stream(self, query: str, stream: Optional[Iterator[List[FileObject]]] = None):
+        """Affiche progressivement les résultats de query (ou les lots de stream déjà calculés),
+        en annulant l'affichage en cours"""
+        self.cancel_search_stream()
+        self.search_query = query
+        self.current_search_results = []
         self.results_list.clear()
-        for obj in results:
-            item = QListWidgetItem(f"{obj.name} ({obj.file_type})")
-            item.setData(Qt.UserRole, obj.id)
-            self.results_list.addItem(item)
+        self.search_stream = stream if stream is not None else self.db.iter_search(query)
+        self.consume_search_stream()  # Premier écran tout de suite
+        if self.search_stream is not None:
+            self.search_timer.start()
+    
+    def consume_search_stream(self):
+        """Ajoute les lots de résultats disponibles pendant au plus SEARCH_FRAME_SECONDS"""
+        deadline = time.perf_counter() + SEARCH_FRAME_SECONDS
+        while self.search_stream is not None and time.perf_counter() < deadline:
+            try:
+                batch = next(self.search_stream)
+            except StopIteration:
+                self.search_stream = None
+                self.search_timer.stop()
+                break
+            if batch is None:
+                # Lot suivant pas encore prêt dans le thread de recherche : revenir plus tard
+                self.search_timer.setInterval(LIVE_SEARCH_POLL_MS)
+                break
+            self.search_timer.setInterval(0)
+            self.current_search_results.extend(batch)
+            for obj in batch:
+                item = QListWidgetItem(f"{obj.name} ({obj.file_type})")
+                item.setData(Qt.UserRole, obj.id)
+                self.results_list.addItem(item)
         
         # Mettre à jour la barre d'état
-        self.statusBar().showMessage(f"{len(results)} résultat(s) trouvé(s) pour: {query}")
-        
-        # Effacer les détails
+        count = len(self.current_search_results)
+        pending = " (recherche en cours...)" if self.search_stream is not None else ""
+        if self.search_query:
+            self.statusBar().showMessage(f"{count} résultat(s) trouvé(s) pour: {self.search_query}{pending}")
+        else:
+            self.statusBar().showMessage(f"Affichage de tous les objets: {count}{pending}")
+    
+    def cancel_search_stream(self):
+        """Abandonne l'affichage des résultats restants"""
+        self.search_timer.stop()
+        if self.search_stream is not None:
+            self.search_stream.close()
+            self.search_stream = None
+    
+    def on_search_text_changed(self, text: str):
+        """La requête a changé : les résultats de l'ancienne ne sont plus à compléter"""
+        if self.search_stream is not None and text.strip() != self.search_query:
+            self.cancel_search_stream()
+        if self.config.get_live_search():
+            self.live_search_serial += 1  # La recherche en cours est périmée
+            self.live_search_delay.start()  # Relancé à chaque frappe
+    
+    def submit_live_search(self, query: Optional[str] = None):
+        """Lance la recherche de query (par défaut la requête saisie) dans le thread de recherche"""
+        if self.db is None:
+            return
+        if query is None:
+            query = self.search_input.text().strip()
+        self.live_search_serial += 1
+        serial = self.live_search_serial
+        
+        def cancelled() -> bool:
+            return serial != self.live_search_serial
+        
+        results = queue.Queue()
+        self.live_search_query = query
+        self.live_search_results = results
+        self.live_search_executor.submit(self.db.stream_search, query, results, cancelled)
+        self.live_search_poll.start()
+    
+    def poll_live_search(self):
+        """Affiche la recherche en arrière-plan dès son premier lot (les suivants arrivent par le flux)"""
+        results = self.live_search_results
+        if results is None:
+            self.live_search_poll.stop()
+            return
+        try:
+            first = results.get_nowait()
+        except queue.Empty:
+            return
+        self.live_search_results = None
+        self.live_search_poll.stop()
+        if isinstance(first, Exception):
+            self.report_search_error(first)
+            return
+        self.start_search_stream(self.live_search_query, self.queued_batches(results, first))
         self.clear_object_details()
     
+    def queued_batches(self, results: "queue.Queue", first) -> Iterator[Optional[List[FileObject]]]:
+        """Lots reçus du thread de recherche, à partir de first ; None tant que le suivant n'est pas prêt"""
+        item = first
+        while item is not None:
+            if isinstance(item, Exception):
+                self.report_search_error(item)
+                return
+            yield item
+            while True:
+                try:
+                    item = results.get_nowait()
+                    break
+                except queue.Empty:
+                    yield None
+    
+    def report_search_error(self, error: Exception):
+        """Signale une recherche en arrière-plan échouée, en gardant les résultats affichés"""
+        print(f"Erreur lors de la recherche en arrière-plan: {error}")
+        self.statusBar().showMessage(f"Erreur lors de la recherche: {error}")
+    
+    def cancel_live_search(self):
+        """Abandonne la recherche en arrière-plan et la frappe en attente"""
+        self.live_search_delay.stop()
+        self.live_search_poll.stop()
+        self.live_search_serial += 1
+        self.live_search_results = None
+    
     def clear_search(self):
         """Efface la recherche et affiche tous les objets"""
         self.search_input.clear()
-        self.current_search_results = list(self.db.objects.values())
-        self.results_list.clear()
-        for obj in self.current_search_results:
-            item = QListWidgetItem(f"{obj.name} ({obj.file_type})")
-            item.setData(Qt.UserRole, obj.id)
-            self.results_list.addItem(item)
-        
-        self.statusBar().showMessage(f"Affichage de tous les objets: {len(self.current_search_results)}")
+        self.cancel_live_search()
+        self.submit_live_search("")
         self.clear_object_details()
     
     def show_object_details(self):
@@ -2267,15 +3855,14 @@ QScrollBar::handle:vertical:hover {
         
         if ok and collection_name:
             # Trouver la collection correspondante
-            for collection in collections:
-                if collection.name == collection_name:
-                    success = self.db.add_object_to_collection(obj_id, collection.id)
-                    if success:
-                        QMessageBox.information(self, "Succès", f"Objet ajouté à la collection '{collection_name}'.")
-                        self.show_object_details()  # Rafraîchir l'affichage
-                    else:
-                        QMessageBox.warning(self, "Erreur", "Impossible d'ajouter l'objet à la collection.")
-                    break
+            collection = self.db.get_collection_by_name(collection_name)
+            if collection:
+                success = self.db.add_object_to_collection(obj_id, collection.id)
+                if success:
+                    QMessageBox.information(self, "Succès", f"Objet ajouté à la collection '{collection_name}'.")
+                    self.show_object_details()  # Rafraîchir l'affichage
+                else:
+                    QMessageBox.warning(self, "Erreur", "Impossible d'ajouter l'objet à la collection.")
     
     def remove_from_collection(self):
         """Retire l'objet sélectionné d'une collection"""
@@ -2292,12 +3879,7 @@ QScrollBar::handle:vertical:hover {
         obj_id = current_obj_item.data(Qt.UserRole)
         
         # Trouver la collection correspondante
-        collection = None
-        for col in self.db.collections.values():
-            if col.name == collection_name:
-                collection = col
-                break
-        
+        collection = self.db.get_collection_by_name(collection_name)
         if not collection:
             return
         
@@ -2358,6 +3940,7 @@ QScrollBar::handle:vertical:hover {
         # Ouvrir la boîte de dialogue d'édition
         dialog = AddFileDialog(self, self.db, obj)
         if dialog.exec() == QDialog.Accepted:
+            self.index_contents()
             # L'objet a été modifié, rafraîchir l'affichage
             self.perform_search()  # Rafraîchir la recherche pour voir les modifications
             self.show_object_details()
@@ -2396,6 +3979,7 @@ QScrollBar::handle:vertical:hover {
         """Ouvre la boîte de dialogue pour ajouter un fichier"""
         dialog = AddFileDialog(self, self.db)
         if dialog.exec() == QDialog.Accepted:
+            self.index_contents()
             # Rafraîchir l'affichage
             self.clear_search()
     
@@ -2502,46 +4086,49 @@ QScrollBar::handle:vertical:hover {
             # Garder seulement le premier fichier de chaque groupe de doublons
             files_to_skip.update(duplicate_group[1:])
         
-        for i, file_path in enumerate(files):
-            progress.setValue(i)
-            if progress.wasCanceled():
-                break
-            
-            # Ignorer les fichiers marqués comme doublons
-            if file_path in files_to_skip:
-                duplicate_count += 1
-                continue
-            
-            try:
-                file_name = os.path.basename(file_path)
-                file_type = self.detect_file_type(file_path)
+        # Toutes les écritures sont regroupées et faites une seule fois à la fin
+        with self.db.batch():
+            for i, file_path in enumerate(files):
+                progress.setValue(i)
+                if progress.wasCanceled():
+                    break
                 
-                # Vérifier si le fichier existe déjà dans la base de données
-                if self.db.location_exists(file_path):
+                # Ignorer les fichiers marqués comme doublons
+                if file_path in files_to_skip:
                     duplicate_count += 1
                     continue
                 
-                obj = FileObject(file_name, "", file_type, file_path)
-                obj_id = self.db.add_object(obj)
-                
-                if obj_id:
-                    # Ajouter le tag si spécifié
-                    if selected_tag:
-                        self.db.add_tag(obj_id, selected_tag)
+                try:
+                    file_name = os.path.basename(file_path)
+                    file_type = self.detect_file_type(file_path)
                     
-                    # Ajouter à la collection si spécifiée
-                    if selected_collection_id:
-                        self.db.add_object_to_collection(obj_id, selected_collection_id)
+                    # Vérifier si le fichier existe déjà dans la base de données
+                    if self.db.location_exists(file_path):
+                        duplicate_count += 1
+                        continue
                     
-                    success_count += 1
-                else:
-                    error_count += 1
+                    obj = FileObject(file_name, "", file_type, file_path)
+                    obj_id = self.db.add_object(obj)
                     
-            except Exception as e:
-                error_count += 1
-                print(f"Erreur lors de l'import de {file_path}: {e}")
+                    if obj_id:
+                        # Ajouter le tag si spécifié
+                        if selected_tag:
+                            self.db.add_tag(obj_id, selected_tag)
+                        
+                        # Ajouter à la collection si spécifiée
+                        if selected_collection_id:
+                            self.db.add_object_to_collection(obj_id, selected_collection_id)
+                        
+                        success_count += 1
+                    else:
+                        error_count += 1
+                        
+                except Exception as e:
+                    error_count += 1
+                    print(f"Erreur lors de l'import de {file_path}: {e}")
         
         progress.setValue(len(files))
+        self.index_contents()
         
         # Afficher le rapport détaillé
         report_message = (
@@ -2618,6 +4205,16 @@ QScrollBar::handle:vertical:hover {
         
         layout.addLayout(data_layout)
         
+        # Moteur de stockage
+        storage_layout = QHBoxLayout()
+        storage_layout.addWidget(QLabel("Stockage:"))
+        self.storage_combo = QComboBox()
+        self.storage_combo.addItem("Dossiers JSON", "json")
+        self.storage_combo.addItem("Fichier SQLite unique", "sqlite")
+        self.storage_combo.setCurrentIndex(max(0, self.storage_combo.findData(self.config.get_storage_backend())))
+        storage_layout.addWidget(self.storage_combo)
+        layout.addLayout(storage_layout)
+        
         # Mode sombre
         dark_mode_checkbox = QCheckBox("Mode sombre")
         dark_mode_checkbox.setChecked(self.config.get_dark_mode())
@@ -2652,6 +4249,20 @@ QScrollBar::handle:vertical:hover {
         """Sauvegarde les paramètres"""
         data_dir = self.data_dir_input.text().strip()
         if data_dir:
+            old_backend = self.config.get_storage_backend()
+            new_backend = self.storage_combo.currentData()
+            if new_backend != old_backend and new_backend in BACKENDS:
+                reply = QMessageBox.question(
+                    self,
+                    "Changement de stockage",
+                    "Voulez-vous convertir les données existantes vers le nouveau format de stockage ?",
+                    QMessageBox.Yes | QMessageBox.No,
+                    QMessageBox.Yes
+                )
+                # Une conversion échouée ou partielle garde l'ancien moteur
+                if reply != QMessageBox.Yes or self.convert_storage(data_dir, old_backend, new_backend):
+                    self.config.set_storage_backend(new_backend)
+            
             self.config.set_data_dir(data_dir)
             dialog.accept()
             
@@ -2659,6 +4270,45 @@ QScrollBar::handle:vertical:hover {
             self.load_database()
             self.clear_search()
     
+    def convert_storage(self, data_dir, source_backend, target_backend) -> bool:
+        """Convertit les données d'un moteur de stockage vers un autre (True si la conversion a réussi)"""
+        if self.db:
+            self.db.close()
+            self.db = None
+        
+        source = target = None
+        try:
+            source = open_storage(data_dir, source_backend)
+            target = open_storage(data_dir, target_backend)
+        except Exception as e:
+            if source is not None:
+                source.close()
+            QMessageBox.critical(self, "Erreur", f"Erreur lors de la conversion: {e}")
+            return False
+        progress = QProgressDialog("Conversion des données...", None, 0, 100, self)
+        progress.setWindowModality(Qt.WindowModal)
+        
+        def report(done, total):
+            progress.setValue(int(done * 100 / total) if total else 100)
+            QApplication.processEvents()
+        
+        try:
+            counts = convert_storage(source, target, report)
+            QMessageBox.information(
+                self,
+                "Conversion terminée",
+                f"{counts['objects']} objets, {counts['tags']} tags et "
+                f"{counts['collections']} collections convertis."
+            )
+            return True
+        except Exception as e:
+            QMessageBox.critical(self, "Erreur", f"Erreur lors de la conversion: {e}")
+            return False
+        finally:
+            progress.setValue(100)
+            source.close()
+            target.close()
+    
     def show_about(self):
         """Affiche la boîte de dialogue À propos"""
         QMessageBox.about(
@@ -2800,23 +4450,8 @@ class TagsDialog(QDialog):
         )
         
         if reply == QMessageBox.Yes:
-            # Retirer le tag de tous les objets
-            for obj_id in list(self.db.tags.get(tag, [])):
-                self.db.remove_tag(obj_id, tag)
-            
-            # Supprimer le fichier de tag
-            tag_file = self.db.tag_files.get(tag)
-            if tag_file and os.path.exists(tag_file):
-                try:
-                    os.remove(tag_file)
-                except Exception as e:
-                    print(f"Erreur lors de la suppression du fichier {tag_file}: {e}")
-            
-            # Mettre à jour les structures de données
-            if tag in self.db.tags:
-                del self.db.tags[tag]
-            if tag in self.db.tag_files:
-                del self.db.tag_files[tag]
+            # Retirer le tag de tous les objets et supprimer son fichier
+            self.db.delete_tag(tag)
             
             QMessageBox.information(self, "Succès", f"Tag '{tag}' supprimé avec succès.")
             self.load_tags()
@@ -2964,23 +4599,8 @@ class ClassesDialog(QDialog):
         )
         
         if reply == QMessageBox.Yes:
-            # Retirer la classe de tous les objets
-            for obj_id in list(self.db.tags.get(tag_name, [])):
-                self.db.remove_tag(obj_id, tag_name)
-            
-            # Supprimer le fichier de tag
-            tag_file = self.db.tag_files.get(tag_name)
-            if tag_file and os.path.exists(tag_file):
-                try:
-                    os.remove(tag_file)
-                except Exception as e:
-                    print(f"Erreur lors de la suppression du fichier {tag_file}: {e}")
-            
-            # Mettre à jour les structures de données
-            if tag_name in self.db.tags:
-                del self.db.tags[tag_name]
-            if tag_name in self.db.tag_files:
-                del self.db.tag_files[tag_name]
+            # Retirer la classe de tous les objets et supprimer son fichier
+            self.db.delete_tag(tag_name)
             
             QMessageBox.information(self, "Succès", f"Classe '{class_name}' supprimée avec succès.")
             self.load_classes()
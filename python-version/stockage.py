@@ -0,0 +1,1169 @@
+import os
+import sys
+import json
+import time
+import marshal
+import shutil
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+SQLITE_FILENAME = "whales-data.db"
+SNAPSHOT_FILENAME = "snapshot.bin"
+SNAPSHOT_STATE_FILENAME = "snapshot.json"  # Compteur de changements et fermeture propre
+SNAPSHOT_VERSION = 1
+JOURNAL_FILENAME = "journal.log"
+JOURNAL_COMPACT_BYTES = 4 * 1024 * 1024  # Taille du journal déclenchant une compaction
+BACKENDS = ("json", "sqlite")
+
+# progress(phase, done, total) avec phase dans "objects", "tags", "collections"
+ProgressCallback = Optional[Callable[[str, int, int], None]]
+
+LOAD_CHUNK_SIZE = 256  # Nombre de fichiers lus par tâche du pool
+
+
+def scan_json_files(directory: str, with_stat: bool = False, recursive: bool = False,
+                    _prefix: str = "", leftovers: Optional[List[str]] = None) -> List[tuple]:
+    """Liste les fichiers .json d'un dossier avec os.scandir : [(nom, chemin)]
+
+    Avec with_stat, chaque entrée porte aussi sa signature (mtime_ns, taille).
+    Avec recursive, les sous-dossiers sont parcourus et le nom est relatif
+    (« ville/paris.json »). Les fichiers .tmp rencontrés sont ajoutés à leftovers.
+    """
+    files = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json") and entry.is_file():
+                    if with_stat:
+                        stat = entry.stat()
+                        files.append((_prefix + entry.name, entry.path, (stat.st_mtime_ns, stat.st_size)))
+                    else:
+                        files.append((_prefix + entry.name, entry.path))
+                elif leftovers is not None and entry.name.endswith(".tmp"):
+                    leftovers.append(entry.path)
+                elif recursive and entry.is_dir():
+                    files.extend(scan_json_files(entry.path, with_stat, True, f"{_prefix}{entry.name}/", leftovers))
+    except FileNotFoundError:
+        pass
+    return files
+
+
+def _read_json_chunk(files: List[Tuple[str, str]]) -> List[tuple]:
+    """Lit et parse un lot de fichiers JSON : [(nom, chemin, données, erreur)]"""
+    results = []
+    for filename, path in files:
+        try:
+            with open(path, 'rb') as f:
+                results.append((filename, path, json.loads(f.read()), None))
+        except Exception as e:
+            results.append((filename, path, None, e))
+    return results
+
+
+def read_json_files(files: List[Tuple[str, str]], executor: ThreadPoolExecutor,
+                    phase: str = "", progress: ProgressCallback = None):
+    """Lit des fichiers JSON en parallèle et les renvoie au fil de l'eau"""
+    total = len(files)
+    if progress:
+        progress(phase, 0, total)
+    chunks = [files[i:i + LOAD_CHUNK_SIZE] for i in range(0, total, LOAD_CHUNK_SIZE)]
+    futures = [executor.submit(_read_json_chunk, chunk) for chunk in chunks]
+    done = 0
+    for future in as_completed(futures):
+        results = future.result()
+        done += len(results)
+        if progress:
+            progress(phase, done, total)
+        yield from results
+
+
+class StorageBackend(ABC):
+    """Interface commune des moteurs de stockage de TagDatabase
+
+    Un moteur incomplet ne peut pas être instancié (méthodes abstraites).
+    """
+
+    name = ""
+
+    def __init__(self):
+        self.load_timings: Dict[str, float] = {}  # Durée de chaque phase du dernier chargement
+
+    @abstractmethod
+    def load(self, progress: ProgressCallback = None) -> dict:
+        """Retourne {"objects": [dict], "tags": {tag: [ids]}, "collections": [dict]}"""
+
+    @abstractmethod
+    def save_object(self, data: dict) -> None:
+        pass
+
+    @abstractmethod
+    def delete_object(self, obj_id: str) -> None:
+        pass
+
+    @abstractmethod
+    def save_tag(self, tag: str, obj_ids: Iterable[str]) -> None:
+        pass
+
+    @abstractmethod
+    def delete_tag(self, tag: str) -> None:
+        pass
+
+    @abstractmethod
+    def save_collection(self, data: dict) -> None:
+        pass
+
+    @abstractmethod
+    def delete_collection(self, collection_id: str) -> None:
+        pass
+
+    def tag_members_changed(self, tag: str, obj_ids: Iterable[str],
+                            added: Iterable[str] = (), removed: Iterable[str] = ()) -> None:
+        """Enregistre une modification des membres d'un tag (réécriture complète par défaut)"""
+        self.save_tag(tag, obj_ids)
+
+    def collection_members_changed(self, meta: dict, obj_ids: Iterable[str],
+                                   added: Iterable[str] = (), removed: Iterable[str] = ()) -> None:
+        """Enregistre une modification des membres d'une collection (réécriture complète par défaut)"""
+        data = dict(meta)
+        data["object_ids"] = list(obj_ids)
+        self.save_collection(data)
+
+    @contextmanager
+    def transaction(self):
+        """Regroupe plusieurs écritures (sans effet pour les moteurs non transactionnels)"""
+        yield
+
+    def compact(self, data: dict) -> None:
+        """Intègre les écritures en attente dans les fichiers de base (même format que load())"""
+        pass
+
+    def write_snapshot(self, data: dict) -> None:
+        """Enregistre un instantané de l'état en mémoire (même format que load())"""
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def write_json_atomic(path: str, data, indent: Optional[int] = 4) -> None:
+    """Écrit un fichier JSON via un fichier temporaire pour ne jamais laisser de fichier tronqué"""
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class JsonStorage(StorageBackend):
+    """Stockage historique : un fichier JSON par objet, par tag et par collection
+
+    Les changements d'appartenance aux tags et aux collections ne réécrivent
+    pas le fichier concerné : ils sont ajoutés au journal (journal.log), rejoué
+    au chargement. Quand le journal dépasse compact_threshold octets, il est
+    renommé en journal.log.1 et un thread réécrit les fichiers concernés avant
+    de le supprimer.
+
+    Enregistrements du journal (une ligne JSON chacun) :
+      {"op": "tag", "name", "add", "del"}          changement de membres d'un tag
+      {"op": "tag_reset", "name"}                   le fichier du tag fait foi
+      {"op": "tag_drop", "name"}                    tag supprimé
+      {"op": "collection", "meta", "add", "del"}    idem pour une collection
+      {"op": "collection_reset", "id"} / {"op": "collection_drop", "id"}
+    """
+
+    name = "json"
+
+    def __init__(self, data_dir: str, max_workers: Optional[int] = None, use_snapshot: bool = True,
+                 use_journal: bool = True, compact_threshold: int = JOURNAL_COMPACT_BYTES,
+                 sync: bool = True):
+        super().__init__()
+        self.data_dir = data_dir
+        self.objects_dir = os.path.join(data_dir, "Objects")
+        self.tags_dir = os.path.join(data_dir, "Tags")
+        self.collections_dir = os.path.join(data_dir, "Collections")
+        self.snapshot_path = os.path.join(data_dir, SNAPSHOT_FILENAME)
+        self.snapshot_state_path = os.path.join(data_dir, SNAPSHOT_STATE_FILENAME)
+        self.change_counter = 0  # Incrémenté à chaque instantané, comparé au chargement
+        self.tag_files: Dict[str, str] = {}  # Tag -> Chemin du fichier
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.use_snapshot = use_snapshot
+        self.reread_count = 0  # Fichiers relus lors du dernier chargement
+
+        # Journal des changements d'appartenance
+        self.use_journal = use_journal
+        self.compact_threshold = compact_threshold
+        self.sync = sync  # fsync après chaque écriture dans le journal
+        self.journal_path = os.path.join(data_dir, JOURNAL_FILENAME)
+        self.rotated_journal_path = self.journal_path + ".1"
+        self._journal_file = None
+        self._journal_size = 0
+        self._journal_buffer: Optional[List[str]] = None  # Lignes en attente pendant transaction()
+        self._staged_files: Optional[Dict[str, Optional[str]]] = None  # Chemin -> fichier temporaire (None : suppression)
+        self._transaction_depth = 0
+        self._lock = threading.Lock()  # Protège les fichiers de base pendant la compaction
+        self._compaction_thread: Optional[threading.Thread] = None
+        self._journaled_tags: Set[str] = set()  # Tags modifiés dans journal.log
+        self._journaled_collections: Set[str] = set()
+        self._rotated_tags: Set[str] = set()  # Tags modifiés dans journal.log.1, pas encore compactés
+        self._rotated_collections: Set[str] = set()
+        self._rewritten: Set[Tuple[str, str]] = set()  # Fichiers réécrits depuis la rotation
+        self._live_tags: Dict[str, Iterable[str]] = {}  # Tag -> ensemble d'IDs en mémoire
+        self._live_collections: Dict[str, tuple] = {}  # ID -> (meta, ensemble d'IDs en mémoire)
+
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tags_dir, exist_ok=True)
+        os.makedirs(self.collections_dir, exist_ok=True)
+
+    def load(self, progress: ProgressCallback = None) -> dict:
+        """Charge les trois dossiers avec os.scandir et un pool de threads (lecture + parsing)
+
+        Seuls les fichiers dont la signature (mtime, taille) a changé depuis
+        l'écriture de l'instantané sont relus. Si l'instantané est à jour
+        (fermeture propre, même compteur de changements et mêmes mtimes des
+        dossiers), les dossiers ne sont pas parcourus : seules les signatures
+        des fichiers qu'il contient sont vérifiées.
+        """
+        timings = {}
+
+        start = time.perf_counter()
+        snapshot = self._read_snapshot() if self.use_snapshot else None
+        current = snapshot is not None and self._snapshot_is_current(snapshot)
+        if snapshot is not None:
+            timings["snapshot"] = time.perf_counter() - start
+        sections = snapshot["sections"] if snapshot else {}
+
+        start = time.perf_counter()
+        if current:
+            object_files = self._snapshot_files(sections["objects"], self.objects_dir)
+            tag_files = self._snapshot_files(sections["tags"], self.tags_dir)
+            collection_files = self._snapshot_files(sections["collections"], self.collections_dir)
+        else:
+            with_stat = snapshot is not None
+            leftovers = []  # Fichiers temporaires d'une écriture interrompue
+            object_files = scan_json_files(self.objects_dir, with_stat, leftovers=leftovers)
+            tag_files = scan_json_files(self.tags_dir, with_stat, recursive=True,  # Dossiers de tags
+                                        leftovers=leftovers)
+            collection_files = scan_json_files(self.collections_dir, with_stat, leftovers=leftovers)
+            for path in leftovers:
+                self._remove_file(path)
+            timings["scan"] = time.perf_counter() - start
+
+        self.reread_count = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # Charger les objets
+            start = time.perf_counter()
+            objects = []
+            for filename, path, data in self._load_section(object_files, sections.get("objects"),
+                                                           executor, "objects", progress):
+                objects.append(data)
+            timings["objects"] = time.perf_counter() - start
+
+            # Charger les tags
+            start = time.perf_counter()
+            tags = {}
+            for filename, path, data in self._load_section(tag_files, sections.get("tags"),
+                                                           executor, "tags", progress):
+                tag_name = filename[:-5]  # Enlever ".json" (« dossier/tag » dans un sous-dossier)
+                tags[tag_name] = data
+                self.tag_files[tag_name] = path
+            timings["tags"] = time.perf_counter() - start
+
+            # Charger les collections
+            start = time.perf_counter()
+            collections = []
+            for filename, path, data in self._load_section(collection_files, sections.get("collections"),
+                                                           executor, "collections", progress):
+                collections.append(data)
+            timings["collections"] = time.perf_counter() - start
+
+        # Rejouer le journal laissé par une session interrompue
+        start = time.perf_counter()
+        if self._replay_journal(tags, collections):
+            timings["journal"] = time.perf_counter() - start
+
+        if self.use_snapshot:
+            # Jusqu'au prochain instantané, les fichiers peuvent changer : l'instantané n'est plus à jour
+            self._write_snapshot_state(clean=False)
+
+        self.load_timings = timings
+        return {"objects": objects, "tags": tags, "collections": collections}
+
+    def _load_section(self, files: List[tuple], cached: Optional[dict], executor: ThreadPoolExecutor,
+                      phase: str, progress: ProgressCallback):
+        """Renvoie (nom, chemin, données) pour un dossier, en réutilisant l'instantané si possible"""
+        to_read = []
+        for entry in files:
+            filename, path = entry[0], entry[1]
+            if cached is not None:
+                hit = cached.get(filename)
+                if hit is not None and hit[0] == entry[2]:
+                    yield filename, path, hit[1]
+                    continue
+            to_read.append((filename, path))
+
+        self.reread_count += len(to_read)
+        for filename, path, data, error in read_json_files(to_read, executor, phase, progress):
+            if error is None:
+                yield filename, path, data
+            else:
+                print(f"Erreur lors du chargement de {path}: {error}")
+
+    def _read_snapshot(self) -> Optional[dict]:
+        """Lit l'instantané en une seule lecture (None s'il est absent ou invalide)
+
+        marshal ne construit que des données (dictionnaires, listes, textes,
+        nombres) : un fichier déposé dans le dossier ne peut pas exécuter de code.
+        """
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                snapshot = marshal.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Instantané ignoré ({self.snapshot_path}): {e}")
+            return None
+        if (not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION
+                or not isinstance(snapshot.get("sections"), dict)
+                or not all(isinstance(snapshot["sections"].get(section), dict)
+                           for section in ("objects", "tags", "collections"))):
+            return None
+        return snapshot
+
+    def _snapshot_is_current(self, snapshot: dict) -> bool:
+        """Vrai si rien n'a changé depuis l'instantané : quelques lectures, sans parcourir les dossiers"""
+        try:
+            with open(self.snapshot_state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"État de l'instantané ignoré ({self.snapshot_state_path}): {e}")
+            return False
+        if not isinstance(state, dict) or not isinstance(state.get("counter"), int):
+            return False
+        self.change_counter = max(self.change_counter, state["counter"])
+        return (state.get("clean") is True and state["counter"] == snapshot.get("counter")
+                and snapshot.get("directories") == self._directory_mtimes())
+
+    def _write_snapshot_state(self, clean: bool) -> None:
+        try:
+            write_json_atomic(self.snapshot_state_path, {"counter": self.change_counter, "clean": clean},
+                              indent=None)
+        except Exception as e:
+            print(f"Erreur lors de l'écriture de l'état de l'instantané: {e}")
+
+    def _directory_mtimes(self) -> Dict[str, int]:
+        """mtimes des dossiers, sous-dossiers de tags compris : un fichier ajouté, remplacé ou supprimé les change"""
+        mtimes = {}
+        pending = [self.objects_dir, self.tags_dir, self.collections_dir]
+        while pending:
+            directory = pending.pop()
+            mtimes[os.path.relpath(directory, self.data_dir)] = os.stat(directory).st_mtime_ns
+            if directory.startswith(self.tags_dir):
+                with os.scandir(directory) as entries:
+                    pending.extend(entry.path for entry in entries if entry.is_dir())
+        return mtimes
+
+    @staticmethod
+    def _snapshot_files(entries: dict, directory: str) -> List[tuple]:
+        """Fichiers d'une section d'un instantané à jour : (nom, chemin, signature), comme scan_json_files
+
+        Le dossier n'est pas parcouru, mais la signature de chaque fichier est
+        relue : une modification sur place ne change pas le mtime du dossier.
+        """
+        files = []
+        for filename in entries:
+            path = os.path.join(directory, *filename.split("/"))
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((filename, path, (stat.st_mtime_ns, stat.st_size)))
+        return files
+
+    def write_snapshot(self, data: dict) -> None:
+        """Écrit l'instantané : pour chaque fichier, sa signature actuelle et son contenu
+
+        Le compteur de changements est incrémenté et enregistré, avec la
+        fermeture propre, dans snapshot.json après l'instantané.
+        """
+        sections = {}
+        objects = {f"{obj['id']}.json": obj for obj in data["objects"]}
+        tags = {}
+        for tag, obj_ids in data["tags"].items():
+            tags[f"{tag}.json"] = list(obj_ids)
+        collections = {f"{collection['id']}.json": collection for collection in data["collections"]}
+
+        # Seuls les fichiers présents sur le disque sont retenus, avec leur signature actuelle
+        for section, directory, content in (("objects", self.objects_dir, objects),
+                                            ("tags", self.tags_dir, tags),
+                                            ("collections", self.collections_dir, collections)):
+            entries = {}
+            for filename, path, signature in scan_json_files(directory, with_stat=True,
+                                                             recursive=section == "tags"):
+                if filename in content:
+                    entries[filename] = (signature, _intern_keys(content[filename]))
+            sections[section] = entries
+
+        self.change_counter += 1
+        snapshot = {"version": SNAPSHOT_VERSION, "counter": self.change_counter,
+                    "directories": self._directory_mtimes(), "sections": sections}
+        tmp_path = self.snapshot_path + ".tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(marshal.dumps(snapshot))
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception as e:
+            print(f"Erreur lors de l'écriture de l'instantané: {e}")
+            return
+        self._write_snapshot_state(clean=True)
+
+    def save_object(self, data: dict) -> None:
+        obj_path = os.path.join(self.objects_dir, f"{data['id']}.json")
+        self._write_file(obj_path, data)
+
+    def delete_object(self, obj_id: str) -> None:
+        self._delete_file(os.path.join(self.objects_dir, f"{obj_id}.json"))
+
+    def _tag_path(self, tag: str) -> str:
+        tag_file_path = self.tag_files.get(tag)
+        if tag_file_path is None:
+            tag_file_path = os.path.join(self.tags_dir, f"{tag}.json")
+            if "/" in tag:
+                os.makedirs(os.path.dirname(tag_file_path), exist_ok=True)  # Tag rangé dans un dossier
+            self.tag_files[tag] = tag_file_path
+        return tag_file_path
+
+    def _collection_path(self, collection_id: str) -> str:
+        return os.path.join(self.collections_dir, f"{collection_id}.json")
+
+    def save_tag(self, tag: str, obj_ids: Iterable[str]) -> None:
+        with self._lock:
+            self._write_file(self._tag_path(tag), list(obj_ids))
+            self._rewritten.add(("tag", tag))
+        if self.use_journal:
+            self._live_tags[tag] = obj_ids
+            self._append_journal({"op": "tag_reset", "name": tag})
+
+    def tag_members_changed(self, tag: str, obj_ids: Iterable[str],
+                            added: Iterable[str] = (), removed: Iterable[str] = ()) -> None:
+        """Ajoute le changement au journal : coût indépendant de la taille du tag"""
+        if not self.use_journal or tag not in self.tag_files:
+            self.save_tag(tag, obj_ids)
+            return
+        self._live_tags[tag] = obj_ids
+        self._journaled_tags.add(tag)
+        self._append_journal({"op": "tag", "name": tag, "add": list(added), "del": list(removed)})
+
+    def delete_tag(self, tag: str) -> None:
+        with self._lock:
+            tag_file_path = self.tag_files.pop(tag, None) or os.path.join(self.tags_dir, f"{tag}.json")
+            self._delete_file(tag_file_path)
+            self._rewritten.add(("tag", tag))
+        if self.use_journal:
+            self._live_tags.pop(tag, None)
+            self._journaled_tags.discard(tag)
+            self._append_journal({"op": "tag_drop", "name": tag})
+
+    def save_collection(self, data: dict) -> None:
+        with self._lock:
+            self._write_file(self._collection_path(data["id"]), data)
+            self._rewritten.add(("collection", data["id"]))
+        if self.use_journal:
+            self._live_collections.pop(data["id"], None)
+            self._append_journal({"op": "collection_reset", "id": data["id"]})
+
+    def collection_members_changed(self, meta: dict, obj_ids: Iterable[str],
+                                   added: Iterable[str] = (), removed: Iterable[str] = ()) -> None:
+        """Ajoute le changement au journal : coût indépendant de la taille de la collection"""
+        if not self.use_journal or not os.path.exists(self._collection_path(meta["id"])):
+            super().collection_members_changed(meta, obj_ids, added, removed)
+            return
+        self._live_collections[meta["id"]] = (meta, obj_ids)
+        self._journaled_collections.add(meta["id"])
+        self._append_journal({"op": "collection", "meta": meta, "add": list(added), "del": list(removed)})
+
+    def delete_collection(self, collection_id: str) -> None:
+        with self._lock:
+            self._delete_file(self._collection_path(collection_id))
+            self._rewritten.add(("collection", collection_id))
+        if self.use_journal:
+            self._live_collections.pop(collection_id, None)
+            self._journaled_collections.discard(collection_id)
+            self._append_journal({"op": "collection_drop", "id": collection_id})
+
+    @contextmanager
+    def transaction(self):
+        """Regroupe les ajouts au journal pour ne faire qu'un seul fsync
+
+        Les fichiers sont écrits dans des fichiers temporaires : une exception
+        pendant la transaction ne laisse aucune écriture partielle. À la fin,
+        les fichiers de base sont remplacés, puis le journal est écrit et sert
+        de marque de validation : au rejeu, un fichier de base est toujours au
+        moins aussi récent que le journal.
+        """
+        if self._transaction_depth == 0:
+            self._journal_buffer = []
+            self._staged_files = {}
+        self._transaction_depth += 1
+        try:
+            yield
+        except BaseException:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self._journal_buffer = None  # Les changements annulés ne sont pas journalisés
+                self._discard_staged_files()
+            raise
+        else:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                lines, self._journal_buffer = self._journal_buffer, None
+                self._apply_staged_files()
+                if lines:
+                    self._write_journal_lines(lines)
+                self._maybe_compact()
+
+    def _write_file(self, path: str, data) -> None:
+        """Écrit un fichier de base, ou le prépare à côté pendant une transaction"""
+        if self._staged_files is None:
+            write_json_atomic(path, data)
+            return
+        tmp_path = path + ".tmp"
+        self._staged_files[path] = tmp_path  # Supprimé par _discard_staged_files si l'écriture échoue
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+
+    def _delete_file(self, path: str) -> None:
+        """Supprime un fichier de base, ou diffère la suppression pendant une transaction"""
+        if self._staged_files is None:
+            self._remove_file(path)
+            return
+        if self._staged_files.get(path):
+            self._remove_file(self._staged_files[path])
+        self._staged_files[path] = None
+
+    def _apply_staged_files(self) -> None:
+        """Remplace les fichiers de base ; en cas d'échec, supprime les fichiers temporaires restants"""
+        try:
+            with self._lock:
+                for path, tmp_path in self._staged_files.items():
+                    if tmp_path is None:
+                        self._remove_file(path)
+                    else:
+                        os.replace(tmp_path, path)
+        finally:
+            self._discard_staged_files()
+
+    def _discard_staged_files(self) -> None:
+        staged, self._staged_files = self._staged_files, None
+        for tmp_path in staged.values():
+            if tmp_path is not None:
+                self._remove_file(tmp_path)  # Ne fait rien pour un fichier déjà mis en place
+
+    # Journal
+    def _append_journal(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n"
+        if self._journal_buffer is not None:
+            self._journal_buffer.append(line)
+        else:
+            self._write_journal_lines([line])
+            self._maybe_compact()
+
+    def _write_journal_lines(self, lines: List[str]) -> None:
+        if self._journal_file is None:
+            self._journal_file = open(self.journal_path, 'a', encoding='utf-8')
+            self._journal_size = self._journal_file.tell()
+        data = "".join(lines)
+        self._journal_file.write(data)
+        self._journal_file.flush()
+        if self.sync:
+            os.fsync(self._journal_file.fileno())
+        self._journal_size += len(data)
+
+    def _close_journal_file(self) -> None:
+        if self._journal_file is not None:
+            self._journal_file.close()
+            self._journal_file = None
+
+    def _read_journal(self, path: str) -> List[dict]:
+        records = []
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # Dernière ligne tronquée par un arrêt brutal
+                        print(f"Enregistrement illisible ignoré dans {path}")
+        except FileNotFoundError:
+            pass
+        return records
+
+    def _replay_journal(self, tags: Dict[str, list], collections: List[dict]) -> bool:
+        """Applique journal.log.1 puis journal.log aux données chargées, puis les intègre aux fichiers
+
+        Un fichier de base est remplacé avant l'écriture de l'enregistrement
+        qui le valide : il est donc au moins aussi récent que le journal. Les
+        enregistrements d'un tag ou d'une collection dont le fichier manque
+        (supprimé ensuite) sont ignorés, et une suppression suivie d'une
+        recréation repart du fichier de base.
+        """
+        records = self._read_journal(self.rotated_journal_path) + self._read_journal(self.journal_path)
+        if not records:
+            return False
+
+        base_tags = {tag: list(obj_ids) for tag, obj_ids in tags.items()}
+        tag_sets = {tag: set(obj_ids) for tag, obj_ids in tags.items()}
+        base_collections = {data["id"]: data for data in collections}
+        collection_sets = {data["id"]: set(data["object_ids"]) for data in collections}
+        collection_meta = {data["id"]: {k: v for k, v in data.items() if k != "object_ids"}
+                           for data in collections}
+        touched_tags: Set[str] = set()
+        touched_collections: Set[str] = set()
+
+        for record in records:
+            op = record.get("op")
+            if op in ("tag", "tag_reset", "tag_drop"):
+                tag = record["name"]
+                if tag not in base_tags:
+                    continue  # Fichier supprimé : le tag n'existe plus
+                if op == "tag":
+                    members = tag_sets[tag]
+                    members.update(record["add"])
+                    members.difference_update(record["del"])
+                    touched_tags.add(tag)
+                else:
+                    # Après une suppression, le fichier présent est celui d'une recréation
+                    tag_sets[tag] = set(base_tags[tag])
+                    touched_tags.discard(tag)
+            elif op in ("collection", "collection_reset", "collection_drop"):
+                collection_id = record["meta"]["id"] if op == "collection" else record["id"]
+                base = base_collections.get(collection_id)
+                if base is None:
+                    continue
+                if op == "collection":
+                    members = collection_sets[collection_id]
+                    members.update(record["add"])
+                    members.difference_update(record["del"])
+                    collection_meta[collection_id] = record["meta"]
+                    touched_collections.add(collection_id)
+                else:
+                    collection_sets[collection_id] = set(base["object_ids"])
+                    collection_meta[collection_id] = {k: v for k, v in base.items() if k != "object_ids"}
+                    touched_collections.discard(collection_id)
+
+        tags.clear()
+        tags.update({tag: list(obj_ids) for tag, obj_ids in tag_sets.items()})
+        collections[:] = []
+        for collection_id, obj_ids in collection_sets.items():
+            data = dict(collection_meta[collection_id])
+            data["object_ids"] = list(obj_ids)
+            collections.append(data)
+
+        # Intégrer immédiatement le journal rejoué aux fichiers de base
+        by_id = {data["id"]: data for data in collections}
+        for tag in touched_tags:
+            if tag in tags:
+                write_json_atomic(self._tag_path(tag), tags[tag])
+        for collection_id in touched_collections:
+            if collection_id in by_id:
+                write_json_atomic(self._collection_path(collection_id), by_id[collection_id])
+        self._remove_file(self.rotated_journal_path)
+        self._remove_file(self.journal_path)
+        return True
+
+    def _maybe_compact(self) -> None:
+        """Lance une compaction en arrière-plan si le journal est trop gros"""
+        if (self._journal_size < self.compact_threshold or self._transaction_depth
+                or (self._compaction_thread is not None and self._compaction_thread.is_alive())):
+            return
+
+        with self._lock:
+            self._close_journal_file()
+            if os.path.exists(self.rotated_journal_path):
+                # Compaction précédente échouée : journal.log.1 doit être gardé, journal.log y est ajouté
+                with open(self.journal_path, 'rb') as source, open(self.rotated_journal_path, 'ab') as target:
+                    shutil.copyfileobj(source, target)
+                    target.flush()
+                    if self.sync:
+                        os.fsync(target.fileno())
+                os.remove(self.journal_path)
+            else:
+                os.replace(self.journal_path, self.rotated_journal_path)
+            self._journal_size = 0
+            self._rewritten = set()
+        self._rotated_tags |= self._journaled_tags
+        self._rotated_collections |= self._journaled_collections
+        self._journaled_tags = set()
+        self._journaled_collections = set()
+
+        # Copier ici les membres actuels : le thread ne lit jamais les ensembles vivants
+        tags = {tag: list(self._live_tags[tag]) for tag in self._rotated_tags
+                if tag in self._live_tags}
+        collections = {}
+        for collection_id in self._rotated_collections:
+            if collection_id in self._live_collections:
+                meta, obj_ids = self._live_collections[collection_id]
+                data = dict(meta)
+                data["object_ids"] = list(obj_ids)
+                collections[collection_id] = data
+
+        self._compaction_thread = threading.Thread(
+            target=self._compact_rotated_journal, args=(tags, collections), daemon=True)
+        self._compaction_thread.start()
+
+    def _compact_rotated_journal(self, tags: Dict[str, list], collections: Dict[str, dict]) -> None:
+        """Réécrit les fichiers touchés par journal.log.1 puis le supprime (thread de compaction)"""
+        try:
+            for tag, obj_ids in tags.items():
+                with self._lock:
+                    # Un fichier réécrit ou supprimé depuis la rotation est plus récent que cette copie
+                    if ("tag", tag) in self._rewritten or tag not in self.tag_files:
+                        continue
+                    write_json_atomic(self.tag_files[tag], obj_ids)
+            for collection_id, data in collections.items():
+                with self._lock:
+                    if ("collection", collection_id) in self._rewritten:
+                        continue
+                    write_json_atomic(self._collection_path(collection_id), data)
+            with self._lock:
+                os.remove(self.rotated_journal_path)
+                self._rotated_tags = set()
+                self._rotated_collections = set()
+        except Exception as e:
+            # journal.log.1 est conservé : repris par la prochaine compaction, close() ou le prochain chargement
+            print(f"Erreur lors de la compaction du journal: {e}")
+
+    def compact(self, data: dict) -> None:
+        """Attend la compaction en cours puis intègre journal.log aux fichiers de base"""
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()
+            self._compaction_thread = None
+        self._close_journal_file()
+        if not os.path.exists(self.journal_path) and not os.path.exists(self.rotated_journal_path):
+            return
+
+        collections = {collection["id"]: collection for collection in data["collections"]}
+        touched_tags = self._journaled_tags | self._rotated_tags
+        touched_collections = self._journaled_collections | self._rotated_collections
+        if os.path.exists(self.rotated_journal_path):
+            # Compaction précédente interrompue : réécrire tout ce qui a été journalisé
+            for record in self._read_journal(self.rotated_journal_path):
+                if record.get("op") == "tag":
+                    touched_tags.add(record["name"])
+                elif record.get("op") == "collection":
+                    touched_collections.add(record["meta"]["id"])
+
+        for tag in touched_tags:
+            if tag in data["tags"] and tag in self.tag_files:
+                write_json_atomic(self.tag_files[tag], list(data["tags"][tag]))
+        for collection_id in touched_collections:
+            if collection_id in collections:
+                write_json_atomic(self._collection_path(collection_id), collections[collection_id])
+
+        self._remove_file(self.rotated_journal_path)
+        self._remove_file(self.journal_path)
+        self._journal_size = 0
+        self._journaled_tags = set()
+        self._journaled_collections = set()
+        self._rotated_tags = set()
+        self._rotated_collections = set()
+
+    def close(self) -> None:
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()
+        self._close_journal_file()
+
+    def _remove_file(self, path: str) -> None:
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except Exception as e:
+                print(f"Erreur lors de la suppression du fichier {path}: {e}")
+
+
+def _intern_keys(data):
+    """Partage les clés des dictionnaires pour que marshal ne les écrive qu'une fois"""
+    if isinstance(data, dict):
+        return {sys.intern(key): value for key, value in data.items()}
+    return data
+
+
+class SqliteStorage(StorageBackend):
+    """Stockage dans un unique fichier SQLite avec tables d'appartenance indexées"""
+
+    name = "sqlite"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS objects (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            description TEXT NOT NULL DEFAULT '',
+            type TEXT NOT NULL,
+            location TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_objects_location ON objects(location);
+
+        CREATE TABLE IF NOT EXISTS tags (
+            name TEXT PRIMARY KEY
+        );
+        CREATE TABLE IF NOT EXISTS tag_members (
+            tag TEXT NOT NULL,
+            object_id TEXT NOT NULL,
+            PRIMARY KEY (tag, object_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_tag_members_object ON tag_members(object_id);
+
+        CREATE TABLE IF NOT EXISTS collections (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            description TEXT NOT NULL DEFAULT '',
+            created_at TEXT,
+            updated_at TEXT
+        );
+        CREATE TABLE IF NOT EXISTS collection_members (
+            collection_id TEXT NOT NULL,
+            object_id TEXT NOT NULL,
+            PRIMARY KEY (collection_id, object_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_collection_members_object ON collection_members(object_id);
+    """
+
+    # Migrations successives du schéma : MIGRATIONS[n] fait passer PRAGMA user_version de n à n + 1
+    MIGRATIONS = [
+        # 1 : taille et date d'ajout des objets
+        ["ALTER TABLE objects ADD COLUMN size INTEGER",
+         "ALTER TABLE objects ADD COLUMN added_at TEXT NOT NULL DEFAULT ''"],
+    ]
+
+    def __init__(self, data_dir: str, filename: str = SQLITE_FILENAME):
+        super().__init__()
+        self.data_dir = data_dir
+        os.makedirs(data_dir, exist_ok=True)
+        self.path = os.path.join(data_dir, filename)
+        # isolation_level=None : chaque instruction isolée est validée immédiatement,
+        # les groupes d'écritures passent par transaction()
+        self.conn = sqlite3.connect(self.path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=OFF")
+        self.conn.executescript(self.SCHEMA)
+        self._transaction_depth = 0
+        self._migrate()
+
+    def _migrate(self) -> None:
+        """Applique les migrations manquantes, chacune dans sa transaction"""
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        for version, statements in enumerate(self.MIGRATIONS[version:], version + 1):
+            with self.transaction():
+                for statement in statements:
+                    self.conn.execute(statement)
+                self.conn.execute(f"PRAGMA user_version = {version}")
+
+    @contextmanager
+    def transaction(self):
+        """Transaction SQLite (les transactions imbriquées sont fusionnées)"""
+        if self._transaction_depth == 0:
+            self.conn.execute("BEGIN")
+        self._transaction_depth += 1
+        try:
+            yield
+        except BaseException:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self.conn.execute("ROLLBACK")
+            raise
+        else:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self.conn.execute("COMMIT")
+
+    def load(self, progress: ProgressCallback = None) -> dict:
+        cursor = self.conn.cursor()
+        timings = {}
+
+        start = time.perf_counter()
+        objects = [
+            {"id": row[0], "name": row[1], "description": row[2], "type": row[3], "location": row[4],
+             "size": row[5], "added_at": row[6]}
+            for row in cursor.execute("SELECT id, name, description, type, location, size, added_at FROM objects")
+        ]
+        timings["objects"] = time.perf_counter() - start
+        if progress:
+            progress("objects", len(objects), len(objects))
+
+        start = time.perf_counter()
+        tags: Dict[str, List[str]] = {name: [] for (name,) in cursor.execute("SELECT name FROM tags")}
+        for tag, obj_id in cursor.execute("SELECT tag, object_id FROM tag_members"):
+            tags.setdefault(tag, []).append(obj_id)
+        timings["tags"] = time.perf_counter() - start
+        if progress:
+            progress("tags", len(tags), len(tags))
+
+        start = time.perf_counter()
+        collections = {}
+        for row in cursor.execute("SELECT id, name, description, created_at, updated_at FROM collections"):
+            collections[row[0]] = {
+                "id": row[0], "name": row[1], "description": row[2],
+                "created_at": row[3], "updated_at": row[4], "object_ids": []
+            }
+        for collection_id, obj_id in cursor.execute("SELECT collection_id, object_id FROM collection_members"):
+            if collection_id in collections:
+                collections[collection_id]["object_ids"].append(obj_id)
+        timings["collections"] = time.perf_counter() - start
+        if progress:
+            progress("collections", len(collections), len(collections))
+
+        self.load_timings = timings
+        return {"objects": objects, "tags": tags, "collections": list(collections.values())}
+
+    def save_object(self, data: dict) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO objects (id, name, description, type, location, size, added_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (data["id"], data["name"], data["description"], data["type"], data["location"],
+             data.get("size"), data.get("added_at") or "")
+        )
+
+    def delete_object(self, obj_id: str) -> None:
+        with self.transaction():
+            self.conn.execute("DELETE FROM objects WHERE id = ?", (obj_id,))
+            self.conn.execute("DELETE FROM tag_members WHERE object_id = ?", (obj_id,))
+            self.conn.execute("DELETE FROM collection_members WHERE object_id = ?", (obj_id,))
+
+    def save_tag(self, tag: str, obj_ids: Iterable[str]) -> None:
+        with self.transaction():
+            self.conn.execute("INSERT OR IGNORE INTO tags (name) VALUES (?)", (tag,))
+            self.conn.execute("DELETE FROM tag_members WHERE tag = ?", (tag,))
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO tag_members (tag, object_id) VALUES (?, ?)",
+                ((tag, obj_id) for obj_id in obj_ids)
+            )
+
+    def tag_members_changed(self, tag: str, obj_ids: Iterable[str],
+                            added: Iterable[str] = (), removed: Iterable[str] = ()) -> None:
+        with self.transaction():
+            self.conn.execute("INSERT OR IGNORE INTO tags (name) VALUES (?)", (tag,))
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO tag_members (tag, object_id) VALUES (?, ?)",
+                ((tag, obj_id) for obj_id in added)
+            )
+            self.conn.executemany(
+                "DELETE FROM tag_members WHERE tag = ? AND object_id = ?",
+                ((tag, obj_id) for obj_id in removed)
+            )
+
+    def delete_tag(self, tag: str) -> None:
+        with self.transaction():
+            self.conn.execute("DELETE FROM tags WHERE name = ?", (tag,))
+            self.conn.execute("DELETE FROM tag_members WHERE tag = ?", (tag,))
+
+    def _save_collection_meta(self, meta: dict) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO collections (id, name, description, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (meta["id"], meta["name"], meta["description"], meta.get("created_at"), meta.get("updated_at"))
+        )
+
+    def save_collection(self, data: dict) -> None:
+        with self.transaction():
+            self._save_collection_meta(data)
+            self.conn.execute("DELETE FROM collection_members WHERE collection_id = ?", (data["id"],))
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO collection_members (collection_id, object_id) VALUES (?, ?)",
+                ((data["id"], obj_id) for obj_id in data.get("object_ids", []))
+            )
+
+    def collection_members_changed(self, meta: dict, obj_ids: Iterable[str],
+                                   added: Iterable[str] = (), removed: Iterable[str] = ()) -> None:
+        with self.transaction():
+            self._save_collection_meta(meta)
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO collection_members (collection_id, object_id) VALUES (?, ?)",
+                ((meta["id"], obj_id) for obj_id in added)
+            )
+            self.conn.executemany(
+                "DELETE FROM collection_members WHERE collection_id = ? AND object_id = ?",
+                ((meta["id"], obj_id) for obj_id in removed)
+            )
+
+    def delete_collection(self, collection_id: str) -> None:
+        with self.transaction():
+            self.conn.execute("DELETE FROM collections WHERE id = ?", (collection_id,))
+            self.conn.execute("DELETE FROM collection_members WHERE collection_id = ?", (collection_id,))
+
+    def close(self) -> None:
+        try:
+            self.conn.close()
+        except sqlite3.Error as e:
+            print(f"Erreur lors de la fermeture de la base SQLite: {e}")
+
+
+class MemoryStorage(StorageBackend):
+    """Moteur en mémoire, sans fichier : pour les mesures et les tests (données au format de load())"""
+
+    name = "memory"
+
+    def __init__(self, data: Optional[dict] = None):
+        super().__init__()
+        data = data or {}
+        self.objects: Dict[str, dict] = {obj["id"]: dict(obj) for obj in data.get("objects", [])}
+        self.tags: Dict[str, List[str]] = {tag: list(obj_ids) for tag, obj_ids in data.get("tags", {}).items()}
+        self.collections: Dict[str, dict] = {collection["id"]: dict(collection)
+                                             for collection in data.get("collections", [])}
+
+    def load(self, progress: ProgressCallback = None) -> dict:
+        return {"objects": [dict(obj) for obj in self.objects.values()],
+                "tags": {tag: list(obj_ids) for tag, obj_ids in self.tags.items()},
+                "collections": [dict(collection, object_ids=list(collection["object_ids"]))
+                                for collection in self.collections.values()]}
+
+    def save_object(self, data: dict) -> None:
+        self.objects[data["id"]] = dict(data)
+
+    def delete_object(self, obj_id: str) -> None:
+        self.objects.pop(obj_id, None)
+
+    def save_tag(self, tag: str, obj_ids: Iterable[str]) -> None:
+        self.tags[tag] = list(obj_ids)
+
+    def delete_tag(self, tag: str) -> None:
+        self.tags.pop(tag, None)
+
+    def save_collection(self, data: dict) -> None:
+        self.collections[data["id"]] = dict(data, object_ids=list(data["object_ids"]))
+
+    def delete_collection(self, collection_id: str) -> None:
+        self.collections.pop(collection_id, None)
+
+
+def open_storage(data_dir: str, backend: Optional[str] = None) -> StorageBackend:
+    """Ouvre le moteur de stockage demandé (détection automatique si non précisé)"""
+    if backend is None:
+        backend = "sqlite" if os.path.exists(os.path.join(data_dir, SQLITE_FILENAME)) else "json"
+    if backend == "sqlite":
+        return SqliteStorage(data_dir)
+    if backend == "json":
+        return JsonStorage(data_dir)
+    raise ValueError(f"Moteur de stockage inconnu: {backend}")
+
+
+def convert_storage(source: StorageBackend, target: StorageBackend, progress=None) -> dict:
+    """Copie toutes les données d'un moteur de stockage vers un autre
+
+    Les objets, tags et collections déjà présents dans la cible et absents de
+    la source sont supprimés dans la même transaction : la cible devient une
+    copie exacte de la source.
+    """
+    data = source.load()
+    existing = target.load()
+    total = len(data["objects"]) + len(data["tags"]) + len(data["collections"])
+    done = 0
+
+    with target.transaction():
+        object_ids = {obj["id"] for obj in data["objects"]}
+        for obj in existing["objects"]:
+            if obj["id"] not in object_ids:
+                target.delete_object(obj["id"])
+        for tag in existing["tags"]:
+            if tag not in data["tags"]:
+                target.delete_tag(tag)
+        collection_ids = {collection["id"] for collection in data["collections"]}
+        for collection in existing["collections"]:
+            if collection["id"] not in collection_ids:
+                target.delete_collection(collection["id"])
+
+        for obj in data["objects"]:
+            target.save_object(obj)
+            done += 1
+            if progress and done % 1000 == 0:
+                progress(done, total)
+
+        for tag, obj_ids in data["tags"].items():
+            target.save_tag(tag, obj_ids)
+            done += 1
+
+        for collection in data["collections"]:
+            target.save_collection(collection)
+            done += 1
+
+    if progress:
+        progress(total, total)
+
+    return {
+        "objects": len(data["objects"]),
+        "tags": len(data["tags"]),
+        "collections": len(data["collections"])
+    }
+
+
+class MemberChanges:
+    """Ajouts et retraits nets sur les membres d'un tag ou d'une collection"""
+
+    def __init__(self, full: bool = False):
+        self.added: Set[str] = set()
+        self.removed: Set[str] = set()
+        self.full = full  # Réécriture complète nécessaire (création, suppression puis recréation...)
+
+    def add(self, obj_id: str) -> None:
+        if obj_id in self.removed:
+            self.removed.discard(obj_id)
+        else:
+            self.added.add(obj_id)
+
+    def remove(self, obj_id: str) -> None:
+        if obj_id in self.added:
+            self.added.discard(obj_id)
+        else:
+            self.removed.add(obj_id)
+
+
+class PendingWrites:
+    """Écritures différées et dédupliquées pendant un TagDatabase.batch()"""
+
+    def __init__(self):
+        self.objects: Set[str] = set()
+        self.deleted_objects: Set[str] = set()
+        self.tags: Dict[str, MemberChanges] = {}
+        self.deleted_tags: Set[str] = set()
+        self.collections: Dict[str, MemberChanges] = {}
+        self.deleted_collections: Set[str] = set()
+
+    def object_saved(self, obj_id: str) -> None:
+        self.deleted_objects.discard(obj_id)
+        self.objects.add(obj_id)
+
+    def object_deleted(self, obj_id: str) -> None:
+        self.objects.discard(obj_id)
+        self.deleted_objects.add(obj_id)
+
+    def tag_changes(self, tag: str) -> MemberChanges:
+        changes = self.tags.get(tag)
+        if changes is None:
+            changes = self.tags[tag] = MemberChanges(full=tag in self.deleted_tags)
+            self.deleted_tags.discard(tag)
+        return changes
+
+    def tag_deleted(self, tag: str) -> None:
+        self.tags.pop(tag, None)
+        self.deleted_tags.add(tag)
+
+    def collection_changes(self, collection_id: str) -> MemberChanges:
+        changes = self.collections.get(collection_id)
+        if changes is None:
+            changes = self.collections[collection_id] = MemberChanges(
+                full=collection_id in self.deleted_collections)
+            self.deleted_collections.discard(collection_id)
+        return changes
+
+    def collection_deleted(self, collection_id: str) -> None:
+        self.collections.pop(collection_id, None)
+        self.deleted_collections.add(collection_id)
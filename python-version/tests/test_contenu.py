@@ -0,0 +1,83 @@
+import threading
+import zipfile
+
+import contenu
+from contenu import ContentIndex, ContentIndexer, extract_text
+
+DOCX_XML = ('<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+            '<w:p><w:r><w:t>Bon de </w:t></w:r><w:r><w:t>commande</w:t></w:r></w:p>'
+            '<w:p><w:r><w:t>Facture</w:t></w:r></w:p></w:body></w:document>')
+
+
+def test_extract_text(tmp_path):
+    docx = tmp_path / "lettre.docx"
+    with zipfile.ZipFile(docx, "w") as archive:
+        archive.writestr("word/document.xml", DOCX_XML)
+        archive.writestr("word/styles.xml", "<styles>ignoré</styles>")
+    assert extract_text(str(docx)) == "Bon de commande\nFacture"
+
+    (tmp_path / "utf8.txt").write_text("Été à Paris", encoding="utf-8")
+    (tmp_path / "ancien.txt").write_bytes("Été à Paris".encode("cp1252"))
+    assert extract_text(str(tmp_path / "utf8.txt")) == "Été à Paris"
+    assert extract_text(str(tmp_path / "ancien.txt")) == "Été à Paris"
+    assert extract_text(str(tmp_path / "image.png")) == ""
+
+
+def test_truncated_read_keeps_utf8(tmp_path, monkeypatch):
+    monkeypatch.setattr(contenu, "MAX_TEXT_BYTES", 7)
+    (tmp_path / "long.txt").write_text("Été à Paris", encoding="utf-8")  # Le 7e octet coupe « à »
+    assert extract_text(str(tmp_path / "long.txt")) == "Été "
+    (tmp_path / "ancien.txt").write_bytes("Été à Paris".encode("cp1252"))
+    assert extract_text(str(tmp_path / "ancien.txt")) == "Été à P"
+    truncated = "Été".encode("utf-8") + b"\xc3"  # Fichier lu en entier mais mal terminé
+    (tmp_path / "court.txt").write_bytes(truncated)
+    assert extract_text(str(tmp_path / "court.txt")) == truncated.decode("cp1252", errors="replace")
+
+
+def test_indexer_reads_only_changed_files(tmp_path, monkeypatch):
+    files = {name: tmp_path / f"{name}.txt" for name in ("a", "b", "c")}
+    files["a"].write_text("facture mars", encoding="utf-8")
+    files["b"].write_text("Facture AVRIL", encoding="utf-8")
+    files["c"].write_text("devis", encoding="utf-8")
+    read = []
+
+    def counting_extract(location):
+        read.append(location)
+        return extract_text(location)
+
+    monkeypatch.setattr(contenu, "extract_text", counting_extract)
+    index = ContentIndex(str(tmp_path / "donnees"))
+    indexed = threading.Event()
+    indexer = ContentIndexer(index, indexed.set, workers=2)
+    try:
+        indexer.submit([str(path) for path in files.values()])
+        assert indexed.wait(5)
+        assert sorted(index.search(["facture"])) == sorted([str(files["a"]), str(files["b"])])
+        assert index.search(["facture", "avril"]) == [str(files["b"])]
+
+        # Second passage : seul le fichier modifié est relu ; prune oublie c
+        read.clear()
+        indexed.clear()
+        files["a"].write_text("facture payée", encoding="utf-8")
+        indexer.submit([str(files["a"]), str(files["b"])], prune=True)
+        assert indexed.wait(5)
+        assert read == [str(files["a"])]
+        assert index.search(["mars"]) == [] and index.search(["payee"]) == [str(files["a"])]
+        assert index.search(["devis"]) == []
+    finally:
+        indexer.stop()
+        index.close()
+
+    # L'index est conservé sur disque
+    index = ContentIndex(str(tmp_path / "donnees"))
+    assert set(index.signatures()) == {str(files["a"]), str(files["b"])}
+    index.close()
+
+
+def test_closed_index_finds_nothing(tmp_path):
+    index = ContentIndex(str(tmp_path))
+    index.store(str(tmp_path / "a.txt"), 1, 1, "facture")
+    assert index.search(["facture"]) == [str(tmp_path / "a.txt")]
+    index.close()
+    # Une recherche commencée avant la fermeture ne lève pas d'erreur
+    assert index.search(["facture"]) == [] and index.estimate(["facture"]) == 0
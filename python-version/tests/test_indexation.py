@@ -0,0 +1,239 @@
+import math
+import random
+
+import pytest
+
+import indexation
+from indexation import (BKTree, Bitmap, CompletionIndex, IdInterner, IdSet, SortedKeyIndex, TextIndex,
+                        TrigramIndex, canonical_location, edit_distance, normalize_text, wildcard_fragments, wildcard_regex)
+
+
+@pytest.mark.parametrize("location, expected", [
+    ("/photos/./plage.jpg", "/photos/plage.jpg"),
+    ("/photos//vacances/../plage.jpg", "/photos/plage.jpg"),
+    ("C:\\photos\\plage.jpg", "C:/photos/plage.jpg"),
+    ("  /photos/plage.jpg ", "/photos/plage.jpg"),
+    ("https://exemple.org/a/../b", "https://exemple.org/a/../b"),
+    ("", ""),
+])
+def test_canonical_location(location, expected, monkeypatch):
+    monkeypatch.setattr(indexation, "CASE_INSENSITIVE_PATHS", False)
+    assert canonical_location(location) == expected
+
+
+def test_canonical_location_case_and_symlinks(tmp_path, monkeypatch):
+    monkeypatch.setattr(indexation, "CASE_INSENSITIVE_PATHS", True)
+    assert canonical_location("/Photos/Plage.JPG") == "/photos/plage.jpg"
+
+    monkeypatch.setattr(indexation, "CASE_INSENSITIVE_PATHS", False)
+    target = tmp_path / "plage.jpg"
+    target.write_bytes(b"")
+    link = tmp_path / "lien.jpg"
+    link.symlink_to(target)
+    assert canonical_location(str(link)) != canonical_location(str(target))
+    assert canonical_location(str(link), resolve=True) == canonical_location(str(target), resolve=True)
+
+
+def random_sets(seed):
+    """Ensembles creux, denses et à cheval sur plusieurs conteneurs de 65 536 valeurs"""
+    rng = random.Random(seed)
+    sparse = set(rng.sample(range(300_000), 500))
+    dense = set(range(60_000, 140_000)) - set(rng.sample(range(60_000, 140_000), 2_000))
+    mixed = set(rng.sample(range(200_000), 40_000)) | {0, 65_535, 65_536, 131_071}
+    return [set(), {7}, sparse, dense, mixed]
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_bitmap_operations_match_set(seed):
+    sets = random_sets(seed)
+    for left in sets:
+        for right in sets:
+            a, b = Bitmap(left), Bitmap(right)
+            assert list(a & b) == sorted(left & right)
+            assert list(a | b) == sorted(left | right)
+            assert list(a - b) == sorted(left - right)
+            assert len(a & b) == len(left & right)
+            assert (a == b) == (left == right)
+
+
+def test_bitmap_membership_and_updates():
+    rng = random.Random(4)
+    expected = set(rng.sample(range(200_000), 5_000))
+    bitmap = Bitmap(expected)
+    for value in rng.sample(range(200_000), 20_000):
+        if rng.random() < 0.5:
+            bitmap.add(value)
+            expected.add(value)
+        else:
+            bitmap.discard(value)
+            expected.discard(value)
+    assert list(bitmap) == sorted(expected)
+    assert len(bitmap) == len(expected)
+    assert bool(bitmap) == bool(expected)
+    for value in rng.sample(range(200_000), 2_000):
+        assert (value in bitmap) == (value in expected)
+
+
+def test_bitmap_copy_is_independent():
+    bitmap = Bitmap(range(10))
+    copy = bitmap.copy()
+    copy.add(100)
+    copy.discard(0)
+    assert list(bitmap) == list(range(10))
+    assert list(copy) == list(range(1, 10)) + [100]
+
+
+def test_id_set_behaves_like_a_set():
+    interner = IdInterner()
+    ids = IdSet(interner, ["b", "a"])
+    ids.add("c")
+    ids.discard("b")
+    ids.discard("absent")
+    assert ids == {"a", "c"}
+    assert "a" in ids and "b" not in ids and "absent" not in ids
+    assert sorted(ids | {"d"}) == ["a", "c", "d"]
+    # Les numéros ne sont jamais réutilisés
+    assert interner.lookup("b") is not None
+    assert list(interner.resolve(ids.bitmap)) == ["a", "c"]
+
+
+def test_trigram_candidates_contain_every_match():
+    rng = random.Random(5)
+    texts = {number: "".join(rng.choice("abcdé ") for _ in range(rng.randint(0, 12))) for number in range(500)}
+    index = TrigramIndex()
+    index.build(texts.items())
+    for number in rng.sample(range(500), 100):
+        index.remove(number, texts[number])
+        texts[number] = "".join(rng.choice("abcdé ") for _ in range(rng.randint(0, 12)))
+        index.add(number, texts[number])
+
+    assert index.candidates("ab") is None
+    for substring in ("abc", "é a", "dddd", "zzz", "abcab"):
+        candidates = set(index.candidates(substring))
+        assert {number for number, text in texts.items() if substring in text} <= candidates
+        assert all(set(TrigramIndex.trigrams(substring)) <= TrigramIndex.trigrams(texts[number])
+                   for number in candidates)
+
+
+@pytest.mark.parametrize("text, key", [
+    ("Élan", "elan"), ("Donjon É", "donjon e"), ("Straße", "strasse"), ("IMG_0001.JPG", "img_0001.jpg"),
+])
+def test_normalize_text(text, key):
+    assert normalize_text(text) == key
+
+
+def test_normalize_text_reuses_normalized_strings():
+    text = "".join(["déjà", " vu"]).replace("é", "e").replace("à", "a")
+    assert normalize_text(text) is text
+
+
+def test_bk_tree_search_matches_brute_force():
+    rng = random.Random(16)
+    words = ["".join(rng.choice("abcde") for _ in range(rng.randint(1, 7))) for _ in range(400)]
+    tree = BKTree(words)
+    live = list(words)
+    for word in rng.sample(words, 300):  # Assez de suppressions pour reconstruire l'arbre
+        tree.remove(word)
+        live.remove(word)
+    tree.remove("absent")
+    assert sorted(tree) == sorted(set(live))
+
+    for query in ("abc", "eeee", "a", "bcdab"):
+        for max_distance in (0, 1, 2):
+            expected = sorted({(word, edit_distance(query, word)) for word in live
+                               if edit_distance(query, word) <= max_distance},
+                              key=lambda item: (item[1], item[0]))
+            assert tree.search(query, max_distance) == expected
+
+
+def test_wildcard_helpers():
+    assert wildcard_regex("sk*l?ton.jpg").match("skeleton.jpg")
+    assert not wildcard_regex("sk*l?ton.jpg").match("skeletonXjpg")
+    assert not wildcard_regex("a*").match("ba")
+    assert wildcard_fragments("sk*l?ton") == ("sk", ["sk", "l", "ton"])
+    assert wildcard_fragments("*ton") == ("", ["ton"])
+
+
+def test_sorted_key_index_ranges():
+    index = SortedKeyIndex()
+    index.build([(1, "abc"), (2, "abd"), (3, "b"), (4, "ab")])
+    index.add(5, "abc")
+    index.add(5, "abc")
+    index.remove(2, "abd")
+    index.remove(9, "zzz")
+    assert list(index.prefix("ab")) == [("ab", 4), ("abc", 1), ("abc", 5)]
+    assert list(index.equal("abc")) == [("abc", 1), ("abc", 5)]
+    assert [number for _, number in index.prefix("")] == [4, 1, 5, 3]
+    for low, high in ((None, None), ("ab", "b"), ("abc", None), (None, "abc"), ("c", "d"), ("b", "a")):
+        assert index.count_between(low, high) == len(list(index.between(low, high)))
+
+
+def test_completion_index_ranks_by_usage():
+    index = CompletionIndex()
+    for text, count in (("#été", 3), ("#étoile", 10), ("#eau", 1), ("@Été", 5), ("#zèbre", 50)):
+        index.add(text, count)
+    index.add("@Été", 2)  # Deux collections de même nom
+    assert index.complete("#et", 5) == ["#étoile", "#été"]
+    assert index.complete("#E", 2) == ["#étoile", "#été"]
+    index.use("#eau", 20)
+    assert index.complete("#e", 5) == ["#eau", "#étoile", "#été"]
+    assert index.complete("#eau", 5) == []  # Le texte déjà tapé n'est pas proposé
+
+    index.remove("@Été", 5)
+    assert "@Été" in index and index.complete("@", 5) == ["@Été"]
+    index.remove("@Été", 2)
+    assert "@Été" not in index and len(index) == 4
+
+
+def random_texts(seed, count=300):
+    rng = random.Random(seed)
+    vocabulary = ["mer", "Mère", "plage", "soleil", "été", "ete", "nuit", "port"]
+    return {number: " ".join(rng.choice(vocabulary) for _ in range(rng.randint(0, 12))) for number in range(count)}
+
+
+def test_text_index_matches_words_and_phrases():
+    texts = random_texts(24)
+    index = TextIndex()
+    index.build(texts.items())
+    rng = random.Random(25)
+    for number in rng.sample(sorted(texts), 100):
+        index.remove(number)
+        texts[number] = random_texts(number, 1)[0]
+        index.add(number, texts[number])
+
+    def words(text):
+        return TextIndex.words(text)
+
+    for query in ("mer", "MÈRE", "ete", "plage soleil", "nuit nuit port", "absent", "mer absent"):
+        query_words = words(query)
+        expected = {number for number, text in texts.items()
+                    if any(words(text)[start:start + len(query_words)] == query_words
+                           for start in range(len(words(text))))}
+        assert set(index.matches(query)) == expected, query
+        assert index.estimate(query) >= len(expected)
+
+
+def test_bm25_scores_match_the_formula():
+    texts = random_texts(26)
+    index = TextIndex()
+    index.build(texts.items())
+    documents = {number: TextIndex.words(text) for number, text in texts.items() if TextIndex.words(text)}
+    average = sum(map(len, documents.values())) / len(documents)
+
+    def bm25(number, query_words):
+        document = documents.get(number, [])
+        total = 0.0
+        for word in set(query_words):
+            found = sum(word in words for words in documents.values())
+            if not found or word not in document:
+                continue
+            idf = math.log(1 + (len(documents) - found + 0.5) / (found + 0.5))
+            frequency = document.count(word)
+            norm = index.K1 * (1 - index.B + index.B * len(document) / average)
+            total += idf * frequency * (index.K1 + 1) / (frequency + norm)
+        return total
+
+    for query in (["plage"], ["mer", "nuit"], ["absent"]):
+        score = index.scorer(query)
+        for number in texts:
+            assert score(number) == pytest.approx(bm25(number, query))
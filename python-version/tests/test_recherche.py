@@ -0,0 +1,113 @@
+import pytest
+
+from recherche import (And, Not, Or, QuerySyntaxError, Term, Xor, estimate, is_scan, optimize, parse_date,
+                       parse_query, parse_size, split_comparison, word_span)
+
+FIELDS = frozenset({"ext", "type", "size"})
+
+
+def tag(value):
+    return Term("tag", value)
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("#a OR #b AND #c", Or((tag("a"), And((tag("b"), tag("c")))))),
+    ("(#a OR #b) AND (#c OR #d)", And((Or((tag("a"), tag("b"))), Or((tag("c"), tag("d")))))),
+    ("#a AND (#b AND #c)", And((tag("a"), tag("b"), tag("c")))),
+    ("NOT #a AND #b", And((Not(tag("a")), tag("b")))),
+    ("#a NOT #b", And((tag("a"), Not(tag("b"))))),
+    ("NOT NOT #a", tag("a")),
+    ("NOT (#a OR #b)", Not(Or((tag("a"), tag("b"))))),
+    ("#a #b , #c", Or((And((tag("a"), tag("b"))), tag("c")))),
+    ("#a XOR #b OR #c", Xor((tag("a"), Or((tag("b"), tag("c")))))),
+    ("(#a XOR #b) #c", And((Xor((tag("a"), tag("b"))), tag("c")))),
+    ("not(#a , #b)", Not(Or((tag("a"), tag("b"))))),
+])
+def test_operator_precedence(query, expected):
+    assert parse_query(query) == expected
+
+
+def test_consecutive_words_form_one_name_term():
+    assert parse_query("vacances paris AND #ete") == And((Term("name", "vacances paris"), tag("ete")))
+    assert parse_query('"Plan.pdf"') == Term("exact", "Plan.pdf")
+    assert parse_query("@Été") == Term("collection", "Été")
+    assert parse_query("vacances and paris") == Term("name", "vacances and paris")
+    assert parse_query("http://exemple.org/a") == Term("name", "http://exemple.org/a")
+
+
+def test_folder_syntax():
+    assert parse_query("lieu:paris") == tag("lieu/paris")
+    assert parse_query("lieu:(paris , #lyon)") == Or((tag("lieu/paris"), tag("lieu/lyon")))
+    assert parse_query("#lieu:paris") == tag("lieu/paris")
+    assert parse_query("#lieu:(paris , lyon)") == Or((tag("lieu/paris"), tag("lieu/lyon")))
+    assert parse_query("#~lieu:pari") == Term("fuzzy_tag", "lieu/pari")
+    assert parse_query("vacances lieu:paris") == And((Term("name", "vacances"), tag("lieu/paris")))
+
+
+def test_type_filters_need_an_existing_type():
+    types = frozenset({"image", "video"})
+    assert parse_query("_Image #a", types=types) == And((Term("type", "Image"), tag("a")))
+    assert parse_query("_brouillon plan", types=types) == Term("name", "_brouillon plan")
+    assert parse_query("_image") == Term("name", "_image")
+
+
+def test_fields_are_per_database():
+    assert parse_query("ext:png", FIELDS) == Term("ext", "png")
+    assert parse_query("EXT:png photo", FIELDS) == And((Term("ext", "png"), Term("name", "photo")))
+    assert parse_query('size:"> 1 Go"', FIELDS) == Term("size", "> 1 Go")
+    assert parse_query("ext:png") == tag("ext/png")
+
+
+def test_field_groups():
+    assert parse_query("ext:(png , jpg)", FIELDS) == Or((Term("ext", "png"), Term("ext", "jpg")))
+    assert parse_query('size:(<1k , ">1 Go") #a', FIELDS) == And((Or((Term("size", "<1k"), Term("size", ">1 Go"))),
+                                                               tag("a")))
+    assert parse_query("ext:(png , #a)", FIELDS) == Or((Term("ext", "png"), tag("a")))
+    assert parse_query("ext:(png , jpg)") == Or((tag("ext/png"), tag("ext/jpg")))
+
+
+def test_hash_prefix_always_means_a_tag_folder():
+    assert parse_query("#type:image", FIELDS) == tag("type/image")
+    assert parse_query("#type:(image , video)", FIELDS) == Or((tag("type/image"), tag("type/video")))
+
+
+def test_predicate_values():
+    assert parse_size("10MB") == 10 * 1024 ** 2
+    assert parse_size("1,5 Go") == 3 * 1024 ** 3 // 2
+    assert parse_size("500") == 500
+    assert split_comparison(">=10k") == (">=", "10k", "")
+    assert split_comparison("1MB..2MB") == ("..", "1MB", "2MB")
+    assert split_comparison("2025") == ("=", "2025", "")
+    assert parse_date("2025/08") == "2025-08"
+    for text, parse in (("dix", parse_size), ("10 parsecs", parse_size), ("août", parse_date)):
+        with pytest.raises(QuerySyntaxError):
+            parse(text)
+
+
+@pytest.mark.parametrize("query", ["", "   ", "(#a", "#a )", "#a OR", "NOT", "()", "#a AND AND #b",
+                                   "#a , , #b", "#a XOR"])
+def test_syntax_errors(query):
+    with pytest.raises(QuerySyntaxError):
+        parse_query(query)
+
+
+def test_optimize_orders_and_operands():
+    sizes = {"rare": 2, "commun": 500}
+    query = parse_query('photo AND NOT #rare AND #commun AND NOT "x.jpg" AND #rare')
+    plan = optimize(query, lambda term: sizes.get(term.value, 0), 1000)
+    assert plan == And((tag("rare"), tag("commun"), Not(tag("rare")),
+                        Term("name", "photo"), Not(Term("exact", "x.jpg"))))
+    assert estimate(Or((tag("rare"), tag("commun"))), lambda term: sizes[term.value], 1000) == 502
+    assert estimate(Not(tag("commun")), lambda term: sizes[term.value], 1000) == 500
+    assert is_scan(plan) and not is_scan(Not(tag("rare")))
+
+
+@pytest.mark.parametrize("query, position, span", [
+    ("#vac", 4, (0, 4)),
+    ("#ete AND #va", 12, (9, 12)),
+    ("not(#va", 5, (4, 7)),
+    ("#a  #b", 3, (3, 3)),
+    ('"mer" @Ét', 9, (6, 9)),
+])
+def test_word_span(query, position, span):
+    assert word_span(query, position) == span
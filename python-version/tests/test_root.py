@@ -0,0 +1,873 @@
+import os
+import queue
+import random
+import re
+import threading
+
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from contenu import ContentIndex
+from indexation import normalize_text
+from recherche import Term, parse_query
+from root import FileObject, TagDatabase
+from stockage import JsonStorage, SqliteStorage
+
+BACKENDS = {"json": JsonStorage, "sqlite": SqliteStorage}
+
+
+def state(db):
+    """Contenu comparable de la base en mémoire"""
+    return {
+        "objects": sorted((obj.id, obj.name, obj.location) for obj in db.objects.values()),
+        "tags": {tag: sorted(obj_ids) for tag, obj_ids in db.tags.items() if obj_ids},
+        "collections": sorted((collection.name, tuple(sorted(collection.object_ids)))
+                              for collection in db.collections.values()),
+    }
+
+
+def reloaded(tmp_path, backend):
+    db = TagDatabase(str(tmp_path), storage=BACKENDS[backend](str(tmp_path)))
+    try:
+        return state(db)
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_same_api_on_every_backend(tmp_path, backend):
+    db = TagDatabase(str(tmp_path), storage=BACKENDS[backend](str(tmp_path)))
+    first = db.add_object(FileObject("plage.jpg", "", "image", "/photos/plage.jpg"))
+    second = db.add_object(FileObject("montagne.jpg", "", "image", "/photos/montagne.jpg"))
+    assert db.add_object(FileObject("copie.jpg", "", "image", "/photos/plage.jpg")) is None
+    db.add_tag(first, "#vacances")
+    db.add_tag(second, "vacances")
+    db.add_tag(second, "neige")
+    collection = db.create_collection("Été")
+    db.add_object_to_collection(first, collection.id)
+    db.add_object_to_collection(second, collection.id)
+    db.delete_object(first)
+    db.remove_tag(second, "neige")
+
+    expected = {
+        "objects": [(second, "montagne.jpg", "/photos/montagne.jpg")],
+        "tags": {"vacances": [second]},
+        "collections": [("Été", (second,))],
+    }
+    assert state(db) == expected
+    db.close()
+    assert reloaded(tmp_path, backend) == expected
+
+
+def test_load_timings_include_in_memory_build(tmp_path):
+    db = TagDatabase(str(tmp_path), storage=JsonStorage(str(tmp_path)))
+    db.add_tag(db.add_object(FileObject("plage.jpg", "", "image", "/photos/plage.jpg")), "vacances")
+    db.close()
+
+    phases = []
+    db = TagDatabase(str(tmp_path), storage=JsonStorage(str(tmp_path)),
+                     progress=lambda phase, done, total: phases.append(phase))
+    assert {"objects", "tags", "build", "total"} <= set(db.load_timings)
+    assert {"objects", "tags", "collections"} <= set(phases)
+    db.close()
+
+
+def test_close_writes_snapshot_used_at_next_start(tmp_path):
+    db = TagDatabase(str(tmp_path), storage=JsonStorage(str(tmp_path)))
+    db.add_tag(db.add_object(FileObject("plage.jpg", "", "image", "/photos/plage.jpg")), "vacances")
+    expected = state(db)
+    db.close()
+
+    storage = JsonStorage(str(tmp_path))
+    db = TagDatabase(str(tmp_path), storage=storage)
+    assert state(db) == expected
+    assert "snapshot" in db.load_timings and storage.reread_count == 0
+    db.close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = TagDatabase(str(tmp_path), storage=JsonStorage(str(tmp_path)))
+    first = db.add_object(FileObject("plage.jpg", "", "image", "/photos/plage.jpg"))
+    second = db.add_object(FileObject("montagne.jpg", "", "image", "/photos/montagne.jpg"))
+    db.add_tag(first, "vacances")
+    db.add_tag(second, "vacances")
+    db.add_tag(second, "neige")
+    collection = db.create_collection("Été")
+    db.add_object_to_collection(first, collection.id)
+    yield db
+    db.close()
+
+
+def mutate(db):
+    first, second = sorted(db.objects)
+    db.add_object(FileObject("ville.jpg", "", "image", "/photos/ville.jpg"))
+    db.add_tag(first, "plage")
+    db.remove_tag(second, "vacances")
+    db.add_object_to_collection(second, next(iter(db.collections)))
+    db.delete_object(first)
+    db.delete_tag("neige")
+
+
+def test_batch_rollback_on_exception(db, tmp_path):
+    before = state(db)
+    with pytest.raises(RuntimeError):
+        with db.batch():
+            mutate(db)
+            raise RuntimeError("annulé")
+
+    assert state(db) == before
+    db.close()
+    assert reloaded(tmp_path, "json") == before
+
+
+def test_batch_rollback_when_flush_fails(db, tmp_path, monkeypatch):
+    before = state(db)
+
+    def failing_write(*args, **kwargs):
+        raise OSError("disque plein")
+
+    monkeypatch.setattr(db.storage, "tag_members_changed", failing_write)
+    with pytest.raises(OSError):
+        with db.batch():
+            mutate(db)
+
+    assert state(db) == before
+
+
+def test_batch_writes_each_entry_once(db, tmp_path, monkeypatch):
+    writes = []
+    writing = []
+
+    def counting(method):
+        write = getattr(db.storage, method)
+
+        def counted(tag, *args, **kwargs):
+            if not writing:  # tag_members_changed peut passer par save_tag
+                writes.append(tag)
+            writing.append(tag)
+            try:
+                write(tag, *args, **kwargs)
+            finally:
+                writing.pop()
+        monkeypatch.setattr(db.storage, method, counted)
+
+    counting("save_tag")
+    counting("tag_members_changed")
+    with db.batch():
+        mutate(db)
+        with db.batch():  # Un bloc imbriqué rejoint le bloc extérieur
+            for number in range(20):
+                db.add_tag(db.add_object(FileObject(f"{number}.jpg", "", "image", f"/import/{number}.jpg")), "import")
+        assert writes == []
+
+    assert sorted(writes) == ["import", "plage", "vacances"]
+    after = state(db)
+    db.close()
+    assert reloaded(tmp_path, "json") == after
+
+
+def test_membership_changes_are_journaled_then_folded(db, tmp_path):
+    tag_files = sorted(os.listdir(db.storage.tags_dir))
+    mutate(db)
+    assert os.path.exists(db.storage.journal_path)
+    after = state(db)
+    db.close()
+
+    assert not os.path.exists(db.storage.journal_path)
+    assert reloaded(tmp_path, "json") == after
+    assert set(os.listdir(db.storage.tags_dir)) <= set(tag_files) | {"plage.json"}
+
+
+def test_reverse_tag_index_follows_every_change(db):
+    first, second = sorted(db.objects)
+    mountain = db.get_object_by_location("/photos/montagne.jpg").id
+    assert db.get_object_tags(mountain) == ["neige", "vacances"]
+
+    mutate(db)
+    assert db.check_consistency() == []
+    assert db.get_object_tags(second) == []
+    assert first not in db.object_tags
+
+    with pytest.raises(RuntimeError):
+        with db.batch():
+            db.add_tag(second, "annulé")
+            db.delete_tag("plage")
+            raise RuntimeError("annulé")
+    assert db.check_consistency() == []
+    assert db.get_object_tags(second) == []
+
+
+def test_location_index_uses_canonical_form(db):
+    second = db.get_object_by_location("/photos/plage.jpg").id
+    assert db.add_object(FileObject("copie.jpg", "", "image", "/photos/./vacances/../montagne.jpg")) is None
+    assert db.get_object_by_location("/photos//plage.jpg").id == second
+
+    assert not db.update_object(second, "plage.jpg", "", "image", "/photos/montagne.jpg")
+    assert db.update_object(second, "plage.jpg", "", "image", "/photos/./plage.jpg")
+    assert db.update_object(second, "plage.jpg", "", "image", "/photos/mer.jpg")
+    assert not db.location_exists("/photos/plage.jpg")
+    assert db.location_exists("/photos/mer.jpg")
+
+    db.delete_object(second)
+    assert not db.location_exists("/photos/mer.jpg")
+    assert db.check_consistency() == []
+
+
+def test_duplicate_locations_in_data_are_reported(tmp_path):
+    storage = JsonStorage(str(tmp_path))
+    storage.save_object({"id": "a", "name": "a.jpg", "description": "", "type": "image", "location": "/x/a.jpg"})
+    storage.save_object({"id": "b", "name": "b.jpg", "description": "", "type": "image", "location": "/x/./a.jpg"})
+    db = TagDatabase(str(tmp_path), storage=JsonStorage(str(tmp_path)))
+    try:
+        assert len(db.check_consistency()) == 1
+        db.delete_object(db.get_object_by_location("/x/a.jpg").id)
+        assert db.location_exists("/x/a.jpg")
+        assert db.check_consistency() == []
+    finally:
+        db.close()
+
+
+def test_collection_indexes_follow_every_change(db):
+    first = db.get_object_by_location("/photos/plage.jpg").id
+    second = db.get_object_by_location("/photos/montagne.jpg").id
+    summer = db.get_collection_by_name("été")
+    assert [collection.id for collection in db.get_collections_for_object(first)] == [summer.id]
+    assert db.create_collection("ÉTÉ") is None
+
+    winter = db.create_collection("Hiver")
+    db.add_object_to_collection(first, winter.id)
+    db.add_object_to_collection(second, winter.id)
+    assert not db.rename_collection(winter.id, "été", "")
+    assert db.rename_collection(winter.id, "Neige", "")
+    assert db.get_collection_by_name("hiver") is None
+    assert db.get_collection_by_name("NEIGE") is winter
+
+    db.delete_object(first)
+    assert first not in db.object_collections
+    assert first not in summer.object_ids and first not in winter.object_ids
+    db.delete_collection(winter.id)
+    assert db.get_collections_for_object(second) == []
+    assert db.check_consistency() == []
+
+
+class _NoScan(dict):
+    """Dictionnaire des collections qui refuse d'être parcouru"""
+
+    def values(self):
+        raise AssertionError("parcours de toutes les collections")
+
+    items = __iter__ = values
+
+
+def test_collection_terms_use_the_name_index(db, monkeypatch):
+    plage = db.get_object_by_location("/photos/plage.jpg").id
+    montagne = db.get_object_by_location("/photos/montagne.jpg").id
+    rng = random.Random(8)
+    names = ["Été", "été 2024", "Vacances d'été", "Hiver", "Noël", "No", "Archives"]
+    for name in names[1:]:
+        collection = db.create_collection(name)
+        for obj_id in (plage, montagne):
+            if rng.random() < 0.5:
+                db.add_object_to_collection(obj_id, collection.id)
+    collections = list(db.collections.values())
+    assert db.check_consistency() == []
+    monkeypatch.setattr(db, "collections", _NoScan(db.collections))
+
+    for query in ("été", "ÉT", "no", "vacances d", "x", "hiver"):
+        matching = [collection for collection in collections if query.lower() in collection.name.lower()]
+        assert sorted(db.matching_collections(query)) == sorted(collection.id for collection in matching)
+        expected = [obj_id for collection in matching for obj_id in collection.object_ids]
+        assert sorted(obj.id for obj in db.search_by_collection(query)) == sorted(expected)
+        assert db.term_cardinality(Term("collection", query)) == len(expected)
+        assert {obj.id for obj in db.advanced_search(f'@"{query}"')} == set(expected)
+    assert len(db.matching_collections("")) == len(collections)
+
+
+def test_collection_queries_are_stamped_per_collection(db):
+    plage = db.get_object_by_location("/photos/plage.jpg").id
+    montagne = db.get_object_by_location("/photos/montagne.jpg").id
+    summer = db.get_collection_by_name("Été")
+    winter = db.create_collection("Hiver")
+
+    def search(query):
+        return {obj.id for obj in db.advanced_search(query)}
+
+    assert search("@été") == {plage}
+    hits = db.cache_stats()["hits"]
+    db.add_object_to_collection(montagne, winter.id)  # Collection qui ne correspond pas
+    assert search("@été") == {plage}
+    assert db.cache_stats()["hits"] == hits + 1
+
+    db.add_object_to_collection(montagne, summer.id)
+    assert search("@été") == {plage, montagne}
+    db.remove_object_from_collection(plage, summer.id)
+    assert search("@été") == {montagne}
+    assert db.rename_collection(winter.id, "Été indien", "")
+    assert search("@été") == {montagne}
+    db.remove_object_from_collection(montagne, summer.id)
+    assert search("@été") == {montagne}  # Toujours dans « Été indien »
+    assert db.rename_collection(winter.id, "Automne", "")
+    assert search("@été") == set()
+    db.delete_collection(summer.id)
+    assert search("@automne") == {montagne}
+    assert db.get_collection_by_name("été") is None
+    assert db.check_consistency() == []
+
+
+def test_boolean_queries_match_naive_sets(db):
+    for number in range(30):
+        obj_id = db.add_object(FileObject(f"{number}.jpg", "", "image" if number % 3 else "video",
+                                          f"/import/{number}.jpg"))
+        for tag in ("pair", "trois", "cinq"):
+            if number % {"pair": 2, "trois": 3, "cinq": 5}[tag] == 0:
+                db.add_tag(obj_id, tag)
+    everything = set(db.objects)
+    pair, trois, cinq = (set(db.tags[tag]) for tag in ("pair", "trois", "cinq"))
+
+    assert {obj.id for obj in db.advanced_search("#pair AND #trois")} == pair & trois
+    assert {obj.id for obj in db.advanced_search("#pair OR #cinq")} == pair | cinq
+    assert {obj.id for obj in db.advanced_search("#pair NOT #trois")} == pair - trois
+    assert db.evaluate_boolean_expression(parse_query("NOT #pair")) == everything - pair
+    assert {obj.id for obj in db.search_by_type("VIDEO")} == {
+        obj.id for obj in db.objects.values() if obj.file_type == "video"}
+
+    removed = sorted(pair)[0]
+    db.delete_object(removed)
+    assert removed not in db.evaluate_boolean_expression(parse_query("NOT #cinq"))
+
+
+def test_file_object_round_trip_keeps_id():
+    obj = FileObject("plage.jpg", None, "image", "/photos/plage.jpg")
+    assert not hasattr(obj, "__dict__")
+    assert obj.description == ""
+
+    copy = FileObject.from_dict(obj.to_dict())
+    assert (copy.id, copy.name, copy.file_type, copy.location) == (obj.id, obj.name, "image", obj.location)
+    assert copy.file_type is obj.file_type
+
+
+def random_query(rng, depth=0):
+    """Requête aléatoire et son évaluation naïve : fonction (tags, nom) -> bool"""
+    if depth > 2 or rng.random() < 0.3:
+        if rng.random() < 0.3:
+            word = rng.choice(["1", "2", "jpg", "absent"])
+            return word, lambda tags, name: word in name.lower()
+        tag = rng.choice(["pair", "trois", "cinq", "absent"])
+        return f"#{tag}", lambda tags, name: tag in tags
+    kind = rng.choice(["AND", "OR", "NOT"])
+    if kind == "NOT":
+        text, matches = random_query(rng, depth + 1)
+        return f"NOT ({text})", lambda tags, name: not matches(tags, name)
+    (left, left_matches), (right, right_matches) = random_query(rng, depth + 1), random_query(rng, depth + 1)
+    if kind == "AND":
+        return (f"({left}) AND ({right})",
+                lambda tags, name: left_matches(tags, name) and right_matches(tags, name))
+    return (f"({left}) OR ({right})",
+            lambda tags, name: left_matches(tags, name) or right_matches(tags, name))
+
+
+def test_parsed_queries_match_naive_evaluation(db):
+    for number in range(30):
+        obj_id = db.add_object(FileObject(f"{number}.jpg", "", "image", f"/import/{number}.jpg"))
+        for tag, divisor in (("pair", 2), ("trois", 3), ("cinq", 5)):
+            if number % divisor == 0:
+                db.add_tag(obj_id, tag)
+
+    rng = random.Random(11)
+    for _ in range(200):
+        query, matches = random_query(rng)
+        expected = {obj_id for obj_id, obj in db.objects.items()
+                    if matches(set(db.get_object_tags(obj_id)), obj.name)}
+        assert {obj.id for obj in db.advanced_search(query)} == expected, query
+
+
+def test_result_cache_is_invalidated_by_every_change(db):
+    first = db.get_object_by_location("/photos/plage.jpg").id
+    second = db.get_object_by_location("/photos/montagne.jpg").id
+    summer = db.get_collection_by_name("Été")
+    queries = ["#vacances", "#neige OR #plage", "plage", "NOT #neige", "@été", "@hiv AND NOT montagne"]
+
+    def search(query):
+        return {obj.id for obj in db.advanced_search(query)}
+
+    def check():
+        cached = {query: search(query) for query in queries}
+        db.clear_result_cache()
+        assert cached == {query: search(query) for query in queries}
+
+    check()
+    hits = db.cache_stats()["hits"]
+    check()
+    assert db.cache_stats()["hits"] > hits
+    assert search("( #vacances )") == search("#vacances")
+
+    db.add_tag(first, "neige")
+    check()
+    db.remove_tag(second, "vacances")
+    check()
+    db.update_object(second, "plage d'hiver.jpg", "", "image", "/photos/montagne.jpg")
+    check()
+    third = db.add_object(FileObject("plage 2.jpg", "", "image", "/photos/plage2.jpg"))
+    check()
+    db.add_object_to_collection(third, summer.id)
+    check()
+    assert db.rename_collection(summer.id, "Hiver", "")
+    check()
+    with pytest.raises(RuntimeError):
+        with db.batch():
+            db.delete_tag("neige")
+            db.delete_object(first)
+            check()
+            raise RuntimeError("annulé")
+    check()
+    db.delete_object(first)
+    check()
+    db.delete_collection(summer.id)
+    check()
+
+
+def test_name_search_matches_naive_scan(db):
+    rng = random.Random(14)
+    for number in range(200):
+        name = "".join(rng.choice("abcdeé _") for _ in range(rng.randint(1, 10))) + ".jpg"
+        db.add_object(FileObject(name, "", "image", f"/import/{number}.jpg"))
+
+    def naive(query):
+        words = normalize_text(query).split()
+        return {obj_id for obj_id, obj in db.objects.items()
+                if all(word in normalize_text(obj.name) for word in words)}
+
+    queries = ["abc", "a", "É_", "cd ab", "eee", ".jpg", "zzz"]
+    for query in queries:
+        assert {obj.id for obj in db.search_by_name(query)} == naive(query)
+
+    # L'index construit à la première recherche suit ensuite chaque changement
+    for obj_id in rng.sample(sorted(db.objects), 40):
+        obj = db.objects[obj_id]
+        db.update_object(obj_id, obj.name[::-1] + ".abc", "", obj.file_type, obj.location)
+    for obj_id in rng.sample(sorted(db.objects), 40):
+        db.delete_object(obj_id)
+    db.add_object(FileObject("ABCDE.png", "", "image", "/import/nouveau.png"))
+    for query in queries:
+        assert {obj.id for obj in db.search_by_name(query)} == naive(query)
+        assert {obj.id for obj in db.advanced_search(query)} == naive(query)
+    assert db.check_consistency() == []
+
+
+def test_name_predicates_ignore_accents_and_case(db):
+    elan = db.add_object(FileObject("Élan.jpg", "", "image", "/photos/elan.jpg"))
+    assert db.objects[elan].name_key == "elan.jpg"
+    assert [obj.id for obj in db.search_by_name("ELAN")] == [elan]
+    assert [obj.id for obj in db.advanced_search('"elan.JPG"')] == [elan]
+    assert [obj.id for obj in db.advanced_search("élan AND NOT #neige")] == [elan]
+
+    db.update_object(elan, "Straße.jpg", "", "image", "/photos/elan.jpg")
+    assert db.search_by_name("elan") == []
+    assert [obj.id for obj in db.search_by_name("strasse")] == [elan]
+
+
+def test_fuzzy_search_tolerates_typos(db):
+    plage = db.get_object_by_location("/photos/plage.jpg").id
+    montagne = db.get_object_by_location("/photos/montagne.jpg").id
+    assert {obj.id for obj in db.advanced_search("~montagen")} == {montagne}
+    assert {obj.id for obj in db.advanced_search("#~vacanses")} == {plage, montagne}
+    assert {obj.id for obj in db.advanced_search("#~NEGE")} == {montagne}
+
+    # Les index approchés suivent les changements après leur construction
+    db.add_tag(plage, "Neiges")
+    db.delete_tag("neige")
+    db.update_object(montagne, "colline.jpg", "", "image", "/photos/montagne.jpg")
+    assert {obj.id for obj in db.advanced_search("#~neige")} == {plage}
+    assert db.advanced_search("~montagen") == []
+    assert {obj.id for obj in db.advanced_search("~coline")} == {montagne}
+    assert db.check_consistency() == []
+
+
+def test_wildcard_queries_match_naive_regex(db):
+    rng = random.Random(17)
+    for number in range(200):
+        name = "".join(rng.choice("abcé.") for _ in range(rng.randint(1, 6))) + rng.choice([".jpg", ".png", ""])
+        db.add_object(FileObject(name, "", "image", f"/import/{number}"))
+
+    def naive(pattern):
+        regex = re.compile("".join(".*" if char == "*" else "." if char == "?" else re.escape(char)
+                                   for char in normalize_text(pattern)) + r"\Z", re.DOTALL)
+        return {obj_id for obj_id, obj in db.objects.items() if regex.match(normalize_text(obj.name))}
+
+    patterns = ["a*", "ab*.jpg", "*.png", "?b*", "*c?a*", "*", "é.*", "a.b*", "*?"]
+    for number, pattern in enumerate(patterns):
+        assert {obj.id for obj in db.advanced_search(pattern)} == naive(pattern), pattern
+        if number == 4:  # Changements après la construction de l'index trié
+            for obj_id in rng.sample(sorted(db.objects), 30):
+                db.delete_object(obj_id)
+            db.add_object(FileObject("ab.Jpg", "", "image", "/import/ab"))
+
+    exact = db.add_object(FileObject("Plan.pdf", "", "document", "/plan.pdf"))
+    assert {obj.id for obj in db.advanced_search('"plan.PDF"')} == {exact}
+    assert db.check_consistency() == []
+
+
+def test_readme_operators(db, tmp_path):
+    plage = db.get_object_by_location("/photos/plage.jpg").id
+    montagne = db.get_object_by_location("/photos/montagne.jpg").id
+    video = db.add_object(FileObject("film.mp4", "", "Video", "/films/film.mp4"))
+    db.add_tag(plage, "lieu/nice")
+    db.add_tag(video, "nice")
+    db.close()
+    assert os.path.exists(os.path.join(str(tmp_path), "Tags", "lieu", "nice.json"))
+
+    db = TagDatabase(str(tmp_path), storage=JsonStorage(str(tmp_path)))
+    try:
+        def search(query):
+            return [obj.id for obj in db.advanced_search(query)]
+
+        assert search("lieu:nice") == search("#lieu:nice") == [plage]
+        assert set(search("#nice")) == {plage, video}
+        assert set(search("lieu:(nice , paris) , #neige")) == {plage, montagne}
+        assert search("_video") == [video]
+        assert set(search("#vacances not(#neige)")) == {plage}
+        # XOR : même résultat que OR, les objets des deux côtés en premier
+        assert search("#nice XOR #vacances")[0] == plage
+        assert set(search("#nice XOR #vacances")) == {plage, montagne, video}
+    finally:
+        db.close()
+
+
+def test_field_predicates_match_naive_scan(db, tmp_path):
+    rng = random.Random(19)
+    for number in range(60):
+        folder = tmp_path / "fichiers" / rng.choice(["a", "b", "a/c"])
+        folder.mkdir(parents=True, exist_ok=True)
+        path = folder / f"{number}.{rng.choice(['png', 'JPG', 'txt'])}"
+        path.write_bytes(b"x" * rng.randint(0, 3000))
+        obj = FileObject(path.name, "", "image", str(path))
+        obj.added_at = f"2025-0{rng.randint(1, 3)}-{rng.randint(10, 28)}T10:00:00"
+        db.add_object(obj)
+    root = str(tmp_path / "fichiers")
+
+    def naive(field, value):
+        results = set()
+        for obj_id, obj in db.objects.items():
+            location = obj.location.replace("\\", "/")
+            if field == "ext":
+                matches = location.lower().endswith("." + value)
+            elif field == "folder":
+                matches = location.startswith(root + "/" + value + "/")
+            elif field == "size":
+                matches = obj.size is not None and value(obj.size)
+            else:
+                matches = value(obj.added_at)
+            if matches:
+                results.add(obj_id)
+        return results
+
+    def check():
+        def search(query):
+            return {obj.id for obj in db.advanced_search(query)}
+
+        assert search("ext:png") == search("ext:PNG") == naive("ext", "png")
+        assert search(f"folder:{root}/a") == naive("folder", "a")
+        assert search(f'folder:"{root}/a/c" ext:jpg') == naive("folder", "a/c") & naive("ext", "jpg")
+        assert search("size:>1k") == naive("size", lambda size: size > 1024)
+        assert search("size:<=500") == naive("size", lambda size: size <= 500)
+        assert search("size:1k..2k") == naive("size", lambda size: 1024 <= size <= 2048)
+        assert search("added:2025-02") == naive("added", lambda date: date.startswith("2025-02"))
+        assert search("added:>2025-02") == naive("added", lambda date: date >= "2025-03")
+        assert search("added:2025-01-15..2025-02") == naive("added", lambda date: "2025-01-15" <= date < "2025-03")
+
+    check()
+    for obj_id in rng.sample(sorted(db.objects), 20):
+        db.delete_object(obj_id)
+    for obj_id in rng.sample(sorted(db.objects), 10):
+        obj = db.objects[obj_id]
+        path = tmp_path / "fichiers" / "b" / f"renommé {obj.name}.txt"
+        path.write_bytes(b"y" * 5000)
+        db.update_object(obj_id, path.name, "", obj.file_type, str(path))
+    check()
+    assert db.check_consistency() == []
+
+
+def test_ranked_pages_match_naive_sort(db):
+    rng = random.Random(20)
+    for number in range(120):
+        name = rng.choice(["mer", "mer.jpg", "la mer", "mer et plage", "merle", "plage mer"]) + f" {number % 7}"
+        obj = FileObject(name.replace(" 0", ""), "", "image", f"/import/{number}.jpg")
+        obj.added_at = f"2025-01-{rng.randint(10, 20)}"
+        obj_id = db.add_object(obj)
+        if rng.random() < 0.5:
+            db.add_tag(obj_id, "ete")
+
+    def naive(query, words, tags):
+        """Tri complet des résultats selon les critères documentés de rank_key()"""
+        def key(obj):
+            name = obj.name.lower()
+            match = 3 if name == words else 2 if name.startswith(words) else 1 if words in name else 0
+            tagged = sum(obj.id in db.tags[tag] for tag in tags)
+            return (match, tagged, obj.added_at, -db.interner.lookup(obj.id))
+        return [obj.id for obj in sorted(db.advanced_search(query), key=key, reverse=True)]
+
+    def pages(query, limit):
+        results, cursor = [], None
+        while True:
+            page = db.ranked_search(query, limit, cursor)
+            results.extend(obj.id for obj in page.results)
+            assert page.total == len(db.advanced_search(query))
+            if page.cursor is None:
+                return results
+            cursor = page.cursor
+
+    for query, words, tags in (("mer", "mer", []), ("mer #ete", "mer", ["ete"]), ("mer OR #ete", "mer", ["ete"])):
+        expected = naive(query, words, tags)
+        assert [obj.id for obj in db.advanced_search(query)] == expected
+        for limit in (1, 7, 50, 500):
+            assert pages(query, limit) == expected
+
+    # Un objet ajouté entre deux pages ne décale pas les suivantes
+    first = db.ranked_search("mer", 10)
+    db.add_object(FileObject("mer", "", "image", "/import/nouveau.jpg"))
+    second = db.ranked_search("mer", 10, first.cursor)
+    expected = naive("mer", "mer", [])
+    assert [obj.id for obj in first.results + second.results] == [
+        obj_id for obj_id in expected if db.objects[obj_id].location != "/import/nouveau.jpg"][:20]
+
+
+def test_iter_search_streams_the_ranked_list(db):
+    for number in range(45):
+        db.add_object(FileObject(f"mer {number}.jpg", "", "image", f"/import/{number}.jpg"))
+    expected = [obj.id for obj in db.advanced_search("mer")]
+
+    batches = list(db.iter_search("mer", 10))
+    assert [len(batch) for batch in batches] == [10, 10, 10, 10, 5]
+    assert [obj.id for batch in batches for obj in batch] == expected
+
+    # Les lots viennent d'une vue figée : une suppression pendant le parcours ne les mélange pas
+    stream = db.iter_search("mer", 10)
+    first = next(stream)
+    for obj_id in expected[10:40:3]:
+        db.delete_object(obj_id)
+    assert [obj.id for obj in first] + [obj.id for batch in stream for obj in batch] == expected
+    assert list(db.iter_search("introuvable")) == []
+
+
+def test_empty_query_streams_newest_first(db):
+    for number in range(30):
+        obj = FileObject(f"{number}.jpg", "", "image", f"/import/{number}.jpg")
+        obj.added_at = f"2025-01-{number % 4 + 10}"
+        db.add_object(obj)
+    db.objects[next(iter(db.objects))].added_at = ""  # Objet ancien sans date d'ajout
+    db.date_index = None
+
+    rank = db.rank_key(None)
+    expected = sorted(db.objects, key=lambda obj_id: rank(db.interner.lookup(obj_id)), reverse=True)
+    assert [obj.id for batch in db.iter_search("", 7) for obj in batch] == expected
+
+
+def test_stream_search_fills_the_queue(db):
+    for number in range(25):
+        db.add_object(FileObject(f"mer {number}.jpg", "", "image", f"/import/{number}.jpg"))
+    expected = [obj.id for obj in db.advanced_search("mer")]
+
+    results = queue.Queue()
+    db.stream_search("mer", results, lambda: False, 10)
+    batches = []
+    while True:
+        batch = results.get_nowait()
+        if batch is None:
+            break
+        batches.append([obj.id for obj in batch])
+    assert [obj_id for batch in batches for obj_id in batch] == expected and len(batches) == 3
+
+    results = queue.Queue()
+    db.stream_search("mer", results, lambda: True, 10)
+    assert results.empty()  # Recherche périmée : rien n'est publié
+
+    def failing(query, batch_size):
+        raise RuntimeError("index indisponible")
+        yield
+
+    db.iter_search = failing
+    db.stream_search("mer", results, lambda: False)
+    assert isinstance(results.get_nowait(), RuntimeError)
+
+
+def test_search_snapshot_is_consistent_during_writes(db):
+    for number in range(300):
+        db.add_object(FileObject(f"mer {number}.jpg", "", "image", f"/import/{number}.jpg"))
+    ids = sorted(db.objects)
+    stop = threading.Event()
+
+    def writer():
+        rng = random.Random(22)
+        while not stop.is_set():
+            obj_id = rng.choice(ids)
+            db.add_tag(obj_id, "ete")
+            db.remove_tag(obj_id, "ete")
+            obj = db.objects.get(obj_id)
+            if obj is not None:
+                db.update_object(obj_id, obj.name[::-1], "", obj.file_type, obj.location)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(30):
+            keys, objects, _ = db.search_snapshot("mer OR #ete")
+            assert len(keys) == len(objects) == len(set(keys))
+            for key in keys:
+                obj = objects[-key[-1]]  # Chaque clé a son objet, et seulement les résultats sont gardés
+                assert obj.id == db.interner.ids[-key[-1]]
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_search_snapshot_retries_only_concurrent_errors(db, monkeypatch):
+    for number in range(20):
+        db.add_object(FileObject(f"mer {number}.jpg", "", "image", f"/import/{number}.jpg"))
+    expected = [obj.id for obj in db.advanced_search("mer")]
+    query_postings = db.query_postings
+    failures = []
+
+    def interrupted(expression):
+        if not failures:
+            failures.append(expression)
+            db.add_object(FileObject("autre.jpg", "", "image", "/import/autre.jpg"))  # Écriture concurrente
+            raise RuntimeError("Set changed size during iteration")
+        return query_postings(expression)
+
+    monkeypatch.setattr(db, "query_postings", interrupted)
+    keys, objects, recent = db.search_snapshot("mer")
+    assert recent is None and len(failures) == 1
+    assert [objects[-key[-1]].id for key in sorted(keys, reverse=True)] == expected
+
+    def broken(expression):
+        raise RuntimeError("erreur sans écriture")
+
+    monkeypatch.setattr(db, "query_postings", broken)
+    with pytest.raises(RuntimeError):
+        db.search_snapshot("mer")
+
+
+def test_completion_follows_tags_collections_and_history(db):
+    plage = db.get_object_by_location("/photos/plage.jpg").id
+    montagne = db.get_object_by_location("/photos/montagne.jpg").id
+    assert [text for text, _, _ in db.complete("#n", 2)] == ["#neige"]
+    assert db.complete("#neige AND @e", 13) == [("@Été", 11, 13)]
+    assert ("AND", 7, 8) in db.complete("#neige A", 8)
+
+    db.add_tag(plage, "nuit")
+    db.add_tag(montagne, "nuit")
+    assert [text for text, _, _ in db.complete("#n", 2)] == ["#nuit", "#neige"]
+    db.delete_tag("nuit")
+    db.rename_collection(db.get_collection_by_name("Été").id, "Hiver", "")
+    assert [text for text, _, _ in db.complete("#n", 2)] == ["#neige"]
+    assert [text for text, _, _ in db.complete("@", 1)] == ["@Hiver"]
+
+    for query in ("#neige AND plage", "#neige AND plage", "#neige OR #vacances"):
+        db.record_search(query)
+    assert db.complete("#neige", 6, 3)[0] == ("#neige AND plage", 0, 6)
+    assert db.check_consistency() == []
+
+
+def test_description_search_is_ranked_and_invalidated(db):
+    descriptions = ["dragon rouge", "un dragon", "dragon dragon dragon rouge", "rouge dragon", "rien"]
+    ids = [db.add_object(FileObject(f"{number}.jpg", text, "image", f"/import/{number}.jpg", added_at="2025-01-01"))
+           for number, text in enumerate(descriptions)]
+
+    def search(query):
+        return [obj.id for obj in db.advanced_search(query)]
+
+    assert set(search("desc:dragon")) == set(ids[:4])
+    assert set(search('desc:"DRAGON rouge"')) == {ids[0], ids[2]}
+    scores = {obj_id: db.description_index.scorer(["dragon"])(db.interner.lookup(obj_id)) for obj_id in ids[:4]}
+    assert search("desc:dragon") == sorted(ids[:4], key=lambda obj_id: (-scores[obj_id], db.interner.lookup(obj_id)))
+
+    db.update_object(ids[4], "4.jpg", "Dragon rouge", "image", "/import/4.jpg")
+    db.update_object(ids[0], "0.jpg", "", "image", "/import/0.jpg")
+    db.delete_object(ids[2])
+    assert set(search('desc:"dragon rouge"')) == {ids[4]}
+    assert set(search("desc:dragon")) == {ids[1], ids[3], ids[4]}
+    assert db.check_consistency() == []
+
+
+def test_content_predicate_follows_the_index(db, tmp_path):
+    path = tmp_path / "facture.txt"
+    path.write_text("Bon de commande", encoding="utf-8")
+    obj_id = db.add_object(FileObject("facture.txt", "", "document", str(path)))
+    assert db.content_locations() == [str(path)]
+
+    index = ContentIndex(str(tmp_path / "contenu"))
+    try:
+        db.attach_content_index(index)
+        assert db.advanced_search("content:commande") == []
+        index.store(str(path), 1, 1, path.read_text(encoding="utf-8"))
+        assert db.advanced_search("content:commande") == []  # Résultat en cache tant que rien n'est signalé
+        db.content_changed()
+        assert [obj.id for obj in db.advanced_search("content:commande")] == [obj_id]
+        assert [obj.id for obj in db.advanced_search('content:"bon commande" facture')] == [obj_id]
+    finally:
+        db.attach_content_index(None)
+        index.close()
+    assert db.advanced_search("content:commande") == []
+
+
+def test_underscore_words_are_names_unless_a_type_exists(db):
+    draft = db.add_object(FileObject("_draft plan.txt", "", "document", "/docs/draft.txt"))
+    assert [obj.id for obj in db.advanced_search("_draft plan")] == [draft]
+    assert [obj.id for obj in db.advanced_search("_DOCUMENT")] == [draft]
+    assert db.advanced_search("_draft") != []
+    typed = db.add_object(FileObject("film.mp4", "", "draft", "/films/film.mp4"))
+    assert [obj.id for obj in db.advanced_search("_draft")] == [typed]  # Le type existe désormais
+
+
+def test_colons_are_kept_outside_the_folder_syntax(db):
+    plage = db.get_object_by_location("/photos/plage.jpg").id
+    meeting = db.add_object(FileObject("réunion 12:30.txt", "", "document", "/docs/reunion.txt"))
+    db.add_tag(plage, "note:importante")
+    db.add_tag(plage, "lieu/nice")
+    assert "note:importante" in db.tags and "note/importante" not in db.tags
+    assert [obj.id for obj in db.search_by_tag("note:importante")] == [plage]
+    assert [obj.id for obj in db.advanced_search('"réunion 12:30.txt"')] == [meeting]
+    # Un tag enregistré avec ses « : » est trouvé par la syntaxe dossier:tag
+    for query in ("note:importante", "#note:importante", '#"note:importante"', "note:(importante , autre)"):
+        assert [obj.id for obj in db.advanced_search(query)] == [plage], query
+    db.add_tag(meeting, "note/importante")
+    assert {obj.id for obj in db.advanced_search("#note:importante")} == {plage, meeting}
+    assert [obj.id for obj in db.advanced_search("lieu:nice")] == [plage]
+    assert db.check_consistency() == []
+
+
+def test_predicates_are_evaluated_once(db, monkeypatch):
+    for number in range(20):
+        db.add_object(FileObject(f"{number}.jpg", f"mot{number % 3}", "image", f"/import/{number}.jpg",
+                                 size=number * 100, added_at=f"2025-01-{number + 10}"))
+    calls = []
+    for name in ("size", "added", "desc"):
+        predicate = db.predicates[name]
+        postings = predicate.postings
+
+        def counted(value, postings=postings, name=name):
+            calls.append(name)
+            return postings(value)
+        monkeypatch.setattr(predicate, "postings", counted)
+
+    expected = {obj.id for obj in db.objects.values()
+                if obj.size is not None and obj.size > 1024 and obj.added_at >= "2025-01-20"
+                and obj.description == "mot1"}
+    assert {obj.id for obj in db.advanced_search("size:>1k added:>=2025-01-20 desc:mot1")} == expected
+    assert sorted(calls) == ["added", "desc", "size"]
+
+
+def test_warm_indexes_builds_name_indexes_in_background(db):
+    plage = db.get_object_by_location("/photos/plage.jpg").id
+    assert db.name_index is None
+    db.warming_indexes = True  # Construction en cours : la recherche parcourt les objets
+    assert [obj.id for obj in db.search_by_name("plage")] == [plage]
+    assert db.name_index is None
+
+    db.warm_indexes().join()
+    assert not db.warming_indexes
+    assert db.name_index is not None and db.sorted_names is not None and db.date_index is not None
+    assert [obj.id for obj in db.search_by_name("plage")] == [plage]
+    assert db.check_consistency() == []
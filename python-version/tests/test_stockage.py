@@ -0,0 +1,377 @@
+import os
+import sqlite3
+
+import pytest
+
+import stockage
+from stockage import JsonStorage, SqliteStorage, StorageBackend, convert_storage, open_storage
+
+
+def sample_data():
+    objects = [{"id": f"1_{number:016d}", "name": f"photo {number}.jpg", "description": "é" * (number % 3),
+                "type": "image", "location": f"/photos/{number}.jpg", "size": 1000 + number,
+                "added_at": f"2025-01-{number % 28 + 1:02d}"} for number in range(50)]
+    tags = {"paris": [obj["id"] for obj in objects[:10]],
+            "lyon": [obj["id"] for obj in objects[10:15]],
+            "vide": []}
+    collections = [{"id": "c1", "name": "Vacances", "description": "été",
+                    "created_at": "2025-01-01T10:00:00", "updated_at": "2025-02-01T10:00:00",
+                    "object_ids": [obj["id"] for obj in objects[::7]]}]
+    return {"objects": objects, "tags": tags, "collections": collections}
+
+
+def normalized(data):
+    """Données comparables quel que soit l'ordre renvoyé par le moteur"""
+    return {
+        "objects": sorted(data["objects"], key=lambda obj: obj["id"]),
+        "tags": {tag: sorted(obj_ids) for tag, obj_ids in data["tags"].items()},
+        "collections": sorted(({**collection, "object_ids": sorted(collection["object_ids"])}
+                               for collection in data["collections"]), key=lambda collection: collection["id"]),
+    }
+
+
+def write_sample(storage):
+    data = sample_data()
+    with storage.transaction():
+        for obj in data["objects"]:
+            storage.save_object(obj)
+        for tag, obj_ids in data["tags"].items():
+            storage.save_tag(tag, obj_ids)
+        for collection in data["collections"]:
+            storage.save_collection(collection)
+    return data
+
+
+def test_convert_storage_round_trip(tmp_path):
+    data = write_sample(JsonStorage(str(tmp_path / "json")))
+
+    sqlite = SqliteStorage(str(tmp_path / "sqlite"))
+    counts = convert_storage(JsonStorage(str(tmp_path / "json")), sqlite)
+    assert counts == {"objects": 50, "tags": 3, "collections": 1}
+
+    convert_storage(sqlite, JsonStorage(str(tmp_path / "back")))
+    sqlite.close()
+
+    assert normalized(JsonStorage(str(tmp_path / "back")).load()) == normalized(data)
+
+
+def test_convert_storage_removes_data_missing_from_the_source(tmp_path):
+    data = write_sample(JsonStorage(str(tmp_path / "json")))
+    sqlite = SqliteStorage(str(tmp_path / "sqlite"))
+    convert_storage(JsonStorage(str(tmp_path / "json")), sqlite)
+
+    removed = data["objects"].pop()
+    sqlite.delete_object(removed["id"])
+    sqlite.delete_tag("lyon")
+    del data["tags"]["lyon"]
+    sqlite.delete_collection("c1")
+    data["collections"] = []
+    convert_storage(sqlite, JsonStorage(str(tmp_path / "json")))
+    sqlite.close()
+
+    assert normalized(JsonStorage(str(tmp_path / "json")).load()) == normalized(data)
+
+
+def test_sqlite_membership_deltas(tmp_path):
+    storage = SqliteStorage(str(tmp_path))
+    storage.save_tag("paris", ["a", "b"])
+    storage.tag_members_changed("paris", {"a", "b", "c"}, added=["c"])
+    storage.tag_members_changed("paris", {"a", "c"}, removed=["b"])
+    meta = {"id": "c1", "name": "C", "description": "", "created_at": "", "updated_at": ""}
+    storage.save_collection({**meta, "object_ids": ["x"]})
+    storage.collection_members_changed(meta, {"x", "y"}, added=["y"])
+    storage.close()
+
+    data = SqliteStorage(str(tmp_path)).load()
+    assert sorted(data["tags"]["paris"]) == ["a", "c"]
+    assert sorted(data["collections"][0]["object_ids"]) == ["x", "y"]
+
+
+def test_open_storage_detects_backend(tmp_path):
+    assert open_storage(str(tmp_path / "json")).name == "json"
+    SqliteStorage(str(tmp_path / "sqlite")).close()
+    assert open_storage(str(tmp_path / "sqlite")).name == "sqlite"
+    with pytest.raises(ValueError):
+        open_storage(str(tmp_path), "csv")
+    assert os.path.isdir(tmp_path / "json" / "Objects")
+
+
+def test_parallel_load_reports_progress_and_timings(tmp_path):
+    data = write_sample(JsonStorage(str(tmp_path)))
+    with open(tmp_path / "Objects" / "cassé.json", "w", encoding="utf-8") as f:
+        f.write("{pas du json")
+    with open(tmp_path / "Objects" / "notes.txt", "w", encoding="utf-8") as f:
+        f.write("ignoré")
+
+    calls = []
+    storage = JsonStorage(str(tmp_path), max_workers=4)
+    loaded = storage.load(lambda phase, done, total: calls.append((phase, done, total)))
+
+    assert normalized(loaded) == normalized(data)  # Le fichier illisible est ignoré
+    assert ("objects", 51, 51) in calls and ("tags", 3, 3) in calls and ("collections", 1, 1) in calls
+    assert {"scan", "objects", "tags", "collections"} <= set(storage.load_timings)
+    assert storage.tag_files["paris"] == str(tmp_path / "Tags" / "paris.json")
+
+
+def test_snapshot_is_used_until_files_change(tmp_path):
+    data = write_sample(JsonStorage(str(tmp_path)))
+    storage = JsonStorage(str(tmp_path))
+    storage.write_snapshot(storage.load())
+
+    storage = JsonStorage(str(tmp_path))
+    assert normalized(storage.load()) == normalized(data)
+    assert "scan" not in storage.load_timings and storage.reread_count == 0  # Aucun dossier parcouru
+
+    # Session interrompue : l'instantané n'est plus sûr, les dossiers sont parcourus
+    storage = JsonStorage(str(tmp_path))
+    assert normalized(storage.load()) == normalized(data)
+    assert "scan" in storage.load_timings and storage.reread_count == 0
+
+
+def test_snapshot_sees_files_edited_in_place(tmp_path):
+    data = write_sample(JsonStorage(str(tmp_path)))
+    storage = JsonStorage(str(tmp_path))
+    storage.write_snapshot(storage.load())
+
+    # Modification externe sur place : le mtime du dossier Tags ne change pas
+    tags_mtime = os.stat(tmp_path / "Tags").st_mtime_ns
+    with open(tmp_path / "Tags" / "paris.json", "w", encoding="utf-8") as f:
+        f.write('["ajouté"]')
+    assert os.stat(tmp_path / "Tags").st_mtime_ns == tags_mtime
+
+    storage = JsonStorage(str(tmp_path))
+    loaded = storage.load()
+    assert "scan" not in storage.load_timings and storage.reread_count == 1
+    assert loaded["tags"]["paris"] == ["ajouté"]
+    assert normalized(loaded)["objects"] == normalized(data)["objects"]
+
+
+def test_tag_folders_are_loaded_and_watched_by_the_snapshot(tmp_path):
+    storage = JsonStorage(str(tmp_path))
+    storage.save_tag("lieu/paris", ["a"])
+    storage.close()
+    assert os.path.exists(tmp_path / "Tags" / "lieu" / "paris.json")
+    storage = JsonStorage(str(tmp_path))
+    storage.write_snapshot(storage.load())
+
+    # Nouveau fichier dans un sous-dossier : seul le mtime de Tags/lieu change
+    with open(tmp_path / "Tags" / "lieu" / "lyon.json", "w", encoding="utf-8") as f:
+        f.write('["b"]')
+
+    storage = JsonStorage(str(tmp_path))
+    assert storage.load()["tags"] == {"lieu/paris": ["a"], "lieu/lyon": ["b"]}
+
+
+def test_snapshot_is_not_unpickled(tmp_path):
+    import pickle
+
+    class Payload:
+        def __reduce__(self):
+            return (os.mkdir, (str(tmp_path / "pwned"),))
+
+    storage = JsonStorage(str(tmp_path))
+    with open(storage.snapshot_path, "wb") as f:
+        pickle.dump({"version": stockage.SNAPSHOT_VERSION, "sections": Payload()}, f)
+
+    assert storage.load()["objects"] == []
+    assert not os.path.exists(tmp_path / "pwned")
+
+
+def test_journal_replayed_after_crash(tmp_path):
+    data_dir = str(tmp_path)
+    storage = JsonStorage(data_dir, sync=False)
+    storage.load()
+    storage.save_tag("paris", ["a"])
+    storage.tag_members_changed("paris", {"a", "b", "c"}, added=["b", "c"])
+    storage.tag_members_changed("paris", {"a", "c"}, removed=["b"])
+    storage.collection_members_changed({"id": "c1", "name": "C", "description": ""}, ["x"], added=["x"])
+    storage._close_journal_file()  # Arrêt brutal : ni compaction ni instantané
+
+    assert os.path.exists(storage.journal_path)
+    data = JsonStorage(data_dir).load()
+    assert sorted(data["tags"]["paris"]) == ["a", "c"]
+    assert [collection["object_ids"] for collection in data["collections"]] == [["x"]]
+
+
+def test_truncated_journal_line_is_ignored(tmp_path):
+    storage = JsonStorage(str(tmp_path), sync=False)
+    storage.save_tag("paris", ["a"])
+    storage.tag_members_changed("paris", {"a", "b"}, added=["b"])
+    storage._close_journal_file()
+    with open(storage.journal_path, "a", encoding="utf-8") as f:
+        f.write('{"op": "tag", "name": "paris", "add": ["z"')
+
+    assert sorted(JsonStorage(str(tmp_path)).load()["tags"]["paris"]) == ["a", "b"]
+
+
+def test_background_compaction_folds_journal(tmp_path):
+    storage = JsonStorage(str(tmp_path), compact_threshold=200, sync=False)
+    storage.save_tag("paris", [])
+    members = set()
+    for number in range(20):
+        members.add(f"o{number}")
+        storage.tag_members_changed("paris", set(members), added=[f"o{number}"])
+    storage._compaction_thread.join()
+    assert not os.path.exists(storage.rotated_journal_path)
+
+    storage.compact({"tags": {"paris": members}, "collections": []})
+    assert not os.path.exists(storage.journal_path)
+    storage.close()
+    assert set(JsonStorage(str(tmp_path)).load()["tags"]["paris"]) == members
+
+
+def test_sqlite_schema_is_migrated(tmp_path):
+    path = str(tmp_path / stockage.SQLITE_FILENAME)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE objects (id TEXT PRIMARY KEY, name TEXT NOT NULL, description TEXT NOT NULL, "
+                 "type TEXT NOT NULL, location TEXT NOT NULL)")
+    conn.execute("INSERT INTO objects VALUES ('a', 'a.jpg', '', 'image', '/a.jpg')")
+    conn.commit()
+    conn.close()
+
+    storage = SqliteStorage(str(tmp_path))
+    assert storage.load()["objects"] == [{"id": "a", "name": "a.jpg", "description": "", "type": "image",
+                                          "location": "/a.jpg", "size": None, "added_at": ""}]
+    assert storage.conn.execute("PRAGMA user_version").fetchone()[0] == len(SqliteStorage.MIGRATIONS)
+    storage.close()
+
+
+def test_failed_compaction_keeps_rotated_journal(tmp_path, monkeypatch):
+    storage = JsonStorage(str(tmp_path), compact_threshold=200, sync=False)
+    storage.save_tag("a", ["x"])
+    storage.save_tag("b", ["y"])
+    members = {"a": {"x"}, "b": {"y"}}
+
+    write_json_atomic = stockage.write_json_atomic
+    failing = True
+
+    def flaky_write(path, data, indent=4):
+        if failing and "Tags" in path:
+            raise OSError("disque plein")
+        write_json_atomic(path, data, indent)
+
+    monkeypatch.setattr(stockage, "write_json_atomic", flaky_write)
+    for number in range(10):
+        members["a"].add(f"a{number}")
+        storage.tag_members_changed("a", set(members["a"]), added=[f"a{number}"])
+    storage._compaction_thread.join()
+    assert os.path.exists(storage.rotated_journal_path)
+
+    # La rotation suivante ne doit pas écraser journal.log.1
+    failing = False
+    for number in range(10):
+        members["b"].add(f"b{number}")
+        storage.tag_members_changed("b", set(members["b"]), added=[f"b{number}"])
+    storage._compaction_thread.join()
+    assert not os.path.exists(storage.rotated_journal_path)
+    storage.close()
+
+    tags = JsonStorage(str(tmp_path)).load()["tags"]
+    assert {tag: set(obj_ids) for tag, obj_ids in tags.items()} == members
+
+
+def test_aborted_transaction_writes_nothing(tmp_path):
+    storage = JsonStorage(str(tmp_path), sync=False)
+    storage.save_object({"id": "a", "name": "avant"})
+    storage.save_tag("paris", ["a"])
+
+    with pytest.raises(RuntimeError):
+        with storage.transaction():
+            storage.save_object({"id": "a", "name": "après"})
+            storage.save_object({"id": "b", "name": "nouveau"})
+            storage.delete_tag("paris")
+            raise RuntimeError("annulé")
+
+    assert sorted(os.listdir(storage.objects_dir)) == ["a.json"]
+    data = JsonStorage(str(tmp_path)).load()
+    assert data["objects"] == [{"id": "a", "name": "avant"}]
+    assert data["tags"] == {"paris": ["a"]}
+
+
+def test_transaction_replaces_files_before_writing_the_journal(tmp_path, monkeypatch):
+    storage = JsonStorage(str(tmp_path), sync=False)
+    storage.save_tag("paris", ["a"])
+    storage.save_tag("lyon", ["b"])
+
+    def crash(lines):
+        raise OSError("arrêt brutal")
+
+    # Arrêt entre le remplacement des fichiers et l'écriture du journal
+    monkeypatch.setattr(storage, "_write_journal_lines", crash)
+    with pytest.raises(OSError):
+        with storage.transaction():
+            storage.save_tag("paris", ["a", "c"])
+            storage.delete_tag("lyon")
+    storage._close_journal_file()
+
+    data = JsonStorage(str(tmp_path)).load()
+    assert {tag: set(obj_ids) for tag, obj_ids in data["tags"].items()} == {"paris": {"a", "c"}}
+    assert not [name for name in os.listdir(storage.tags_dir) if name.endswith(".tmp")]
+
+
+def test_failed_file_replacement_removes_temporary_files(tmp_path, monkeypatch):
+    storage = JsonStorage(str(tmp_path), sync=False)
+    replace = os.replace
+
+    def flaky_replace(source, target):
+        if target.endswith("b.json"):
+            raise OSError("disque plein")
+        replace(source, target)
+
+    monkeypatch.setattr(os, "replace", flaky_replace)
+    with pytest.raises(OSError):
+        with storage.transaction():
+            storage.save_object({"id": "a", "name": "a"})
+            storage.save_object({"id": "b", "name": "b"})
+            storage.save_object({"id": "c", "name": "c"})
+    assert not [name for name in os.listdir(storage.objects_dir) if name.endswith(".tmp")]
+    assert not os.path.exists(storage.journal_path)
+
+
+def test_replay_ignores_records_without_base_file(tmp_path):
+    storage = JsonStorage(str(tmp_path), sync=False)
+    storage.save_tag("paris", ["a"])
+    storage.save_tag("lyon", ["b"])
+    storage.tag_members_changed("paris", {"a", "b"}, added=["b"])
+    storage.tag_members_changed("lyon", {"b", "c"}, added=["c"])
+    storage.delete_tag("lyon")
+    storage.save_tag("lyon", ["d"])  # Recréé après sa suppression
+    storage.collection_members_changed({"id": "c1", "name": "C", "description": ""}, ["x"], added=["x"])
+    storage.collection_members_changed({"id": "c1", "name": "C", "description": ""}, ["x", "y"], added=["y"])
+    storage._close_journal_file()
+    os.remove(storage.tag_files["paris"])  # Arrêt entre la suppression d'un fichier et son enregistrement
+    os.remove(storage._collection_path("c1"))
+
+    data = JsonStorage(str(tmp_path)).load()
+    assert data["tags"] == {"lyon": ["d"]}
+    assert data["collections"] == []
+
+
+def test_leftover_temporary_files_are_removed_on_load(tmp_path):
+    storage = JsonStorage(str(tmp_path), sync=False)
+    storage.save_object({"id": "a", "name": "a"})
+    storage.save_tag("ville/paris", ["a"])
+    leftovers = [os.path.join(storage.objects_dir, "b.json.tmp"),
+                 os.path.join(storage.tags_dir, "ville", "lyon.json.tmp"),
+                 os.path.join(storage.collections_dir, "c1.json.tmp")]
+    for path in leftovers:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('{"id": "b", "na')
+
+    data = JsonStorage(str(tmp_path)).load()
+    assert [obj["id"] for obj in data["objects"]] == ["a"]
+    assert data["tags"] == {"ville/paris": ["a"]}
+    assert not any(os.path.exists(path) for path in leftovers)
+
+
+def test_incomplete_backend_cannot_be_instantiated(tmp_path):
+    class Incomplete(StorageBackend):
+        def load(self):
+            return {"objects": [], "tags": {}, "collections": []}
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+    storage = JsonStorage(str(tmp_path), sync=False)
+    assert storage.load_timings == {}
+    assert storage.load_timings is not SqliteStorage(str(tmp_path / "base.db")).load_timings